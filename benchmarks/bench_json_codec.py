@@ -0,0 +1,87 @@
+"""
+Compare the available JsonCodec implementations on payloads shaped like Dart
+responses and request bodies.
+
+    python benchmarks/bench_json_codec.py [--entities 5000] [--columns 5000]
+"""
+import argparse
+import timeit
+
+from dartclient.codec import CODECS
+
+
+def action(index):
+    return {
+        'id': 'ACTION%08d' % (index,),
+        'version_id': 1,
+        'created': '2016-06-01T00:00:00.000000',
+        'updated': '2016-06-01T00:00:00.000000',
+        'data': {
+            'name': 'action_%d' % (index,),
+            'action_type_name': 'consume_subscription',
+            'engine_name': 'no_op_engine',
+            'workflow_id': 'WORKFLOW00000001',
+            'state': 'TEMPLATE',
+            'order_idx': index,
+            'args': {'subscription_id': 'SUBSCRIPTION0001', 'batch_size': 1000},
+            'on_failure_email': ['team@example.com'],
+            'on_success_email': ['team@example.com'],
+            'tags': ['dartclient', 'benchmark'],
+        }
+    }
+
+
+def dataset(index, columns):
+    return {
+        'id': 'DATASET%08d' % (index,),
+        'version_id': 1,
+        'created': '2016-06-01T00:00:00.000000',
+        'updated': '2016-06-01T00:00:00.000000',
+        'data': {
+            'name': 'dataset_%d' % (index,),
+            'table_name': 'table_%d' % (index,),
+            'location': 's3://example-bucket/path/%d' % (index,),
+            'load_type': 'INSERT',
+            'compression': 'BZ2',
+            'data_format': {'file_format': 'TEXTFILE', 'row_format': 'DELIMITED'},
+            'columns': [{'name': 'column%d' % (i,), 'data_type': 'VARCHAR', 'length': 64}
+                        for i in range(columns)],
+            'tags': ['dartclient', 'benchmark'],
+        }
+    }
+
+
+def listing(results):
+    return {'results': results, 'total': len(results), 'limit': len(results), 'offset': 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [
+        ('listActions (%d)' % (args.entities,), listing([action(i) for i in range(args.entities)])),
+        ('listDatasets (%d x 50 columns)' % (args.entities // 10,),
+         listing([dataset(i, 50) for i in range(args.entities // 10)])),
+        ('updateDataset (%d columns)' % (args.columns,), dataset(0, args.columns)),
+    ]
+
+    for codec_name in sorted(CODECS):
+        try:
+            codec = CODECS[codec_name]()
+        except ImportError:
+            print('%-10s not installed' % (codec_name,))
+            continue
+        for payload_name, payload in payloads:
+            encoded = codec.dumps(payload)
+            dumps = min(timeit.repeat(lambda: codec.dumps(payload), number=1, repeat=args.repeat))
+            loads = min(timeit.repeat(lambda: codec.loads(encoded), number=1, repeat=args.repeat))
+            print('%-10s %-36s dumps %8.2f ms  loads %8.2f ms  %10d bytes' % (
+                codec_name, payload_name, dumps * 1000, loads * 1000, len(encoded)))
+
+
+if __name__ == '__main__':
+    main()
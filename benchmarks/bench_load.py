@@ -0,0 +1,69 @@
+"""
+Find how many concurrent SyncManager clients one process (or host) can drive
+before latency collapses. Runs a mix of find/sync/clean operations with an
+increasing number of clients against a StubDartServer in its own process,
+with injected latency and errors, or against --api-url, and prints the
+throughput, latency percentiles, CPU time and memory per client count.
+--json writes the results for comparison between versions.
+
+    python benchmarks/bench_load.py [--clients 1 2 4 8 16 32] [--mode thread|process] [--duration 10]
+        [--mix find=0.7,sync=0.25,clean=0.05] [--latency 0.01] [--error-rate 0.001] [--json results.json]
+"""
+import argparse
+import json
+
+from dartclient.loadtest import DEFAULT_MIX, LoadTest
+from dartclient.stub_server import ExponentialLatency, StubDartServerProcess
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        operation, _, weight = item.partition('=')
+        mix[operation.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--mode', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per client count')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='operation=weight pairs')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds between a client\'s operations')
+    parser.add_argument('--columns', type=int, default=10, help='columns per synced dataset')
+    parser.add_argument('--latency', type=float, default=0.01, help='mean stub server latency in seconds, '
+                                                                    'exponentially distributed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 503')
+    parser.add_argument('--api-url', help='load a running server instead of a stub server')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    def print_result(result):
+        print(result.summary())
+
+    def run(api_url):
+        load_test = LoadTest(api_url, mix=args.mix, mode=args.mode, duration=args.duration,
+                             columns=args.columns, think_time=args.think_time, seed=args.seed)
+        load_test.prepare()
+        try:
+            print('%s clients, mix %s' % (args.mode, ', '.join('%s=%g' % item for item in sorted(args.mix.items()))))
+            return load_test.sweep(args.clients, progress=print_result)
+        finally:
+            load_test.cleanup()
+
+    if args.api_url:
+        results = run(args.api_url)
+    else:
+        with StubDartServerProcess(latency=ExponentialLatency(args.latency, seed=args.seed),
+                                   error_rate=args.error_rate, seed=args.seed) as server:
+            results = run(server.api_url)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': [result.as_dict() for result in results]}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
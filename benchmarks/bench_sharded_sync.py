@@ -0,0 +1,79 @@
+"""
+Measure how a sharded sync of a large model scales with the number of
+processes, against a StubDartServer running in its own process. The first
+row is a single-process PlanRunner for comparison. The stub server is a
+single process too, so with many cores it eventually becomes the limit.
+
+    python benchmarks/bench_sharded_sync.py [--datastores 40] [--workflows 5] [--actions 20] [--processes 1 2 4]
+"""
+import argparse
+import multiprocessing
+import time
+
+from dartclient.core import create_sync_manager
+from dartclient.plan import ModelPlan, PlanRunner
+from dartclient.shard import ShardedPlanRunner
+from dartclient.stub_server import StubDartServerProcess
+
+
+def model(datastores, workflows, actions, columns):
+    return ModelPlan({
+        'datasets': [{'name': 'dataset%d' % (i,), 'columns': [['column%d' % (c,), 'VARCHAR'] for c in range(columns)]}
+                     for i in range(datastores)],
+        'datastores': [{
+            'name': 'datastore%d' % (i,),
+            'data': {'engine_name': 'no_op_engine', 'tags': ['benchmark']},
+            'workflows': [{
+                'name': 'workflow%d' % (j,),
+                'data': {'engine_name': 'no_op_engine'},
+                'actions': [{'name': 'action%d' % (k,), 'dataset': 'dataset%d' % (i,) if k == 0 else None,
+                             'data': {'engine_name': 'no_op_engine', 'action_type_name': 'consume_subscription',
+                                      'args': {'batch_size': k}}}
+                            for k in range(actions)],
+            } for j in range(workflows)],
+        } for i in range(datastores)],
+    })
+
+
+def run(plan, processes, args):
+    with StubDartServerProcess(latency=args.latency) as server:
+        api_url = server.api_url
+        if processes:
+            runner = ShardedPlanRunner(plan, {'api_url': api_url}, {'coalesce_reads': True}, processes=processes,
+                                       workers=args.workers, rate=args.rate)
+        else:
+            runner = PlanRunner(create_sync_manager(api_url=api_url, coalesce_reads=True), plan,
+                                workers=args.workers)
+        started = time.time()
+        report = runner.sync()
+        seconds = time.time() - started
+        if not report.ok:
+            raise RuntimeError(report.summary())
+        return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--datastores', type=int, default=40)
+    parser.add_argument('--workflows', type=int, default=5)
+    parser.add_argument('--actions', type=int, default=20)
+    parser.add_argument('--columns', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent requests per process')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the stub server waits per request')
+    parser.add_argument('--rate', type=float, help='requests per second shared by all processes')
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=sorted(set([1, 2, 4, multiprocessing.cpu_count()])))
+    args = parser.parse_args()
+
+    plan = model(args.datastores, args.workflows, args.actions, args.columns)
+    print('%d entities, %d CPUs' % (plan.count(), multiprocessing.cpu_count()))
+    baseline = run(plan, None, args)
+    print('%-22s %8.2fs  %8.1f entities/s' % ('PlanRunner', baseline, plan.count() / baseline))
+    for processes in args.processes:
+        seconds = run(plan, processes, args)
+        print('%-22s %8.2fs  %8.1f entities/s  %5.2fx' % (
+            'sharded, %d processes' % (processes,), seconds, plan.count() / seconds, baseline / seconds))
+
+
+if __name__ == '__main__':
+    main()
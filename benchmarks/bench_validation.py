@@ -0,0 +1,95 @@
+"""
+Measure what schema validation costs on listActions responses and
+updateDataset requests, comparing bravado's own validation with the
+precompiled validators of a ValidationPolicy and with sampled or skipped
+validation, end to end against a local StubDartServer.
+
+    python benchmarks/bench_validation.py [--actions 2000] [--columns 2000] [--calls 20]
+"""
+import argparse
+import time
+import timeit
+
+from bravado_core.validate import validate_schema_object
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.stub_server import StubDartServer
+from dartclient.validation import FULL, SKIP, ValidationPolicy
+
+
+def action(index, workflow_id):
+    return {'data': {
+        'name': 'action_%d' % (index,),
+        'engine_name': 'no_op_engine',
+        'workflow_id': workflow_id,
+        'state': 'TEMPLATE',
+        'args': {'subscription_id': 'SUBSCRIPTION0001', 'batch_size': 1000},
+        'on_failure_email': ['team@example.com'],
+        'on_success_email': ['team@example.com'],
+        'tags': ['dartclient', 'benchmark'],
+    }}
+
+
+def columns(count):
+    return [{'name': 'column%d' % (i,), 'data_type': 'VARCHAR', 'length': 64} for i in range(count)]
+
+
+def throughput(server, validation, calls):
+    client = create_client(api_url=server.api_url, validation=validation)
+    sync_manager = SyncManager(client, ModelFactory(client))
+    dataset = sync_manager.find_dataset('dataset')
+
+    start = time.time()
+    for _ in range(calls):
+        sync_manager.list_page('action', limit=100000)
+    list_rate = calls / (time.time() - start)
+
+    start = time.time()
+    for _ in range(calls):
+        client.Dataset.updateDataset(dataset_id=dataset.id, dataset=dataset).result()
+    update_rate = calls / (time.time() - start)
+    client.swagger_spec.http_client.session.close()
+    return list_rate, update_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--actions', type=int, default=2000)
+    parser.add_argument('--columns', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with StubDartServer() as server:
+        for index in range(args.actions):
+            server.store.add('action', action(index, 'WORKFLOW-1'))
+        server.store.add('dataset', {'data': {'name': 'dataset', 'tags': [], 'columns': columns(args.columns)}})
+
+        spec = create_client(api_url=server.api_url).swagger_spec
+        policy = ValidationPolicy()
+        payloads = [
+            ('listActions (%d actions)' % (args.actions,), 'ActionsResponse', server.store.list('action')),
+            ('updateDataset (%d columns)' % (args.columns,), 'Dataset',
+             server.store.list('dataset')['results'][0]),
+        ]
+        for payload_name, definition, payload in payloads:
+            schema = spec.spec_dict['definitions'][definition]
+            validator = policy.validator(spec, schema)
+            bravado = min(timeit.repeat(lambda: validate_schema_object(spec, schema, payload),
+                                        number=1, repeat=args.repeat))
+            compiled = min(timeit.repeat(lambda: validator.validate(payload), number=1, repeat=args.repeat))
+            print('%-30s bravado %8.2f ms  compiled %8.2f ms  (%.1fx)' % (
+                payload_name, bravado * 1000, compiled * 1000, bravado / compiled))
+
+        print('\nend to end, calls per second:')
+        for name, validation in (('bravado', None),
+                                 ('compiled, full', ValidationPolicy()),
+                                 ('compiled, list sampled 1%', ValidationPolicy({'list': 0.01})),
+                                 ('skip everything', ValidationPolicy(default=SKIP)),
+                                 ('compiled writes, skip reads', ValidationPolicy({'list': SKIP}, default=FULL))):
+            list_rate, update_rate = throughput(server, validation, args.calls)
+            print('%-30s listActions %8.1f/s  updateDataset %8.1f/s' % (name, list_rate, update_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import collections
+import copy
+import threading
+import time
+
+
+class ResponseCache(object):
+    """
+    A bounded LRU cache for SyncManager's find_* results. Each entity type
+    (datastore, workflow, action, trigger, dataset, subscription) can have
+    its own time to live, and "not found" results are cached too. Entries
+    are keyed by entity type, entity name and the remaining find arguments
+    so that a SyncManager can invalidate everything it cached for a name
+    when it creates, updates or deletes that entity.
+    """
+
+    def __init__(self, max_size=1024, default_ttl=60, ttls=None, negative_ttl=None, clock=time.time):
+        """
+        :param max_size: the maximum number of cached entries
+        :param default_ttl: the time to live in seconds of entries whose
+            entity type has no entry in ttls
+        :param ttls: a dictionary of entity type => time to live in seconds
+        :param negative_ttl: the time to live in seconds of "not found"
+            entries, or None to use the entity type's time to live
+        :param clock: a function returning the current time in seconds
+        """
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.ttls = ttls or {}
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, entity_type, name, key=()):
+        """
+        Look up a cached entity. Cached objects are deep copied so that
+        callers are free to modify them.
+
+        :param entity_type: the entity type, e.g. 'dataset'
+        :param name: the entity name
+        :param key: the other find arguments as a hashable value
+        :return: a tuple of (hit, entity) where entity is None for a cached
+            "not found" result
+        """
+        cache_key = (entity_type, name, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires, entity = entry
+            if expires <= self.clock():
+                del self._entries[cache_key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            del self._entries[cache_key]
+            self._entries[cache_key] = entry
+            self.hits += 1
+        return True, copy.deepcopy(entity)
+
+    def put(self, entity_type, name, key, entity):
+        """
+        Cache a find result.
+
+        :param entity_type: the entity type, e.g. 'dataset'
+        :param name: the entity name
+        :param key: the other find arguments as a hashable value
+        :param entity: the entity, or None if it was not found
+        """
+        ttl = self.ttls.get(entity_type, self.default_ttl)
+        if entity is None and self.negative_ttl is not None:
+            ttl = self.negative_ttl
+        if ttl <= 0:
+            return
+        cache_key = (entity_type, name, key)
+        entity = copy.deepcopy(entity)
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = (self.clock() + ttl, entity)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, entity_type, name=None):
+        """
+        Remove the cached entries for an entity type.
+
+        :param entity_type: the entity type, e.g. 'dataset'
+        :param name: only remove the entries for this entity name
+        """
+        with self._lock:
+            for cache_key in list(self._entries):
+                if cache_key[0] == entity_type and (name is None or cache_key[1] == name):
+                    del self._entries[cache_key]
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def as_dict(self):
+        """
+        :return: the counters as a dictionary
+        """
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,242 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import logging
+import threading
+import time
+
+from dartclient.core import _status_code
+
+
+_logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot(object):
+    """
+    An immutable view of the catalog's entities. The catalog replaces its
+    snapshot as a whole on every refresh, so readers never need a lock.
+    """
+
+    def __init__(self, entities, loaded_at):
+        """
+        :param entities: a dictionary of entity type => {id: entity}
+        :param loaded_at: when the entities were fetched
+        """
+        self.entities = entities
+        self.loaded_at = loaded_at
+        self.by_name = {}
+        for entity_type, by_id in entities.items():
+            by_name = self.by_name[entity_type] = {}
+            for entity in by_id.values():
+                by_name.setdefault(entity.data.name, []).append(entity)
+
+    def high_water_mark(self, entity_type):
+        """
+        :return: the latest updated timestamp of the entity type, or None
+        """
+        return max([entity.updated for entity in self.entities[entity_type].values() if entity.updated] or [None])
+
+
+class EntityCatalog(object):
+    """
+    An in-memory catalog of every entity of the chosen types, for services
+    that look entities up on every request. The catalog is loaded once and
+    then kept fresh by a background thread.
+
+    Refreshes are incremental where possible: only the entities updated
+    since the newest one already seen are listed ('updated >= ...'). Every
+    full_refresh_every refreshes, and whenever an incremental list fails,
+    everything is listed again, which also drops deleted entities. If the
+    server rejects the 'updated' filter (a 4xx response), every later
+    refresh is a full one.
+
+    Reads (get, find) use the current snapshot without locking. The
+    entities are shared between readers and must not be modified.
+    """
+
+    def __init__(self, sync_manager, entity_types=('workflow', 'dataset', 'subscription'), refresh_interval=60.0,
+                 full_refresh_every=10, page_size=None, filters=None, clock=time.time):
+        """
+        :param sync_manager: the SyncManager
+        :param entity_types: the entity types to load
+        :param refresh_interval: the time in seconds between refreshes
+        :param full_refresh_every: how many refreshes are incremental before
+            the next full one; 0 or 1 makes every refresh a full one
+        :param page_size: the number of entities to request per page, by
+            default chosen by SyncManager.iter_entities
+        :param filters: an optional dictionary of entity type => filters
+        :param clock: a function returning the current time in seconds
+        """
+        self.sync_manager = sync_manager
+        self.entity_types = tuple(entity_types)
+        self.refresh_interval = refresh_interval
+        self.full_refresh_every = full_refresh_every
+        self.page_size = page_size
+        self.filters = filters or {}
+        self.clock = clock
+        self.snapshot = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_refresh_seconds = None
+        self.last_refreshed = None
+        self.incremental = True
+        self._stop = threading.Event()
+        self._thread = None
+        self._refresh_lock = threading.Lock()
+
+    def _list(self, entity_type, expressions=()):
+        entities = self.sync_manager.iter_entities(entity_type, page_size=self.page_size, expressions=expressions,
+                                                   **self.filters.get(entity_type, {}))
+        return dict((entity.id, entity) for entity in entities)
+
+    def refresh(self, full=False):
+        """
+        Fetch the changes since the last refresh and replace the snapshot.
+
+        :param full: whether to list every entity instead of only the
+            recently updated ones
+        """
+        with self._refresh_lock:
+            started = self.clock()
+            previous = self.snapshot
+            full = full or previous is None or not self.incremental or \
+                self.full_refresh_every <= 1 or self.refreshes % self.full_refresh_every == 0
+            entities = {}
+            for entity_type in self.entity_types:
+                since = None if full else previous.high_water_mark(entity_type)
+                if since is None:
+                    entities[entity_type] = self._list(entity_type)
+                    continue
+                try:
+                    changed = self._list(entity_type, expressions=('updated >= %s' % (since,),))
+                except Exception as e:
+                    _logger.warning('Incremental refresh of %s failed, listing everything', entity_type, exc_info=True)
+                    status_code = _status_code(e)
+                    if status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429):
+                        self.incremental = False
+                    changed = None
+                if changed is None:
+                    entities[entity_type] = self._list(entity_type)
+                else:
+                    entities[entity_type] = dict(previous.entities[entity_type])
+                    entities[entity_type].update(changed)
+            self.snapshot = CatalogSnapshot(entities, started)
+            self.refreshes += 1
+            self.last_refreshed = self.clock()
+            self.last_refresh_seconds = self.last_refreshed - started
+
+    def load(self):
+        """
+        Load every entity, replacing the current snapshot.
+        """
+        self.refresh(full=True)
+
+    def get(self, entity_type, entity_id):
+        """
+        :return: the entity with the id, or None
+        """
+        return self._snapshot().entities[entity_type].get(entity_id)
+
+    def find(self, entity_type, name):
+        """
+        :return: the entity with the name, or None; if several entities have
+            the name (e.g. actions of different workflows), use find_all
+        """
+        entities = self.find_all(entity_type, name)
+        return entities[0] if entities else None
+
+    def find_all(self, entity_type, name):
+        """
+        :return: a list of the entities with the name
+        """
+        return list(self._snapshot().by_name[entity_type].get(name, ()))
+
+    def _snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError('The catalog has not been loaded')
+        return snapshot
+
+    @property
+    def staleness(self):
+        """
+        :return: the age in seconds of the data in the catalog, or None if
+            it has not been loaded
+        """
+        snapshot = self.snapshot
+        return None if snapshot is None else self.clock() - snapshot.loaded_at
+
+    def as_dict(self):
+        """
+        :return: the catalog metrics as a dictionary
+        """
+        snapshot = self.snapshot
+        return {
+            'entities': dict((entity_type, len(snapshot.entities[entity_type]) if snapshot else 0)
+                             for entity_type in self.entity_types),
+            'staleness': self.staleness,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'incremental': self.incremental,
+        }
+
+    def start(self):
+        """
+        Load the catalog if necessary and start the background refresher.
+
+        :return: the catalog
+        """
+        if self.snapshot is None:
+            self.load()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='dartclient-catalog')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the background refresher.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                _logger.exception('Refreshing the catalog failed')
@@ -0,0 +1,143 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import argparse
+import os
+import sys
+
+from six.moves.urllib import parse as urlparse
+
+from dartclient.core import create_basic_authenticator, create_client, create_sync_manager
+from dartclient.drift import DesiredModel, detect_drift, LiveState
+from dartclient.plan import ModelPlan, PlanRunner
+from dartclient.shard import SharedRateLimiter, ShardedPlanRunner
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='dartclient',
+        description='Synchronize a declarative Dart model (YAML or JSON) with a Dart server.')
+    parser.add_argument('--api-url', default=os.environ.get('DART_API_URL'),
+                        help='the Dart API URL, e.g. https://dart.example.com/api/1 (default: $DART_API_URL)')
+    parser.add_argument('--origin-url', default=os.environ.get('DART_ORIGIN_URL'),
+                        help='the Swagger specification URL (default: $DART_ORIGIN_URL or API_URL/swagger.json)')
+    parser.add_argument('--username', default=os.environ.get('DART_API_KEY'),
+                        help='the HTTP Basic username (default: $DART_API_KEY)')
+    parser.add_argument('--password', default=os.environ.get('DART_SECRET_KEY'),
+                        help='the HTTP Basic password (default: $DART_SECRET_KEY)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='the maximum number of concurrent requests (default: 8)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='sync or clean the model with this many processes, each with its own client '
+                             '(default: 1)')
+    parser.add_argument('--rate', type=float,
+                        help='the maximum number of requests per second, shared by all processes (default: no limit)')
+    parser.add_argument('--quiet', action='store_true', help='only print the summary')
+
+    subparsers = parser.add_subparsers(dest='command')
+    for command, help_text in (('sync', 'create or update every entity in the model'),
+                               ('clean', 'delete every datastore and dataset in the model'),
+                               ('drift', 'report the entities that differ from the model, without changing them')):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument('model', help='the model description file (.yaml, .yml or .json)')
+        if command == 'drift':
+            subparser.add_argument('--snapshot', help='compare with a snapshot file instead of the live server')
+        if command == 'sync':
+            subparser.add_argument('--journal', help='record completed steps in this file and skip the steps it '
+                                                     'already records; removed once the sync succeeds')
+    return parser
+
+
+def print_progress(step, completed, total):
+    if step.skipped:
+        status = 'skipped'
+    elif step.error is not None:
+        status = 'FAILED: %s' % (step.error,)
+    else:
+        status = 'ok'
+    sys.stderr.write('[%d/%d] %s %s %.3fs %s\n' % (
+        completed, total, step.entity_type, '/'.join(step.path), step.seconds, status))
+
+
+def main(argv=None):
+    """
+    The entry point of the ``dartclient`` console script.
+
+    :param argv: the command line arguments, defaults to sys.argv[1:]
+    :return: the process exit code
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.error('a command is required')
+    if not args.api_url and not args.origin_url:
+        parser.error('--api-url or --origin-url is required')
+    sharded = args.processes > 1 and args.command != 'drift'
+    if sharded and getattr(args, 'journal', None):
+        parser.error('--journal cannot be used with --processes')
+
+    plan = ModelPlan.load(args.model)
+
+    authenticator = None
+    if args.username:
+        host = urlparse.urlparse(args.api_url or args.origin_url).hostname
+        authenticator = create_basic_authenticator(host, username=args.username, password=args.password)
+    progress = None if args.quiet else print_progress
+    if sharded:
+        runner = ShardedPlanRunner(plan, {'origin_url': args.origin_url, 'api_url': args.api_url,
+                                          'authenticator': authenticator},
+                                   {'model_defaults': plan.defaults, 'coalesce_reads': True},
+                                   processes=args.processes, workers=args.workers, rate=args.rate, progress=progress)
+        report = runner.sync() if args.command == 'sync' else runner.clean()
+        sys.stderr.write(report.summary() + '\n')
+        return 0 if report.ok else 1
+
+    client = create_client(origin_url=args.origin_url, api_url=args.api_url, authenticator=authenticator,
+                           rate_limiter=SharedRateLimiter(args.rate) if args.rate else None)
+    sync_manager = create_sync_manager(client=client, model_defaults=plan.defaults, coalesce_reads=True,
+                                       journal=getattr(args, 'journal', None))
+
+    if args.command == 'drift':
+        desired = DesiredModel.from_plan(sync_manager.model_factory, plan)
+        if args.snapshot:
+            live = LiveState.from_snapshot(args.snapshot)
+        else:
+            live = LiveState.fetch(sync_manager, workers=args.workers)
+        drift = detect_drift(desired, live)
+        sys.stderr.write(drift.summary() + '\n')
+        return 0 if drift.ok else 1
+
+    runner = PlanRunner(sync_manager, plan, workers=args.workers, progress=progress)
+    report = runner.sync() if args.command == 'sync' else runner.clean()
+    sys.stderr.write(report.summary() + '\n')
+    if getattr(args, 'journal', None):
+        journal = sync_manager.journal
+        sys.stderr.write('%(resumed)d steps resumed from the journal, %(invalidated)d redone\n' % journal.as_dict())
+        journal.close()
+        if report.ok:
+            os.remove(journal.path)
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
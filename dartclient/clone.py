@@ -0,0 +1,100 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dartclient.models import model_to_dict
+from dartclient.snapshot import create_records, SnapshotReport
+
+
+def clone_datastore(sync_manager, datastore_name, datastore_state, new_datastore_name, new_datastore_state=None,
+                    callback=None, id_map=None, workers=8, batch_size=100):
+    """
+    Copy a datastore with its workflows, actions and triggers, e.g. to stamp
+    out a team's copy of a TEMPLATE datastore. The subtree is read with one
+    paginated list of workflows and concurrent lists of actions and triggers
+    per workflow. The copies are then created concurrently, with the actions
+    of each workflow created in batches. Workflow and datastore ids are
+    rewritten to the new entities (trigger workflow_ids, workflow completion
+    trigger args), and action and trigger dataset_id and subscription_id
+    args are rewritten with id_map.
+
+    Action instances (actions with a workflow_instance_id) are not copied.
+
+    :param sync_manager: the SyncManager
+    :param datastore_name: the name of the datastore to copy
+    :param datastore_state: the state of the datastore to copy
+    :param new_datastore_name: the name of the copy
+    :param new_datastore_state: the state of the copy, by default the same
+        as the original
+    :param callback: an optional function with a signature
+        (entity_type, entity) => entity to modify each copy before it is
+        created; entities are dictionaries
+    :param id_map: an optional dictionary of entity type => {old id: new id},
+        e.g. {'dataset': {...}} to point the copies at other datasets
+    :param workers: the maximum number of concurrent requests
+    :param batch_size: the maximum number of actions per createWorkflowActions
+    :return: a SnapshotReport whose id_map maps original ids to the copies
+    """
+    started = time.time()
+    datastore = sync_manager.find_datastore(datastore_name, datastore_state)
+    if datastore is None:
+        raise Exception('Datastore %s (%s) not found.' % (datastore_name, datastore_state))
+    workflows = [model_to_dict(workflow) for workflow in sync_manager.iter_entities('workflow', datastore_id=datastore.id)]
+    workflow_ids = set(workflow['id'] for workflow in workflows)
+
+    def list_children(workflow_id):
+        actions = [model_to_dict(action) for action in sync_manager.iter_entities('action', workflow_id=workflow_id)]
+        triggers = [model_to_dict(trigger) for trigger in sync_manager.iter_entities('trigger', workflow_ids=workflow_id)]
+        return [action for action in actions if not action['data'].get('workflow_instance_id')], triggers
+
+    actions, triggers = [], {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for workflow_actions, workflow_triggers in executor.map(list_children, sorted(workflow_ids)):
+            actions.extend(workflow_actions)
+            triggers.update((trigger['id'], trigger) for trigger in workflow_triggers)
+
+    def record(entity_type, entity, parents):
+        entity = callback(entity_type, entity) if callback else entity
+        return {'type': entity_type, 'id': entity['id'], 'parents': parents, 'entity': entity}
+
+    source = model_to_dict(datastore)
+    source['data']['name'] = new_datastore_name
+    source['data']['state'] = new_datastore_state or datastore_state
+
+    report = SnapshotReport()
+    for entity_type, mapping in (id_map or {}).items():
+        report.id_map[entity_type].update(mapping)
+    stages = (
+        [record('datastore', source, [])],
+        [record('workflow', workflow, [('datastore', datastore.id)]) for workflow in workflows],
+        [record('action', action, [('workflow', action['data']['workflow_id'])]) for action in actions] +
+        [record('trigger', trigger, [('workflow', workflow_id) for workflow_id in trigger['data']['workflow_ids']
+                                     if workflow_id in workflow_ids])
+         for (_, trigger) in sorted(triggers.items())],
+    )
+    for records in stages:
+        create_records(sync_manager, records, report, workers=workers, batch_size=batch_size)
+    report.seconds = time.time() - started
+    return report
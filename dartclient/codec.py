@@ -0,0 +1,164 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+
+import simplejson
+
+
+class JsonCodec(object):
+    """
+    Encodes request bodies and decodes response bodies. The default
+    implementation uses simplejson, which is what bravado uses internally.
+    Sub-class to plug in a different JSON library.
+    """
+    name = 'simplejson'
+
+    def dumps(self, value):
+        """
+        :param value: the json-like value to encode
+        :return: the encoded value as str or bytes
+        """
+        return simplejson.dumps(value)
+
+    def loads(self, content):
+        """
+        :param content: the raw response body as bytes or str
+        :return: the decoded json-like value
+        """
+        return simplejson.loads(content)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+
+class StdlibJsonCodec(JsonCodec):
+    """
+    A codec backed by the standard library json module.
+    """
+    name = 'json'
+
+    def dumps(self, value):
+        return json.dumps(value)
+
+    def loads(self, content):
+        if not isinstance(content, str):
+            content = content.decode('utf-8')
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    A codec backed by orjson. orjson produces bytes, which requests sends
+    as-is.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, value):
+        return self._orjson.dumps(value)
+
+    def loads(self, content):
+        return self._orjson.loads(content)
+
+
+class UjsonCodec(JsonCodec):
+    """
+    A codec backed by ujson.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, value):
+        return self._ujson.dumps(value)
+
+    def loads(self, content):
+        return self._ujson.loads(content)
+
+
+CODECS = {
+    'orjson': OrjsonCodec,
+    'ujson': UjsonCodec,
+    'simplejson': JsonCodec,
+    'json': StdlibJsonCodec,
+}
+
+PREFERRED_CODECS = ('orjson', 'ujson', 'simplejson')
+
+
+def get_json_codec(name='auto'):
+    """
+    Look up a JSON codec by name.
+
+    :param name: One of 'orjson', 'ujson', 'simplejson' or 'json', a JsonCodec
+        instance which is returned as-is, or 'auto' to pick the fastest library
+        that is installed.
+    :return: the JsonCodec instance
+    """
+    if isinstance(name, JsonCodec):
+        return name
+    if name == 'auto':
+        for candidate in PREFERRED_CODECS:
+            try:
+                return CODECS[candidate]()
+            except ImportError:
+                continue
+    if name not in CODECS:
+        raise ValueError('Unknown JSON codec: %s' % (name,))
+    return CODECS[name]()
+
+
+class _RequestEncoder(object):
+    """
+    Stands in for the simplejson module that bravado_core uses to encode
+    request bodies, delegating dumps to a codec.
+    """
+
+    def __init__(self, codec):
+        self.codec = codec
+
+    def dumps(self, value, *args, **kwargs):
+        if args or kwargs:
+            return simplejson.dumps(value, *args, **kwargs)
+        return self.codec.dumps(value)
+
+    def __getattr__(self, item):
+        return getattr(simplejson, item)
+
+
+def install_request_codec(codec):
+    """
+    Encode request bodies with the codec. bravado_core serializes bodies
+    before they reach the HTTP client, so this applies to every client in the
+    process rather than to a single client.
+
+    :param codec: a JsonCodec instance, or None to restore simplejson
+    """
+    import bravado_core.param
+    bravado_core.param.json = _RequestEncoder(codec) if codec else simplejson
@@ -0,0 +1,288 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import csv
+import re
+
+import six
+
+
+COLUMN_FIELDS = ('name', 'data_type', 'length', 'precision', 'scale',
+                 'date_pattern', 'description', 'path')
+
+_DDL_BODY = re.compile(r'\((.*)\)', re.DOTALL)
+_DDL_TYPE = re.compile(r'^(\w+)\s*(?:\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?')
+
+
+class ColumnSchema(object):
+    """
+    A compact, columnar description of a dataset's columns. The column
+    attributes are held in parallel lists rather than as one Column model
+    object per column, which keeps very wide schemas cheap to build, to
+    serialize into a request payload and to diff against Dart.
+    """
+
+    def __init__(self, names, data_types, **attributes):
+        """
+        :param names: the column names
+        :param data_types: the column data types, parallel to names
+        :param attributes: optional parallel lists for the other Column fields
+            (length, precision, scale, date_pattern, description, path)
+        """
+        if len(names) != len(data_types):
+            raise ValueError('names and data_types must have the same length')
+        for field, values in attributes.items():
+            if field not in COLUMN_FIELDS:
+                raise ValueError('Unknown column field: %s' % (field,))
+            if len(values) != len(names):
+                raise ValueError('%s must have the same length as names' % (field,))
+        self.names = list(names)
+        self.data_types = list(data_types)
+        self.attributes = dict((field, list(values)) for (field, values) in attributes.items())
+
+    @classmethod
+    def from_rows(cls, rows, fields=('name', 'data_type')):
+        """
+        Build a schema from an iterable of tuples.
+
+        :param rows: an iterable of tuples, one per column
+        :param fields: the column field that each tuple position maps to
+        :return: the ColumnSchema
+        """
+        columns = dict((field, []) for field in fields)
+        for row in rows:
+            if len(row) != len(fields):
+                raise ValueError('Expected %d values per row, got %r' % (len(fields), row))
+            for field, value in zip(fields, row):
+                columns[field].append(value)
+        names = columns.pop('name')
+        data_types = columns.pop('data_type')
+        return cls(names, data_types, **columns)
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """
+        Build a schema from an iterable of dictionaries (or Column model
+        objects) keyed by column field name.
+
+        :param rows: an iterable of dictionaries or Column objects
+        :return: the ColumnSchema
+        """
+        rows = [_column_to_dict(row) for row in rows]
+        fields = [field for field in COLUMN_FIELDS[2:]
+                  if any(row.get(field) is not None for row in rows)]
+        return cls([row['name'] for row in rows],
+                   [row['data_type'] for row in rows],
+                   **dict((field, [row.get(field) for row in rows]) for field in fields))
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """
+        Build a schema from a CSV file whose header row names the column
+        fields, e.g. ``name,data_type,length``.
+
+        :param csv_file: a path or an open file object
+        :return: the ColumnSchema
+        """
+        if isinstance(csv_file, six.string_types):
+            with open(csv_file) as f:
+                return cls.from_csv(f)
+        reader = csv.DictReader(csv_file)
+        fields = [field.strip() for field in reader.fieldnames]
+        rows = []
+        for row in reader:
+            rows.append(dict((field.strip(), _coerce_value(field.strip(), value))
+                             for (field, value) in row.items() if field))
+        missing = [field for field in ('name', 'data_type') if field not in fields]
+        if missing:
+            raise ValueError('CSV header is missing: %s' % (', '.join(missing),))
+        return cls.from_dicts(rows)
+
+    @classmethod
+    def from_ddl(cls, ddl):
+        """
+        Build a schema from a ``CREATE TABLE`` statement. Only the column
+        names and types are read, e.g. ``VARCHAR(64)`` or ``DECIMAL(10, 2)``;
+        constraints and other table options are ignored.
+
+        :param ddl: the DDL text
+        :return: the ColumnSchema
+        """
+        match = _DDL_BODY.search(ddl)
+        if not match:
+            raise ValueError('No column list found in DDL')
+        names, data_types = [], []
+        lengths, precisions, scales = [], [], []
+        for definition in _split_top_level(match.group(1)):
+            parts = definition.split(None, 1)
+            if len(parts) < 2 or parts[0].upper() in ('PRIMARY', 'CONSTRAINT', 'UNIQUE', 'FOREIGN', 'KEY'):
+                continue
+            type_match = _DDL_TYPE.match(parts[1])
+            if not type_match:
+                raise ValueError('Cannot parse column definition: %s' % (definition,))
+            data_type, first, second = type_match.groups()
+            data_type = data_type.upper()
+            names.append(parts[0].strip('`"[]'))
+            data_types.append(data_type)
+            if data_type in ('DECIMAL', 'NUMERIC'):
+                lengths.append(None)
+                precisions.append(int(first) if first else None)
+                scales.append(int(second) if second else None)
+            else:
+                lengths.append(int(first) if first else None)
+                precisions.append(None)
+                scales.append(None)
+        attributes = {}
+        for field, values in (('length', lengths), ('precision', precisions), ('scale', scales)):
+            if any(value is not None for value in values):
+                attributes[field] = values
+        return cls(names, data_types, **attributes)
+
+    @classmethod
+    def coerce(cls, columns):
+        """
+        Convert the supported column representations into a ColumnSchema.
+
+        :param columns: a ColumnSchema, or a sequence of (name, data_type)
+            tuples, dictionaries or Column objects
+        :return: the ColumnSchema
+        """
+        if isinstance(columns, ColumnSchema):
+            return columns
+        columns = list(columns)
+        if columns and isinstance(columns[0], (tuple, list)):
+            return cls.from_rows(columns)
+        return cls.from_dicts(columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return (self.column(index) for index in range(len(self.names)))
+
+    def column(self, index):
+        """
+        :param index: the column position
+        :return: the column as a dictionary, omitting unset fields
+        """
+        column = {'name': self.names[index], 'data_type': self.data_types[index]}
+        for field, values in self.attributes.items():
+            if values[index] is not None:
+                column[field] = values[index]
+        return column
+
+    def to_payload(self):
+        """
+        Serialize the columns for a request body. Bravado accepts plain
+        dictionaries wherever a model is expected, so no Column objects
+        are created.
+
+        :return: a list of dictionaries
+        """
+        return list(self)
+
+
+class ColumnDiff(object):
+    """
+    The column-level differences between a dataset in Dart and a desired
+    ColumnSchema.
+    """
+
+    def __init__(self, added, removed, changed, reordered):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.reordered = reordered
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.reordered)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return 'ColumnDiff(added=%r, removed=%r, changed=%r, reordered=%r)' % (
+            self.added, self.removed, self.changed, self.reordered)
+
+
+def diff_columns(existing, desired):
+    """
+    Compare the columns of an existing dataset with a desired schema. Columns
+    are matched by name, so the comparison is linear in the number of columns.
+
+    :param existing: the existing columns, e.g. dataset.data.columns
+    :param desired: a ColumnSchema or anything ColumnSchema.coerce accepts
+    :return: a ColumnDiff; ``changed`` maps each column name to a dictionary
+        of field => (existing value, desired value)
+    """
+    desired = ColumnSchema.coerce(desired)
+    existing = [_column_to_dict(column) for column in (existing or [])]
+    existing_by_name = dict((column['name'], column) for column in existing)
+    desired_names = set(desired.names)
+
+    added = [name for name in desired.names if name not in existing_by_name]
+    removed = [column['name'] for column in existing if column['name'] not in desired_names]
+    changed = {}
+    for column in desired:
+        current = existing_by_name.get(column['name'])
+        if current is None:
+            continue
+        fields = dict((field, (current.get(field), column.get(field)))
+                      for field in COLUMN_FIELDS
+                      if current.get(field) != column.get(field))
+        if fields:
+            changed[column['name']] = fields
+    common = [name for name in desired.names if name in existing_by_name]
+    reordered = common != [column['name'] for column in existing if column['name'] in desired_names]
+    return ColumnDiff(added, removed, changed, reordered)
+
+
+def _column_to_dict(column):
+    if isinstance(column, dict):
+        return column
+    return dict((field, getattr(column, field, None)) for field in COLUMN_FIELDS)
+
+
+def _coerce_value(field, value):
+    value = value.strip() if value is not None else None
+    if not value:
+        return None
+    if field in ('length', 'precision', 'scale'):
+        return int(value)
+    return value
+
+
+def _split_top_level(text):
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
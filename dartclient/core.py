@@ -21,8 +21,33 @@
 #  SOFTWARE.
 
 
+import copy
+import functools
+import inspect
+import threading
+import time
+
 from bravado.client import SwaggerClient
-from bravado.requests_client import BasicAuthenticator, RequestsClient
+from bravado.requests_client import BasicAuthenticator
+import requests
+import six
+
+from dartclient.cache import ResponseCache
+from dartclient.codec import get_json_codec, install_request_codec
+from dartclient.coalesce import SingleFlight
+from dartclient.columns import ColumnSchema, diff_columns
+from dartclient.deadline import Deadline, DeadlineExceeded
+from dartclient.hedge import HedgingPolicy
+from dartclient.http_client import DartRequestsClient
+from dartclient.index import EntityIndex, fingerprint, GET_OPERATIONS, matches_filters
+from dartclient.journal import SyncJournal
+from dartclient.launch import launch_workflow_runs
+from dartclient.models import ENTITY_TYPES, model_to_dict
+from dartclient.paging import PageSizeTuner
+from dartclient.patch import PATCH_OPERATIONS, patch_operations, payload_size, UnchangedResponse, UpdateStats
+from dartclient.tags import clean_by_tag, find_by_tag
+from dartclient.tracing import traced
+from dartclient.validation import ValidationPolicy
 
 
 def create_basic_authenticator(host, username, password):
@@ -37,7 +62,9 @@ def create_basic_authenticator(host, username, password):
     return BasicAuthenticator(host=host, username=username, password=password)
 
 
-def create_client(origin_url=None, config=None, api_url=None, authenticator=None):
+def create_client(origin_url=None, config=None, api_url=None, authenticator=None, json_codec=None,
+                  compress_request_threshold=None, pool_maxsize=None, timeouts=None, validation=None,
+                  rate_limiter=None):
     """
     Create the Bravado swagger client from the specified origin url and config.
     For the moment, the Swagger specification for Dart is actually bundled
@@ -52,7 +79,34 @@ def create_client(origin_url=None, config=None, api_url=None, authenticator=None
     :param api_url: The base URL for the API endpoints.
     :param authenticator: An authenticator instance to use when making API
         requests
-    :return: The Bravado SwaggerClient instance.
+    :param json_codec: An optional JsonCodec instance or codec name ('auto',
+        'orjson', 'ujson', 'simplejson' or 'json') used to decode responses
+        and encode request bodies. Request encoding is installed process-wide
+        because bravado serializes bodies before they reach the HTTP client.
+    :param compress_request_threshold: If set, request bodies larger than
+        this many bytes are sent gzip compressed. Compression is switched off
+        for the client if the server answers 415 Unsupported Media Type.
+        Responses are always requested with gzip/deflate encoding; the bytes
+        saved in both directions are counted in
+        client.swagger_spec.http_client.compression_stats.
+    :param pool_maxsize: The number of HTTP connections to keep per host,
+        which should be at least the number of threads making requests.
+        Defaults to the requests default of 10.
+    :param timeouts: Default request timeouts in seconds, keyed by operation
+        id (e.g. 'listActions'), by operation kind (the leading verb of the
+        operation id, e.g. 'list', 'get', 'create', 'update', 'delete') or
+        by 'default'. The most specific entry applies. A shorter timeout
+        derived from a SyncManager deadline takes precedence. Requests
+        without an entry have no timeout.
+    :param validation: A ValidationPolicy, or a dictionary of its policies,
+        e.g. {'list': 0.01} to validate one list response in a hundred and
+        every other request and response. Validators are compiled once for
+        the whole spec. By default bravado validates everything.
+    :param rate_limiter: An object whose ``acquire()`` method blocks until
+        the next request may be sent, e.g. a shard.SharedRateLimiter shared
+        by several processes.
+    :return: The Bravado SwaggerClient instance. It may be shared between
+        threads.
     """
     if origin_url:
         spec_url = origin_url
@@ -61,9 +115,20 @@ def create_client(origin_url=None, config=None, api_url=None, authenticator=None
     else:
         raise RuntimeError('One of origin_url or api_url must be specified')
 
-    http_client = RequestsClient()
+    if json_codec:
+        json_codec = get_json_codec(json_codec)
+        install_request_codec(json_codec)
+
+    http_client = DartRequestsClient(
+        json_codec=json_codec, compress_request_threshold=compress_request_threshold, pool_maxsize=pool_maxsize,
+        timeouts=timeouts, rate_limiter=rate_limiter)
     http_client.authenticator = authenticator
     client = SwaggerClient.from_url(spec_url=spec_url, config=config, http_client=http_client)
+    client.swagger_spec.resolver = ThreadLocalResolver(client.swagger_spec.resolver)
+    if validation is not None:
+        if isinstance(validation, dict):
+            validation = ValidationPolicy(validation)
+        validation.attach(client)
 
     if api_url:
         client.swagger_spec.api_url = api_url
@@ -71,12 +136,44 @@ def create_client(origin_url=None, config=None, api_url=None, authenticator=None
     return client
 
 
+class ThreadLocalResolver(object):
+    """
+    Wraps the jsonschema RefResolver of a bravado Swagger spec so that each
+    thread resolves references with its own scope stack. bravado pushes and
+    pops resolution scopes on the spec's single resolver while marshalling
+    and validating, which corrupts the stack when several threads make
+    requests at once. The per-thread copies share the resolved documents.
+    """
+
+    def __init__(self, resolver):
+        self._resolver = resolver
+        self._local = threading.local()
+
+    def _thread_resolver(self):
+        resolver = getattr(self._local, 'resolver', None)
+        if resolver is None:
+            resolver = copy.copy(self._resolver)
+            resolver._scopes_stack = [self._resolver.resolution_scope]
+            self._local.resolver = resolver
+        return resolver
+
+    def __getattr__(self, name):
+        return getattr(self._thread_resolver(), name)
+
+
 def create_sync_manager(client=None,
                         origin_url=None,
                         api_url=None,
                         config=None,
                         model_factory=None,
-                        model_defaults=None):
+                        model_defaults=None,
+                        coalesce_reads=False,
+                        cache=None,
+                        partial_updates=False,
+                        index=None,
+                        page_tuner=None,
+                        hedging=None,
+                        journal=None):
     """
     Convenient method to create a SyncManager instance.
 
@@ -89,13 +186,41 @@ def create_sync_manager(client=None,
     :param model_factory: ModelFactory instance
     :param model_defaults: Dictionary of default values for construction
         a ModelFactory if one is not supplied
+    :param coalesce_reads: Share one in-flight request between concurrent
+        identical find/list calls. See SyncManager.
+    :param cache: A ResponseCache instance, or True to create one with the
+        default settings, to cache find_* results. See SyncManager.
+    :param partial_updates: Only send the changed fields of existing
+        entities. See SyncManager.
+    :param index: An EntityIndex, or the path of its SQLite file, used to
+        resolve names to ids. See SyncManager.
+    :param page_tuner: A PageSizeTuner, or True to create one with the
+        default settings, to adapt the page size of list operations. See
+        SyncManager.
+    :param hedging: A HedgingPolicy, or True to create one with the default
+        settings, to hedge slow reads. See SyncManager. Its threads are
+        stopped by SyncManager.close.
+    :param journal: A SyncJournal, or the path of its file, to make syncs
+        resumable. See SyncManager.
     :return:
     """
     client = client or create_client(
         origin_url=origin_url, config=config, api_url=api_url)
     model_factory = model_factory or ModelFactory(
         client, **(model_defaults or {}))
-    return SyncManager(client, model_factory)
+    if cache is True:
+        cache = ResponseCache()
+    if isinstance(index, six.string_types):
+        index = EntityIndex(index)
+    if page_tuner is True:
+        page_tuner = PageSizeTuner()
+    if hedging is True:
+        hedging = HedgingPolicy()
+    if isinstance(journal, six.string_types):
+        journal = SyncJournal(journal)
+    return SyncManager(client, model_factory, coalesce_reads=coalesce_reads, cache=cache,
+                       partial_updates=partial_updates, index=index, page_tuner=page_tuner,
+                       hedging=hedging, journal=journal)
 
 
 class ModelFactory(object):
@@ -128,7 +253,7 @@ class ModelFactory(object):
         get_model = self.client.get_model
         datastore = get_model('Datastore')(data=get_model('DatastoreData')())
         datastore.data.engine_name = self.engine_name
-        datastore.data.tags = self.tags
+        datastore.data.tags = list(self.tags)
         return datastore
 
     def create_workflow(self):
@@ -141,10 +266,10 @@ class ModelFactory(object):
         get_model = self.client.get_model
         workflow = get_model('Workflow')(data=get_model('WorkflowData')())
         workflow.data.engine_name = self.engine_name
-        workflow.data.on_failure_email = self.on_failure_email
-        workflow.data.on_started_email = self.on_started_email
-        workflow.data.on_success_email = self.on_success_email
-        workflow.data.tags = self.tags
+        workflow.data.on_failure_email = list(self.on_failure_email)
+        workflow.data.on_started_email = list(self.on_started_email)
+        workflow.data.on_success_email = list(self.on_success_email)
+        workflow.data.tags = list(self.tags)
         return workflow
 
     def create_action(self):
@@ -157,9 +282,9 @@ class ModelFactory(object):
         get_model = self.client.get_model
         action = get_model('Action')(data=get_model('ActionData')())
         action.data.engine_name = self.engine_name
-        action.data.on_failure_email = self.on_failure_email
-        action.data.on_success_email = self.on_success_email
-        action.data.tags = self.tags
+        action.data.on_failure_email = list(self.on_failure_email)
+        action.data.on_success_email = list(self.on_success_email)
+        action.data.tags = list(self.tags)
         return action
 
     def create_trigger(self):
@@ -170,19 +295,24 @@ class ModelFactory(object):
         """
         get_model = self.client.get_model
         trigger = get_model('Trigger')(data=get_model('TriggerData')())
-        trigger.data.tags = self.tags
+        trigger.data.tags = list(self.tags)
         return trigger
 
-    def create_dataset(self):
+    def create_dataset(self, columns=None):
         """
         Construct a dataset object and set the tags field to the default.
 
+        :param columns: An optional ColumnSchema, or a sequence of
+            (name, data_type) tuples or column dictionaries. The columns are
+            stored as plain dictionaries rather than Column objects.
         :return: the dataset object
         """
         get_model = self.client.get_model
         dataset = get_model('Dataset')(data=get_model('DatasetData')())
         dataset.data.data_format = get_model('DataFormat')()
-        dataset.data.tags = self.tags
+        dataset.data.tags = list(self.tags)
+        if columns is not None:
+            dataset.data.columns = ColumnSchema.coerce(columns).to_payload()
         return dataset
 
     def create_subscription(self):
@@ -194,31 +324,482 @@ class ModelFactory(object):
         get_model = self.client.get_model
         subscription = get_model('Subscription')(
             data=get_model('SubscriptionData')())
-        subscription.data.on_failure_email = self.on_failure_email
-        subscription.data.on_success_email = self.on_success_email
-        subscription.data.tags = self.tags
+        subscription.data.on_failure_email = list(self.on_failure_email)
+        subscription.data.on_success_email = list(self.on_success_email)
+        subscription.data.tags = list(self.tags)
         return subscription
 
 
+# entity type => (Swagger resource, list operation)
+LIST_OPERATIONS = {
+    'datastore': ('Datastore', 'listDatastores'),
+    'workflow': ('Workflow', 'listWorkflows'),
+    'action': ('Action', 'listActions'),
+    'trigger': ('Trigger', 'listTriggers'),
+    'dataset': ('Dataset', 'listDatasets'),
+    'subscription': ('Subscription', 'listSubscriptions'),
+    'workflow_instance': ('Workflow', 'listWorkflowInstances'),
+}
+
+DEFAULT_PAGE_SIZE = 1024
+
+
+def _id(entity):
+    return getattr(entity, 'id', None)
+
+
+def _journaled(entity_type, step_key):
+    """
+    Decorate a sync_* method so that, if the SyncManager has a journal, a
+    step that an earlier run completed is skipped and a completed step is
+    journaled.
+
+    :param entity_type: the entity type, e.g. 'workflow'
+    :param step_key: a function from the method's arguments, by name, to
+        the tuple of arguments that locate the entity besides its name
+    :return: the decorator
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if self.journal is None:
+                return fn(self, *args, **kwargs)
+            call_args = inspect.getcallargs(fn, self, *args, **kwargs)
+            name, key = call_args[entity_type + '_name'], step_key(call_args)
+            entity = self._resume(entity_type, name, key)
+            if entity is None:
+                entity = fn(self, *args, **kwargs)
+                self.journal.record(entity_type, name, key, entity.id, fingerprint(entity))
+            return entity
+        # functools.wraps only sets this on Python 3; traced reads the arguments from fn
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorator
+
+
 class SyncManager(object):
     """
     Provides convenient methods for synchronizing descriptions of a Dart
     model with a Dart server.
+
+    A SyncManager may be shared between threads. It keeps no per-call state;
+    the client created by create_client gives every thread its own HTTP
+    session, and the cache, index and counters are locked. Two threads
+    syncing the same entity at the same time still race like two separate
+    processes would: both may see it missing and both create it.
     """
 
-    def __init__(self, client, model_factory):
+    def __init__(self, client, model_factory, coalesce_reads=False, cache=None, partial_updates=False, index=None,
+                 page_tuner=None, hedging=None, journal=None):
+        """
+        :param client: bravado.client.SwaggerClient instance
+        :param model_factory: ModelFactory instance
+        :param coalesce_reads: If True, concurrent list calls with the same
+            operation and arguments (e.g. several threads calling
+            find_workflow for the same workflow) share a single in-flight
+            request. Threads that join an in-flight request receive a deep
+            copy of its result so that callbacks cannot interfere with each
+            other. The counters are available from single_flight.as_dict().
+        :param cache: An optional ResponseCache for find_* results, including
+            "not found" results. Entries for an entity name are invalidated
+            whenever this SyncManager creates, updates or deletes an entity
+            of that type and name. Changes made by anyone else are only seen
+            once the cached entries expire.
+        :param partial_updates: If True, the sync_* methods compare each
+            existing entity before and after the callback. Nothing is sent
+            if nothing changed; otherwise only the changed fields are sent
+            with a JSON Patch operation if the Swagger specification has one
+            (see PATCH_OPERATIONS), and the full entity is sent if not. The
+            counters, including the bytes sent, are in update_stats.
+        :param index: An optional EntityIndex shared with other processes.
+            find_* methods fetch an indexed entity by id and check that it
+            still matches instead of searching by name, and resolve_id
+            returns recently verified ids without any request. Entries that
+            fail validation are replaced with the result of a normal find.
+        :param page_tuner: An optional PageSizeTuner. Every list_page call
+            reports its response time and size to it, and iter_entities
+            uses its page sizes unless a page_size is given. The chosen
+            sizes are available from page_tuner.as_dict().
+        :param hedging: An optional HedgingPolicy for the read-only requests
+            of find_*, list_page and iter_entities. A read that has not
+            answered within the policy's delay is sent again and the first
+            answer is used. The counters are available from
+            hedging.as_dict().
+        :param journal: An optional SyncJournal recording each completed
+            sync_* step. A step that is already in the journal is skipped if
+            its entity, fetched by id, has not changed since; the journaled
+            entity is returned without calling the callback. This lets a
+            large sync that failed part way resume where it stopped.
+        """
         self.client = client
         self.model_factory = model_factory
+        self.single_flight = SingleFlight() if coalesce_reads else None
+        self.cache = cache
+        self.partial_updates = partial_updates
+        self.update_stats = UpdateStats()
+        self.index = index
+        self.page_tuner = page_tuner
+        self.hedging = hedging
+        self.journal = journal
+        self.deadline = None
+
+    def close(self):
+        """
+        Stop the hedging policy's request threads and close the journal, if
+        the SyncManager has them. A SyncManager can also be used as a
+        context manager that closes it.
+        """
+        if self.hedging is not None:
+            self.hedging.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def with_deadline(self, seconds):
+        """
+        Bound a run, e.g. the sync of a whole model, by a deadline. The
+        SyncManager returned shares this one's client, cache, index and
+        counters; each of its requests is given the time left before the
+        deadline as its timeout, and none is started once it has passed.
+        Either way DeadlineExceeded is raised.
+
+        :param seconds: the time budget in seconds, or a Deadline
+        :return: the SyncManager bound to the deadline
+        """
+        sync_manager = copy.copy(self)
+        sync_manager.deadline = seconds if isinstance(seconds, Deadline) else Deadline(seconds)
+        return sync_manager
+
+    def request_timeout(self, operation_id=None):
+        """
+        :param operation_id: the operation about to be called
+        :return: the timeout in seconds for a request starting now, or None
+            if there is no deadline
+        :raises DeadlineExceeded: if the deadline has passed
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline.timeout(operation_id)
+
+    def _result(self, future, operation_id, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except requests.exceptions.Timeout as e:
+            if self.deadline is not None and self.deadline.expired:
+                raise DeadlineExceeded('Deadline exceeded during %s: %s' % (operation_id, e))
+            raise
+
+    def _read(self, resource_name, operation_id, **kwargs):
+        """
+        Call a read-only operation and wait for its result.
+
+        :param resource_name: the Swagger resource, e.g. 'Workflow'
+        :param operation_id: the operation, e.g. 'listWorkflows'
+        :param kwargs: the operation arguments
+        :return: the operation result
+        """
+        return self._read_sized(resource_name, operation_id, **kwargs)[0]
+
+    def _read_sized(self, resource_name, operation_id, **kwargs):
+        """
+        Like _read, but also return the size of the response that the result
+        was decoded from, which may have been received by another thread
+        (a coalesced or hedged request).
 
-    def filter_by(self, **kwargs):
+        :return: a tuple of (the operation result, the decompressed response
+            body size in bytes, or None if the HTTP client does not report it)
+        """
+        operation = getattr(getattr(self.client, resource_name), operation_id)
+
+        def call():
+            # computed per attempt, so that a hedge gets the time that is left when it starts
+            timeout = self.request_timeout(operation_id)
+            future = operation(**kwargs)
+            return self._result(future, operation_id, timeout), _response_size(future)
+        if self.hedging is not None:
+            call = functools.partial(self.hedging.call, operation_id, call)
+        if self.single_flight is None:
+            return call()
+        key = (operation_id, tuple(sorted(kwargs.items())))
+        (result, size), shared = self.single_flight.do(key, call)
+        return (copy.deepcopy(result) if shared else result), size
+
+    def _write(self, entity_type, names, resource_name, operation_id, **kwargs):
+        """
+        Call an operation that modifies entities and wait for its result.
+        Cached find results for the affected entity names are invalidated
+        whether or not the call succeeds.
+
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param names: the names of the entities being modified
+        :param resource_name: the Swagger resource, e.g. 'Workflow'
+        :param operation_id: the operation, e.g. 'updateWorkflow'
+        :param kwargs: the operation arguments
+        :return: the operation result
+        """
+        operation = getattr(getattr(self.client, resource_name), operation_id)
+        timeout = self.request_timeout(operation_id)
+        try:
+            return self._result(operation(**kwargs), operation_id, timeout)
+        finally:
+            for name in set(names):
+                if self.cache is not None:
+                    self.cache.invalidate(entity_type, name)
+                if self.index is not None:
+                    self.index.discard(entity_type, name)
+
+    def _original(self, entity):
+        """
+        :param entity: an entity about to be passed to a sync callback
+        :return: a copy of the entity to compare with in _update, or None if
+            partial updates are disabled
+        """
+        return model_to_dict(entity) if self.partial_updates else None
+
+    def _update(self, entity_type, names, resource_name, operation_id, original, **kwargs):
+        """
+        Update an entity, sending only the changed fields if partial updates
+        are enabled.
+
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param names: the names of the entities being modified
+        :param resource_name: the Swagger resource of the full update
+        :param operation_id: the full update operation, e.g. 'updateWorkflow'
+        :param original: the entity as returned by _original
+        :param kwargs: the full update arguments, the entity id and the entity
+        :return: the operation result
+        """
+        if original is None:
+            return self._write(entity_type, names, resource_name, operation_id, **kwargs)
+        entity = kwargs[entity_type]
+        desired = model_to_dict(entity)
+        full_size = payload_size(desired)
+        operations = patch_operations(original, desired)
+        if not operations:
+            self.update_stats.record('unchanged', 0, full_size)
+            return UnchangedResponse(entity)
+        patch_resource, patch_operation, body_param = PATCH_OPERATIONS.get(entity_type, (None, None, None))
+        if patch_operation and hasattr(getattr(self.client, patch_resource), patch_operation):
+            id_param = entity_type + '_id'
+            response = self._write(entity_type, names, patch_resource, patch_operation,
+                                   **{id_param: kwargs[id_param], body_param: operations})
+            self.update_stats.record('patched', payload_size(operations), full_size)
+            return response
+        response = self._write(entity_type, names, resource_name, operation_id, **kwargs)
+        self.update_stats.record('full', full_size, full_size)
+        return response
+
+    def _find(self, entity_type, resource_name, operation_id, **filters):
+        """
+        Find a single entity with a list operation, consulting the cache if
+        there is one.
+
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param resource_name: the Swagger resource, e.g. 'Workflow'
+        :param operation_id: the list operation, e.g. 'listWorkflows'
+        :param filters: the filters, which must include the name
+        :return: the entity or None if not found
+        """
+        name = filters['name']
+        key = tuple(sorted((k, v) for (k, v) in filters.items() if k != 'name'))
+        if self.cache is not None:
+            hit, entity = self.cache.get(entity_type, name, key)
+            if hit:
+                return entity
+        entity = self._find_indexed(entity_type, key, filters) if self.index is not None else None
+        if entity is None:
+            response = self._read(resource_name, operation_id, filters=self.filter_by(**filters))
+            if response.total > 1:
+                raise Exception("More than one %s object found." % (entity_type,))
+            entity = response.results[0] if response.total > 0 else None
+            if self.index is not None:
+                if entity is not None:
+                    self.index.put(entity_type, name, entity.id, fingerprint(entity), key)
+                else:
+                    self.index.discard(entity_type, name, key)
+        if self.cache is not None:
+            self.cache.put(entity_type, name, key, entity)
+        return entity
+
+    def _find_indexed(self, entity_type, key, filters):
+        """
+        Fetch the entity that the index has for the find arguments by id, and
+        check that it still matches them.
+
+        :return: the entity, or None if it is not indexed or the entry is stale
+        """
+        name = filters['name']
+        entry = self.index.get(entity_type, name, key)
+        if entry is None:
+            return None
+        resource_name, operation_id = GET_OPERATIONS[entity_type]
+        try:
+            entity = self._read(resource_name, operation_id, **{entity_type + '_id': entry.id}).results
+        except Exception as e:
+            if _status_code(e) != 404:
+                raise
+            entity = None
+        if entity is None or not matches_filters(entity, filters):
+            self.index.mark_stale(entity_type, name, key)
+            return None
+        self.index.put(entity_type, name, entity.id, fingerprint(entity), key)
+        return entity
+
+    def _resume(self, entity_type, name, key):
+        """
+        Fetch the entity of a journaled sync step by id, and check that it
+        has not changed since the step.
+
+        :return: the entity, or None if the step is not journaled or the
+            entity has changed or is gone
+        """
+        entry = self.journal.get(entity_type, name, key)
+        if entry is None:
+            return None
+        resource_name, operation_id = GET_OPERATIONS[entity_type]
+        try:
+            entity = self._read(resource_name, operation_id, **{entity_type + '_id': entry.id}).results
+        except Exception as e:
+            if _status_code(e) != 404:
+                raise
+            entity = None
+        if entity is None or fingerprint(entity) != entry.fingerprint:
+            self.journal.count('invalidated')
+            return None
+        self.journal.count('resumed')
+        return entity
+
+    def resolve_id(self, entity_type, name, **filters):
+        """
+        Resolve an entity name to its id. With an index, an id verified less
+        than index.max_age seconds ago is returned without any request.
+
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param name: the entity name
+        :param filters: the other arguments that the find_* method uses, e.g.
+            datastore_id for a workflow or state for a datastore
+        :return: the id, or None if there is no such entity
+        """
+        key = tuple(sorted(filters.items()))
+        if self.index is not None:
+            entry = self.index.get(entity_type, name, key)
+            if entry is not None and self.index.is_fresh(entry):
+                return entry.id
+        resource_name, operation_id = LIST_OPERATIONS[entity_type]
+        entity = self._find(entity_type, resource_name, operation_id, name=name, **filters)
+        return entity.id if entity is not None else None
+
+    def filter_by(self, *expressions, **kwargs):
         """
         Convert the keyword args into a filters expression to use with list operations.
 
+        :param expressions: optional filter expressions with other operators,
+            e.g. 'updated >= 2016-06-01T00:00:00'
         :param kwargs: the keyword args
         :return: the filters expression
         """
-        return '[%s]' % ",".join(['"%s = %s"' % (key, value) for (key, value) in kwargs.items()])
+        return '[%s]' % ",".join(['"%s = %s"' % (key, value) for (key, value) in sorted(kwargs.items())] +
+                                 ['"%s"' % (expression,) for expression in expressions])
 
+    def list_page(self, entity_type, offset=0, limit=DEFAULT_PAGE_SIZE, expressions=(), **filters):
+        """
+        Fetch a single page of a list operation.
+
+        :param entity_type: one of the keys of LIST_OPERATIONS, e.g. 'action'
+        :param offset: the index of the first result
+        :param limit: the maximum number of results
+        :param expressions: optional filter expressions, see filter_by
+        :param filters: optional filters, see filter_by
+        :return: the list response with total and results
+        """
+        resource_name, operation_id = LIST_OPERATIONS[entity_type]
+        kwargs = {'offset': offset, 'limit': limit}
+        if filters or expressions:
+            kwargs['filters'] = self.filter_by(*expressions, **filters)
+        if self.page_tuner is None:
+            return self._read(resource_name, operation_id, **kwargs)
+        start = time.time()
+        response, size = self._read_sized(resource_name, operation_id, **kwargs)
+        self.page_tuner.record(entity_type, limit, len(response.results), time.time() - start, size)
+        return response
+
+    def iter_entities(self, entity_type, page_size=None, expressions=(), **filters):
+        """
+        Iterate over every entity of a type, one page at a time.
+
+        :param entity_type: one of the keys of LIST_OPERATIONS, e.g. 'action'
+        :param page_size: the number of entities to request per page. By
+            default the page tuner chooses it before each page, or
+            DEFAULT_PAGE_SIZE is used if there is no page tuner.
+        :param expressions: optional filter expressions, see filter_by
+        :param filters: optional filters, see filter_by
+        :return: a generator of entities
+        """
+        offset = 0
+        while True:
+            limit = page_size
+            if limit is None:
+                limit = self.page_tuner.page_size(entity_type) if self.page_tuner else DEFAULT_PAGE_SIZE
+            response = self.list_page(entity_type, offset=offset, limit=limit, expressions=expressions, **filters)
+            for entity in response.results:
+                yield entity
+            offset += len(response.results)
+            if not response.results or offset >= response.total:
+                break
+
+    @traced('workflow')
+    def launch_workflow_runs(self, runs, max_in_flight=16, progress=None):
+        """
+        Start many workflow runs concurrently, e.g. for a backfill. The HTTP
+        connection pool is grown to max_in_flight if it is smaller.
+
+        :param runs: an iterable of workflow ids, workflow objects, or
+            (workflow id, kwargs) tuples where kwargs are extra arguments for
+            the run operation
+        :param max_in_flight: the maximum number of concurrent requests
+        :param progress: an optional function with a signature
+            (result, completed, total) => None
+        :return: a LaunchReport with the instance ids and failures
+        """
+        return launch_workflow_runs(self, runs, max_in_flight=max_in_flight, progress=progress)
+
+    @traced(None)
+    def find_by_tag(self, tag, entity_types=ENTITY_TYPES, page_size=None, workers=6):
+        """
+        Find the entities of every type that have a tag. The entity types are
+        listed concurrently.
+
+        :param tag: the tag, e.g. a CI run id stamped by the ModelFactory
+        :param entity_types: the entity types to search
+        :param page_size: the number of entities to request per page
+        :param workers: the maximum number of concurrent requests
+        :return: a dictionary of entity type => list of entities
+        """
+        return find_by_tag(self, tag, entity_types=entity_types, page_size=page_size, workers=workers)
+
+    @traced(None)
+    def clean_by_tag(self, tag, entity_types=ENTITY_TYPES, workers=8, progress=None):
+        """
+        Delete every entity that has a tag, in dependency order (see
+        dartclient.tags.CLEAN_ORDER) with a pool of concurrent deletes, e.g.
+        to tear down what a CI run created. Failed deletes are reported, not
+        raised.
+
+        :param tag: the tag, e.g. a CI run id stamped by the ModelFactory
+        :param entity_types: the entity types to clean
+        :param workers: the maximum number of concurrent requests
+        :param progress: an optional function with a signature
+            (entity_type, entity, error) => None
+        :return: a CleanReport with the counts deleted and the failures
+        """
+        return clean_by_tag(self, tag, entity_types=entity_types, workers=workers, progress=progress)
+
+    @traced('datastore')
     def find_datastore(self, datastore_name, datastore_state):
         """
         Find the datastore by name
@@ -228,12 +809,9 @@ class SyncManager(object):
             for emr_engine should be 'TEMPLATE', otherwise 'ACTIVE'.
         :return: the datastore object or None if not found
         """
-        response = self.client.Datastore.listDatastores(filters=self.filter_by(name=datastore_name,
-                                                                               state=datastore_state)).result()
-        if response.total > 1:
-            raise Exception("More than one datastore object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('datastore', 'Datastore', 'listDatastores', name=datastore_name, state=datastore_state)
 
+    @traced('workflow')
     def find_workflow(self, workflow_name, datastore):
         """
         Find the workflow by name and datastore
@@ -242,12 +820,9 @@ class SyncManager(object):
         :param datastore: the owning datastore
         :return: the workflow object or None if not found
         """
-        response = self.client.Workflow.listWorkflows(filters=self.filter_by(name=workflow_name,
-                                                                             datastore_id=datastore.id)).result()
-        if response.total > 1:
-            raise Exception("More than one workflow object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('workflow', 'Workflow', 'listWorkflows', name=workflow_name, datastore_id=datastore.id)
 
+    @traced('action')
     def find_action(self, action_name, workflow, action_state=None):
         """
         Find the action by name and workflow
@@ -263,12 +838,9 @@ class SyncManager(object):
         }
         if action_state:
             filters['state'] = action_state
-        response = self.client.Action.listActions(
-            filters=self.filter_by(**filters)).result()
-        if response.total > 1:
-            raise Exception("More than one action object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('action', 'Action', 'listActions', **filters)
 
+    @traced('trigger')
     def find_trigger(self, trigger_name, workflow):
         """
         Find the trigger by name
@@ -277,12 +849,9 @@ class SyncManager(object):
         :param workflow: the owning workflow
         :return: the trigger object or None if not found
         """
-        response = self.client.Trigger.listTriggers(filters=self.filter_by(name=trigger_name,
-                                                                           workflow_ids=workflow.id)).result()
-        if response.total > 1:
-            raise Exception("More than one trigger object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('trigger', 'Trigger', 'listTriggers', name=trigger_name, workflow_ids=workflow.id)
 
+    @traced('dataset')
     def find_dataset(self, dataset_name):
         """
         Find the dataset by name
@@ -290,12 +859,9 @@ class SyncManager(object):
         :param dataset_name: the dataset name
         :return: the dataset object or None if not found
         """
-        response = self.client.Dataset.listDatasets(
-            filters=self.filter_by(name=dataset_name)).result()
-        if response.total > 1:
-            raise Exception("More than one dataset object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('dataset', 'Dataset', 'listDatasets', name=dataset_name)
 
+    @traced('subscription')
     def find_subscription(self, subscription_name):
         """
         Find the subscription by name
@@ -303,12 +869,9 @@ class SyncManager(object):
         :param subcription_name: the subscription name
         :return: the subscription object or None if not found
         """
-        response = self.client.Subscription.listSubscriptions(
-            filters=self.filter_by(name=subscription_name)).result()
-        if response.total > 1:
-            raise Exception("More than one subscription object found.")
-        return response.results[0] if response.total > 0 else None
+        return self._find('subscription', 'Subscription', 'listSubscriptions', name=subscription_name)
 
+    @traced('datastore')
     def clean_datastore(self, datastore):
         """
         Clean up the datastore, its workflows, etc.
@@ -316,16 +879,18 @@ class SyncManager(object):
         :param datastore: the datastore object
         """
         if datastore:
-            response = self.client.Workflow.listWorkflows(
+            response = self._read(
+                'Workflow', 'listWorkflows',
                 filters=self.filter_by(datastore_id=datastore.id),
-                limit=1024).result()
+                limit=1024)
             if response.total > 0:
                 for workflow in response.results:
                     self.clean_workflow(workflow)
 
-            self.client.Datastore.deleteDatastore(
-                datastore_id=datastore.id).result()
+            self._write('datastore', [datastore.data.name], 'Datastore', 'deleteDatastore',
+                        datastore_id=datastore.id)
 
+    @traced('workflow')
     def clean_workflow(self, workflow):
         """
         Clean up the workflow, its actions and triggers, etc.
@@ -333,23 +898,26 @@ class SyncManager(object):
         :param workflow: the workflow object
         """
         if workflow:
-            response = self.client.Action.listActions(
+            response = self._read(
+                'Action', 'listActions',
                 filters=self.filter_by(workflow_id=workflow.id),
-                limit=1024).result()
+                limit=1024)
             if response.total > 0:
                 for action in response.results:
                     self.clean_action(action)
 
-            response = self.client.Trigger.listTriggers(
+            response = self._read(
+                'Trigger', 'listTriggers',
                 filters=self.filter_by(workflow_ids=workflow.id),
-                limit=1024).result()
+                limit=1024)
             if response.total > 0:
                 for trigger in response.results:
                     self.clean_trigger(trigger)
 
-            self.client.Workflow.deleteWorkflow(
-                workflow_id=workflow.id).result()
+            self._write('workflow', [workflow.data.name], 'Workflow', 'deleteWorkflow',
+                        workflow_id=workflow.id)
 
+    @traced('action')
     def clean_action(self, action):
         """
         Clean up the action
@@ -357,8 +925,9 @@ class SyncManager(object):
         :param action: the action object
         """
         if action:
-            self.client.Action.deleteAction(action_id=action.id).result()
+            self._write('action', [action.data.name], 'Action', 'deleteAction', action_id=action.id)
 
+    @traced('trigger')
     def clean_trigger(self, trigger):
         """
         Clean up the trigger
@@ -366,8 +935,9 @@ class SyncManager(object):
         :param trigger: the trigger object
         """
         if trigger:
-            self.client.Trigger.deleteTrigger(trigger_id=trigger.id).result()
+            self._write('trigger', [trigger.data.name], 'Trigger', 'deleteTrigger', trigger_id=trigger.id)
 
+    @traced('dataset')
     def clean_dataset(self, dataset):
         """
         Clean up the dataset
@@ -375,13 +945,15 @@ class SyncManager(object):
         :param dataset: the dataset object
         """
         if dataset:
-            response = self.client.Subscription.listSubscriptions(
-                filters=self.filter_by(dataset_id=dataset.id)).result()
+            response = self._read(
+                'Subscription', 'listSubscriptions',
+                filters=self.filter_by(dataset_id=dataset.id))
             if response.total > 0:
                 for subscription in response.results:
                     self.clean_subscription(subscription)
-            self.client.Dataset.deleteDataset(dataset_id=dataset.id).result()
+            self._write('dataset', [dataset.data.name], 'Dataset', 'deleteDataset', dataset_id=dataset.id)
 
+    @traced('subscription')
     def clean_subscription(self, subscription):
         """
         Clean up the subscription
@@ -389,9 +961,11 @@ class SyncManager(object):
         :param subscription: the subscription object
         """
         if subscription:
-            self.client.Subscription.deleteSubscription(
-                subscription_id=subscription.id).result()
+            self._write('subscription', [subscription.data.name], 'Subscription', 'deleteSubscription',
+                        subscription_id=subscription.id)
 
+    @traced('datastore')
+    @_journaled('datastore', lambda call_args: (call_args['datastore_state'],))
     def sync_datastore(self, datastore_name, datastore_state, callback):
         """
         Synchronize a datastore with Dart.
@@ -404,19 +978,24 @@ class SyncManager(object):
         """
         datastore = self.find_datastore(datastore_name, datastore_state)
         if datastore:
+            original = self._original(datastore)
             datastore = callback(datastore)
-            response = self.client.Datastore.updateDatastore(
-                datastore_id=datastore.id, datastore=datastore).result()
+            response = self._update(
+                'datastore', [datastore_name, datastore.data.name], 'Datastore', 'updateDatastore', original,
+                datastore_id=datastore.id, datastore=datastore)
             return response.results
         else:
             datastore = self.model_factory.create_datastore()
             datastore.data.name = datastore_name
             datastore.data.state = datastore_state
             datastore = callback(datastore)
-            response = self.client.Datastore.createDatastore(
-                datastore=datastore).result()
+            response = self._write(
+                'datastore', [datastore_name, datastore.data.name], 'Datastore', 'createDatastore',
+                datastore=datastore)
             return response.results
 
+    @traced('workflow')
+    @_journaled('workflow', lambda call_args: (_id(call_args['datastore']),))
     def sync_workflow(self, workflow_name, datastore, callback):
         """
         Synchronize a workflow with Dart.
@@ -428,19 +1007,25 @@ class SyncManager(object):
         """
         workflow = self.find_workflow(workflow_name, datastore)
         if workflow:
+            original = self._original(workflow)
             workflow = callback(workflow)
-            response = self.client.Workflow.updateWorkflow(
-                workflow_id=workflow.id, workflow=workflow).result()
+            response = self._update(
+                'workflow', [workflow_name, workflow.data.name], 'Workflow', 'updateWorkflow', original,
+                workflow_id=workflow.id, workflow=workflow)
             return response.results
         else:
             workflow = self.model_factory.create_workflow()
             workflow.data.name = workflow_name
             workflow = callback(workflow)
             workflow.data.datastore_id = datastore.id
-            response = self.client.Datastore.createDatastoreWorkflow(
-                datastore_id=datastore.id, workflow=workflow).result()
+            response = self._write(
+                'workflow', [workflow_name, workflow.data.name], 'Datastore', 'createDatastoreWorkflow',
+                datastore_id=datastore.id, workflow=workflow)
             return response.results
 
+    @traced('action')
+    @_journaled('action', lambda call_args: (_id(call_args['workflow']), call_args['action_state'],
+                                             _id(call_args['dataset']), _id(call_args['subscription'])))
     def sync_action(self, action_name, workflow, callback, dataset=None, subscription=None, action_state=None):
         """
         Synchronize an action with Dart.
@@ -454,6 +1039,7 @@ class SyncManager(object):
         action = self.find_action(
             action_name, workflow, action_state=action_state)
         if action:
+            original = self._original(action)
             action = callback(action)
             if dataset:
                 if not action.data.args:
@@ -463,8 +1049,9 @@ class SyncManager(object):
                 if not action.data.args:
                     action.data.args = {}
                 action.data.args['subscription_id'] = subscription.id
-            response = self.client.Action.updateAction(
-                action_id=action.id, action=action).result()
+            response = self._update(
+                'action', [action_name, action.data.name], 'Action', 'updateAction', original,
+                action_id=action.id, action=action)
             return response.results
         else:
             action = self.model_factory.create_action()
@@ -480,10 +1067,13 @@ class SyncManager(object):
                 if not action.data.args:
                     action.data.args = {}
                 action.data.args['subscription_id'] = subscription.id
-            response = self.client.Workflow.createWorkflowActions(
-                workflow_id=workflow.id, actions=[action]).result()
+            response = self._write(
+                'action', [action_name, action.data.name], 'Workflow', 'createWorkflowActions',
+                workflow_id=workflow.id, actions=[action])
             return response.results[0]
 
+    @traced('trigger')
+    @_journaled('trigger', lambda call_args: (_id(call_args['workflow']), _id(call_args['subscription'])))
     def sync_trigger(self, trigger_name, workflow, callback, subscription=None):
         """
         Synchronize a trigger with Dart.
@@ -494,13 +1084,15 @@ class SyncManager(object):
         """
         trigger = self.find_trigger(trigger_name, workflow)
         if trigger:
+            original = self._original(trigger)
             trigger = callback(trigger)
             if subscription:
                 if not trigger.data.args:
                     trigger.data.args = {}
                 trigger.data.args['subscription_id'] = subscription.id
-            response = self.client.Trigger.updateTrigger(
-                trigger_id=trigger.id, trigger=trigger).result()
+            response = self._update(
+                'trigger', [trigger_name, trigger.data.name], 'Trigger', 'updateTrigger', original,
+                trigger_id=trigger.id, trigger=trigger)
             return response.results
         else:
             trigger = self.model_factory.create_trigger()
@@ -512,32 +1104,50 @@ class SyncManager(object):
                 if not trigger.data.args:
                     trigger.data.args = {}
                 trigger.data.args['subscription_id'] = subscription.id
-            response = self.client.Trigger.createTrigger(
-                trigger=trigger).result()
+            response = self._write(
+                'trigger', [trigger_name, trigger.data.name], 'Trigger', 'createTrigger',
+                trigger=trigger)
             return response.results
 
-    def sync_dataset(self, dataset_name, callback):
+    @traced('dataset')
+    @_journaled('dataset', lambda call_args: ())
+    def sync_dataset(self, dataset_name, callback, columns=None):
         """
         Synchronize a dataset with Dart.
 
         :param dataset_name: The name of the dataset
         :param callback: A function with a signature (dataset) => dataset
+        :param columns: An optional ColumnSchema (or anything that
+            ColumnSchema.coerce accepts) describing the dataset's columns.
+            The columns are set before the callback is invoked and are only
+            replaced on an existing dataset when they differ.
         :return: The created or updated dataset
         """
+        if columns is not None:
+            columns = ColumnSchema.coerce(columns)
         dataset = self.find_dataset(dataset_name)
         if dataset:
+            original = self._original(dataset)
+            if columns is not None and diff_columns(dataset.data.columns, columns):
+                dataset.data.columns = columns.to_payload()
             dataset = callback(dataset)
-            response = self.client.Dataset.updateDataset(
-                dataset_id=dataset.id, dataset=dataset).result()
+            response = self._update(
+                'dataset', [dataset_name, dataset.data.name], 'Dataset', 'updateDataset', original,
+                dataset_id=dataset.id, dataset=dataset)
             return response.results
         else:
             dataset = self.model_factory.create_dataset()
             dataset.data.name = dataset_name
+            if columns is not None:
+                dataset.data.columns = columns.to_payload()
             dataset = callback(dataset)
-            response = self.client.Dataset.createDataset(
-                dataset=dataset).result()
+            response = self._write(
+                'dataset', [dataset_name, dataset.data.name], 'Dataset', 'createDataset',
+                dataset=dataset)
             return response.results
 
+    @traced('subscription')
+    @_journaled('subscription', lambda call_args: (_id(call_args['dataset']),))
     def sync_subscription(self, subscription_name, dataset, callback):
         """
         Synchronize a subscription with Dart.
@@ -554,6 +1164,21 @@ class SyncManager(object):
         subscription.data.name = subscription_name
         subscription.data.dataset_id = dataset.id
         subscription = callback(subscription)
-        response = self.client.Dataset.createDatasetSubscription(
-            subscription=subscription, dataset_id=dataset.id).result()
+        response = self._write(
+            'subscription', [subscription_name, subscription.data.name], 'Dataset', 'createDatasetSubscription',
+            subscription=subscription, dataset_id=dataset.id)
         return response.results
+
+
+def _status_code(error):
+    # bravado's HTTPError only carries the status code on its response
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code
+
+
+def _response_size(future):
+    # set by DartFutureAdapter on the bravado HttpFuture's inner future
+    size = getattr(getattr(future, 'future', None), 'response_size', None)
+    return size if isinstance(size, six.integer_types) else None
@@ -0,0 +1,69 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import time
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request is about to start, or times out, after the
+    deadline of the run it belongs to.
+    """
+
+
+class Deadline(object):
+    """
+    The time by which a whole run, e.g. the sync of a model, must finish.
+    Each request is given the time that is left as its timeout, so a single
+    slow or hung request cannot hold up the run past the deadline.
+    """
+
+    def __init__(self, seconds, clock=time.time):
+        """
+        :param seconds: the time budget of the run in seconds
+        :param clock: a function returning the current time in seconds
+        """
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        """
+        :return: the seconds left before the deadline, at least 0
+        """
+        return max(0.0, self.expires - self.clock())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, operation_id=None):
+        """
+        :param operation_id: the operation about to be called, for the error
+            message
+        :return: the timeout in seconds for a request starting now
+        :raises DeadlineExceeded: if no time is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline exceeded before %s' % (operation_id or 'the request',))
+        return remaining
@@ -0,0 +1,372 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from dartclient.columns import ColumnSchema, diff_columns
+from dartclient.models import ENTITY_TYPES, is_model, model_to_dict
+from dartclient.plan import data_callback
+from dartclient.snapshot import read_snapshot
+
+
+class LiveState(object):
+    """
+    The entities on a Dart server (or in a snapshot) as dictionaries,
+    indexed the same way SyncManager's find_* methods look them up.
+    """
+
+    def __init__(self, entities):
+        """
+        :param entities: a dictionary of entity type => list of entity
+            dictionaries
+        """
+        self.entities = dict((entity_type, list(entities.get(entity_type) or [])) for entity_type in ENTITY_TYPES)
+        self._index = collections.defaultdict(list)
+        for entity_type, items in self.entities.items():
+            for entity in items:
+                for key in _index_keys(entity_type, entity.get('data') or {}):
+                    self._index[(entity_type,) + key].append(entity)
+
+    @classmethod
+    def fetch(cls, sync_manager, entity_types=ENTITY_TYPES, filters=None, page_size=None, workers=6):
+        """
+        Load the live state with one paginated list per entity type, with
+        the entity types listed concurrently.
+
+        :param sync_manager: the SyncManager
+        :param entity_types: the entity types to load
+        :param filters: an optional dictionary of entity type => filters
+        :param page_size: the number of entities to request per page, by
+            default chosen by SyncManager.iter_entities
+        :param workers: the maximum number of concurrent requests
+        :return: the LiveState
+        """
+        filters = filters or {}
+
+        def fetch_type(entity_type):
+            return [model_to_dict(entity) for entity in
+                    sync_manager.iter_entities(entity_type, page_size=page_size, **filters.get(entity_type, {}))]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = dict((entity_type, executor.submit(fetch_type, entity_type)) for entity_type in entity_types)
+            return cls(dict((entity_type, future.result()) for (entity_type, future) in futures.items()))
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """
+        Load the live state from a snapshot written by export_snapshot.
+
+        :param path: the snapshot file
+        :return: the LiveState
+        """
+        entities = collections.defaultdict(list)
+        for record in read_snapshot(path):
+            entities[record['type']].append(record['entity'])
+        return cls(entities)
+
+    def lookup(self, entity_type, *key):
+        """
+        :param entity_type: the entity type
+        :param key: the lookup key, e.g. (datastore_id, name) for a workflow
+        :return: a list of matching entity dictionaries
+        """
+        return self._index.get((entity_type,) + key, [])
+
+
+def _index_keys(entity_type, data):
+    name = data.get('name')
+    if entity_type == 'datastore':
+        return [(name, data.get('state'))]
+    if entity_type == 'workflow':
+        return [(data.get('datastore_id'), name)]
+    if entity_type == 'action':
+        return [(data.get('workflow_id'), name)]
+    if entity_type == 'trigger':
+        return [(workflow_id, name) for workflow_id in data.get('workflow_ids') or []]
+    return [(name,)]
+
+
+class DesiredEntity(object):
+    """
+    An entity in a DesiredModel: the object the SyncManager callback
+    produced, and the entities it refers to.
+    """
+
+    def __init__(self, entity_type, name, entity, parent=None, dataset=None, subscription=None,
+                 state=None, columns=None):
+        self.entity_type = entity_type
+        self.name = name
+        self.entity = entity
+        self.parent = parent
+        self.dataset = dataset
+        self.subscription = subscription
+        self.state = state
+        self.columns = columns
+
+    @property
+    def path(self):
+        return (self.parent.path if self.parent else ()) + (self.name,)
+
+
+class DesiredModel(object):
+    """
+    Describes the desired state of a Dart model with the same arguments and
+    callbacks as SyncManager's sync_* methods, without making any requests.
+    Each method returns a DesiredEntity handle to pass to its children.
+    """
+
+    def __init__(self, model_factory):
+        self.model_factory = model_factory
+        self.entities = []
+
+    def _add(self, desired):
+        self.entities.append(desired)
+        return desired
+
+    def datastore(self, datastore_name, datastore_state, callback):
+        datastore = self.model_factory.create_datastore()
+        datastore.data.name = datastore_name
+        datastore.data.state = datastore_state
+        return self._add(DesiredEntity('datastore', datastore_name, callback(datastore), state=datastore_state))
+
+    def workflow(self, workflow_name, datastore, callback):
+        workflow = self.model_factory.create_workflow()
+        workflow.data.name = workflow_name
+        return self._add(DesiredEntity('workflow', workflow_name, callback(workflow), parent=datastore))
+
+    def action(self, action_name, workflow, callback, dataset=None, subscription=None, action_state=None):
+        action = self.model_factory.create_action()
+        action.data.name = action_name
+        if action_state:
+            action.data.state = action_state
+        return self._add(DesiredEntity('action', action_name, callback(action), parent=workflow,
+                                       dataset=dataset, subscription=subscription, state=action_state))
+
+    def trigger(self, trigger_name, workflow, callback, subscription=None):
+        trigger = self.model_factory.create_trigger()
+        trigger.data.name = trigger_name
+        return self._add(DesiredEntity('trigger', trigger_name, callback(trigger), parent=workflow,
+                                       subscription=subscription))
+
+    def dataset(self, dataset_name, callback, columns=None):
+        dataset = self.model_factory.create_dataset()
+        dataset.data.name = dataset_name
+        columns = ColumnSchema.coerce(columns) if columns is not None else None
+        return self._add(DesiredEntity('dataset', dataset_name, callback(dataset), columns=columns))
+
+    def subscription(self, subscription_name, dataset, callback):
+        subscription = self.model_factory.create_subscription()
+        subscription.data.name = subscription_name
+        return self._add(DesiredEntity('subscription', subscription_name, callback(subscription), parent=dataset))
+
+    @classmethod
+    def from_plan(cls, model_factory, plan):
+        """
+        Build the desired model from a ModelPlan.
+
+        :param model_factory: the ModelFactory
+        :param plan: the ModelPlan
+        :return: the DesiredModel
+        """
+        desired = cls(model_factory)
+        datasets, subscriptions = {}, {}
+        for dataset in plan.datasets:
+            handle = datasets[dataset['name']] = desired.dataset(
+                dataset['name'], data_callback(dataset), columns=plan.columns(dataset))
+            for subscription in dataset.get('subscriptions') or []:
+                subscriptions[subscription['name']] = desired.subscription(
+                    subscription['name'], handle, data_callback(subscription))
+        for datastore in plan.datastores:
+            datastore_handle = desired.datastore(
+                datastore['name'], datastore.get('state', 'ACTIVE'), data_callback(datastore))
+            for workflow in datastore.get('workflows') or []:
+                workflow_handle = desired.workflow(workflow['name'], datastore_handle, data_callback(workflow))
+                for action in workflow.get('actions') or []:
+                    desired.action(action['name'], workflow_handle, data_callback(action),
+                                   dataset=datasets.get(action.get('dataset')),
+                                   subscription=subscriptions.get(action.get('subscription')),
+                                   action_state=action.get('state'))
+                for trigger in workflow.get('triggers') or []:
+                    desired.trigger(trigger['name'], workflow_handle, data_callback(trigger),
+                                    subscription=subscriptions.get(trigger.get('subscription')))
+        return desired
+
+
+class EntityDrift(object):
+    """
+    The comparison of one desired entity with the live state.
+
+    status is one of 'ok', 'changed', 'missing' (not found, or its parent
+    is missing) or 'ambiguous' (more than one live entity matched).
+    differences maps each field path to a (live value, desired value) tuple.
+    """
+
+    def __init__(self, entity_type, path, status, live=None, differences=None):
+        self.entity_type = entity_type
+        self.path = path
+        self.status = status
+        self.live = live
+        self.differences = differences or {}
+
+    def __repr__(self):
+        return 'EntityDrift(%s %s: %s %r)' % (self.entity_type, '/'.join(self.path), self.status, self.differences)
+
+
+class DriftReport(object):
+    """
+    The per-entity results of detect_drift.
+    """
+
+    def __init__(self, entities):
+        self.entities = entities
+
+    def with_status(self, *statuses):
+        return [entity for entity in self.entities if entity.status in statuses]
+
+    @property
+    def drifted(self):
+        return self.with_status('changed', 'missing', 'ambiguous')
+
+    @property
+    def ok(self):
+        return not self.drifted
+
+    def summary(self):
+        """
+        :return: a human readable description of the drift
+        """
+        counts = collections.Counter(entity.status for entity in self.entities)
+        lines = ['%d entities: %s' % (len(self.entities), ', '.join(
+            '%d %s' % (counts[status], status) for status in sorted(counts)))]
+        for entity in self.drifted:
+            lines.append('%-9s %s %s' % (entity.status, entity.entity_type, '/'.join(entity.path)))
+            for field in sorted(entity.differences):
+                live, desired = entity.differences[field]
+                lines.append('    %s: %r != %r' % (field, live, desired))
+        return '\n'.join(lines)
+
+
+def detect_drift(desired, live):
+    """
+    Compare a desired model with the live state, entirely in memory. Only
+    the fields that the desired model sets (i.e. that are not None) are
+    compared. Tags are compared as a subset because Dart may add its own,
+    and columns are compared with diff_columns.
+
+    :param desired: the DesiredModel
+    :param live: the LiveState
+    :return: the DriftReport
+    """
+    matched = {}
+    results = []
+    for item in desired.entities:
+        drift = _compare_entity(item, live, matched)
+        results.append(drift)
+    return DriftReport(results)
+
+
+def _live_id(matched, handle):
+    if handle is None:
+        return None
+    entity = matched.get(id(handle))
+    return entity.get('id') if entity else None
+
+
+def _compare_entity(item, live, matched):
+    parent_id = _live_id(matched, item.parent)
+    if item.parent is not None and parent_id is None:
+        return EntityDrift(item.entity_type, item.path, 'missing')
+
+    if item.entity_type == 'datastore':
+        candidates = live.lookup('datastore', item.name, item.state)
+    elif item.entity_type in ('workflow', 'action', 'trigger'):
+        candidates = live.lookup(item.entity_type, parent_id, item.name)
+    else:
+        candidates = live.lookup(item.entity_type, item.name)
+    if item.entity_type == 'action' and item.state:
+        candidates = [c for c in candidates if (c.get('data') or {}).get('state') == item.state]
+    if not candidates:
+        return EntityDrift(item.entity_type, item.path, 'missing')
+    if len(candidates) > 1:
+        return EntityDrift(item.entity_type, item.path, 'ambiguous')
+
+    current = candidates[0]
+    matched[id(item)] = current
+    live_data = current.get('data') or {}
+    differences = {}
+
+    for name in dir(item.entity.data):
+        value = getattr(item.entity.data, name)
+        if value is None or name == 'columns' and item.columns is not None:
+            continue
+        if name == 'tags':
+            if not set(value) <= set(live_data.get('tags') or []):
+                differences['tags'] = (live_data.get('tags'), value)
+        else:
+            differences.update(_compare_value(value, live_data.get(name), name))
+
+    if item.columns is not None:
+        column_diff = diff_columns(live_data.get('columns'), item.columns)
+        if column_diff:
+            differences['columns'] = (live_data.get('columns'), column_diff)
+
+    expected_refs = {}
+    if item.entity_type == 'subscription':
+        expected_refs['dataset_id'] = parent_id
+    for ref_name, handle in (('dataset_id', item.dataset), ('subscription_id', item.subscription)):
+        if handle is not None:
+            ref_id = _live_id(matched, handle)
+            if ref_id is None:
+                return EntityDrift(item.entity_type, item.path, 'missing', live=current)
+            if item.entity_type == 'subscription':
+                expected_refs[ref_name] = ref_id
+            else:
+                actual = (live_data.get('args') or {}).get(ref_name)
+                if actual != ref_id:
+                    differences['args.' + ref_name] = (actual, ref_id)
+    for ref_name, ref_id in expected_refs.items():
+        if live_data.get(ref_name) != ref_id:
+            differences[ref_name] = (live_data.get(ref_name), ref_id)
+
+    return EntityDrift(item.entity_type, item.path, 'changed' if differences else 'ok',
+                       live=current, differences=differences)
+
+
+def _compare_value(desired, live, path):
+    if is_model(desired):
+        live = live if isinstance(live, dict) else {}
+        differences = {}
+        for name in dir(desired):
+            value = getattr(desired, name)
+            if value is not None:
+                differences.update(_compare_value(value, live.get(name), path + '.' + name))
+        return differences
+    desired = model_to_dict(desired)
+    if path == 'args' and isinstance(desired, dict) and isinstance(live, dict):
+        # sync_action and sync_trigger add the dataset and subscription ids
+        live = dict((key, value) for (key, value) in live.items()
+                    if key not in ('dataset_id', 'subscription_id') or key in desired)
+    if desired == live or (live is None and desired in ([], {})):
+        return {}
+    return {path: (live, desired)}
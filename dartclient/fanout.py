@@ -0,0 +1,254 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dartclient.columns import ColumnSchema
+from dartclient.models import model_to_dict
+from dartclient.plan import apply_data
+
+
+class TargetResult(object):
+    """
+    The outcome of one sync call on one target.
+    """
+
+    def __init__(self, target, seconds, entity=None, error=None, skipped=False):
+        self.target = target
+        self.seconds = seconds
+        self.entity = entity
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return self.error is None and not self.skipped
+
+    def __repr__(self):
+        return 'TargetResult(%s, ok=%r, seconds=%.3f, error=%r)' % (self.target, self.ok, self.seconds, self.error)
+
+
+class FanOutError(Exception):
+    """
+    The errors of a sync call that failed on some of the targets.
+    """
+
+    def __init__(self, results):
+        """
+        :param results: the failed TargetResults
+        """
+        super(FanOutError, self).__init__('failed on %s' % (
+            ', '.join('%s (%s)' % (result.target, result.error) for result in results),))
+        self.results = results
+
+
+class FanOutResult(object):
+    """
+    The per-target outcome of one sync call. Pass it as the parent (e.g. the
+    datastore of sync_workflow) of later calls: each target then uses its
+    own entity, and targets where the parent failed are skipped.
+    """
+
+    def __init__(self, entity_type, name, results):
+        self.entity_type = entity_type
+        self.name = name
+        self.results = results
+
+    def get(self, target):
+        """
+        :param target: the target name
+        :return: the target's entity, or None if it failed or was skipped
+        """
+        result = self.results.get(target)
+        return result.entity if result is not None and result.ok else None
+
+    @property
+    def failures(self):
+        return [result for result in self.results.values() if not result.ok]
+
+    @property
+    def succeeded(self):
+        return sorted(target for (target, result) in self.results.items() if result.ok)
+
+    def step_error(self):
+        """
+        :return: a FanOutError for the targets where the call raised, or
+            None if it raised on none; PlanRunner records it as the step's
+            error while the other targets go on with the children
+        """
+        errors = sorted((result for result in self.results.values() if result.error is not None),
+                        key=lambda result: result.target)
+        return FanOutError(errors) if errors else None
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    @property
+    def seconds(self):
+        return max([result.seconds for result in self.results.values()] or [0.0])
+
+    def __repr__(self):
+        return 'FanOutResult(%s %s, failures=%r)' % (self.entity_type, self.name, self.failures)
+
+
+class FanOutSyncManager(object):
+    """
+    Applies the same model to several Dart servers at once. It has the same
+    sync_* methods as SyncManager, so it can also be driven by PlanRunner.
+    Each callback is evaluated once, on a new entity from the first target's
+    model factory, and the fields it changes are then applied to every
+    target concurrently, whether the target creates or updates the entity.
+    A target where the parent entity failed is skipped for its children,
+    without affecting the other targets.
+    """
+
+    def __init__(self, sync_managers, workers=8):
+        """
+        :param sync_managers: a list of (target name, SyncManager) tuples, or
+            a dictionary of target name => SyncManager
+        :param workers: the maximum number of concurrent requests per target;
+            use at least the number of workers of the PlanRunner driving it
+        """
+        self.targets = list(sync_managers.items() if isinstance(sync_managers, dict) else sync_managers)
+        if not self.targets:
+            raise ValueError('At least one target is required')
+        self.model_factory = self.targets[0][1].model_factory
+        self.executor = ThreadPoolExecutor(max_workers=workers * len(self.targets))
+        self.history = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _desired(self, entity, callback):
+        """
+        :return: the data fields that the callback set or changed, plus the
+            name, as a dictionary
+        """
+        defaults = model_to_dict(entity.data)
+        data = model_to_dict(callback(entity).data)
+        changed = dict((key, value) for (key, value) in data.items() if value != defaults.get(key))
+        changed['name'] = data.get('name')
+        return changed
+
+    def _fan_out(self, entity_type, name, fn, *parents):
+        """
+        :param fn: a function with a signature (sync_manager, *parent entities) => entity
+        :param parents: FanOutResults (or None) whose per-target entities are
+            passed to fn
+        """
+        def run(target, sync_manager):
+            entities = [parent.get(target) if parent is not None else None for parent in parents]
+            if any(parent is not None and entity is None for (parent, entity) in zip(parents, entities)):
+                return TargetResult(target, 0.0, skipped=True)
+            started = time.time()
+            try:
+                entity = fn(sync_manager, *entities)
+            except Exception as e:
+                return TargetResult(target, time.time() - started, error=e)
+            return TargetResult(target, time.time() - started, entity=entity)
+
+        futures = [self.executor.submit(run, target, sync_manager) for (target, sync_manager) in self.targets]
+        result = FanOutResult(entity_type, name, dict((f.result().target, f.result()) for f in futures))
+        with self._lock:
+            self.history.append(result)
+        return result
+
+    def report(self):
+        """
+        :return: a dictionary of target name => counts of ok, failed and
+            skipped calls, and the total seconds spent
+        """
+        report = dict((target, {'ok': 0, 'failed': 0, 'skipped': 0, 'seconds': 0.0}) for (target, _) in self.targets)
+        with self._lock:
+            history = list(self.history)
+        for fan_out in history:
+            for target, result in fan_out.results.items():
+                counts = report[target]
+                counts['skipped' if result.skipped else 'ok' if result.ok else 'failed'] += 1
+                counts['seconds'] += result.seconds
+        return report
+
+    def sync_datastore(self, datastore_name, datastore_state, callback):
+        datastore = self.model_factory.create_datastore()
+        datastore.data.name = datastore_name
+        datastore.data.state = datastore_state
+        data = self._desired(datastore, callback)
+        return self._fan_out('datastore', datastore_name, lambda sm: sm.sync_datastore(
+            datastore_name, datastore_state, lambda entity: apply_data(entity, data)))
+
+    def sync_workflow(self, workflow_name, datastore, callback):
+        workflow = self.model_factory.create_workflow()
+        workflow.data.name = workflow_name
+        data = self._desired(workflow, callback)
+        data.pop('datastore_id', None)
+        return self._fan_out('workflow', workflow_name, lambda sm, target_datastore: sm.sync_workflow(
+            workflow_name, target_datastore, lambda entity: apply_data(entity, data)), datastore)
+
+    def sync_action(self, action_name, workflow, callback, dataset=None, subscription=None, action_state=None):
+        action = self.model_factory.create_action()
+        action.data.name = action_name
+        if action_state:
+            action.data.state = action_state
+        data = self._desired(action, callback)
+        data.pop('workflow_id', None)
+        return self._fan_out('action', action_name, lambda sm, target_workflow, target_dataset, target_subscription:
+                             sm.sync_action(action_name, target_workflow, lambda entity: apply_data(entity, data),
+                                            dataset=target_dataset, subscription=target_subscription,
+                                            action_state=action_state),
+                             workflow, dataset, subscription)
+
+    def sync_trigger(self, trigger_name, workflow, callback, subscription=None):
+        trigger = self.model_factory.create_trigger()
+        trigger.data.name = trigger_name
+        data = self._desired(trigger, callback)
+        data.pop('workflow_ids', None)
+        return self._fan_out('trigger', trigger_name, lambda sm, target_workflow, target_subscription:
+                             sm.sync_trigger(trigger_name, target_workflow, lambda entity: apply_data(entity, data),
+                                             subscription=target_subscription),
+                             workflow, subscription)
+
+    def sync_dataset(self, dataset_name, callback, columns=None):
+        dataset = self.model_factory.create_dataset()
+        dataset.data.name = dataset_name
+        data = self._desired(dataset, callback)
+        columns = ColumnSchema.coerce(columns) if columns is not None else None
+        return self._fan_out('dataset', dataset_name, lambda sm: sm.sync_dataset(
+            dataset_name, lambda entity: apply_data(entity, data), columns=columns))
+
+    def sync_subscription(self, subscription_name, dataset, callback):
+        subscription = self.model_factory.create_subscription()
+        subscription.data.name = subscription_name
+        data = self._desired(subscription, callback)
+        data.pop('dataset_id', None)
+        return self._fan_out('subscription', subscription_name, lambda sm, target_dataset: sm.sync_subscription(
+            subscription_name, target_dataset, lambda entity: apply_data(entity, data)), dataset)
@@ -0,0 +1,202 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import collections
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import threading
+import time
+
+from dartclient.tracing import attach_context, capture_context
+
+
+class HedgingPolicy(object):
+    """
+    Hedges idempotent reads: if a request has not answered within a delay,
+    a duplicate is sent and whichever answers first is used. The delay is a
+    percentile of the recent response times of the same operation, so only
+    the slowest requests are hedged, and the number of hedges is capped at
+    a fraction of all calls so that a generally slow server does not get
+    twice the load.
+    """
+
+    def __init__(self, percentile=95, initial_delay=0.1, min_delay=0.005, max_delay=2.0, min_samples=20,
+                 window=1000, max_extra_load=0.05, operations=None, max_workers=32, clock=time.time):
+        """
+        :param percentile: the percentile of recent response times after
+            which a request is hedged
+        :param initial_delay: the delay used until min_samples response
+            times of an operation have been seen
+        :param min_delay: the smallest delay
+        :param max_delay: the largest delay
+        :param min_samples: the number of response times needed before the
+            percentile is used
+        :param window: the number of recent response times kept per operation
+        :param max_extra_load: the largest number of hedges, as a fraction of
+            the calls made
+        :param operations: the operation ids to hedge, by default every
+            operation passed to call
+        :param max_workers: the number of threads sending the duplicate
+            requests
+        :param clock: a function returning the current time in seconds
+        """
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_extra_load = max_extra_load
+        self.operations = set(operations) if operations is not None else None
+        self.clock = clock
+        self.max_workers = max_workers
+        # created on the first hedge
+        self._executor = None
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedges_suppressed = 0
+
+    def delay(self, operation_id):
+        """
+        :param operation_id: the operation id, e.g. 'listWorkflows'
+        :return: the seconds to wait before hedging a call
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(operation_id, ()))
+        if len(latencies) < self.min_samples:
+            delay = self.initial_delay
+        else:
+            delay = latencies[int(round((len(latencies) - 1) * self.percentile / 100.0))]
+        return max(self.min_delay, min(self.max_delay, delay))
+
+    def call(self, operation_id, fn):
+        """
+        Call fn, and call it again if it is slower than the hedging delay.
+
+        :param operation_id: the operation id, e.g. 'listWorkflows'
+        :param fn: a function sending the request and returning its result;
+            it must be safe to call more than once
+        :return: the first result, or raises the error of the last attempt
+            if every attempt failed
+        """
+        if self.operations is not None and operation_id not in self.operations:
+            return fn()
+        with self._lock:
+            self.calls += 1
+        # the attempts are traced as children of the caller's span
+        run_attempt = self._attempt(operation_id, fn, capture_context())
+        attempts = [self._start(run_attempt)]
+        done, pending = wait(attempts, timeout=self.delay(operation_id))
+        if pending:
+            with self._lock:
+                allowed = self.hedges_fired < self.max_extra_load * self.calls
+                if allowed:
+                    self.hedges_fired += 1
+                else:
+                    self.hedges_suppressed += 1
+            if allowed:
+                attempts.append(self._submit(run_attempt))
+        pending = set(attempts)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [attempt for attempt in attempts if attempt in done and attempt.exception() is None]
+            if succeeded:
+                if succeeded[0] is not attempts[0]:
+                    with self._lock:
+                        self.hedges_won += 1
+                return succeeded[0].result()
+            if not pending:
+                return attempts[-1].result()
+
+    def _attempt(self, operation_id, fn, context):
+        """
+        :return: a function calling fn in the given tracing context and
+            recording its response time, from when it starts running
+        """
+        def attempt():
+            start = self.clock()
+            with attach_context(context):
+                result = fn()
+            self._record(operation_id, self.clock() - start)
+            return result
+        return attempt
+
+    def _start(self, attempt):
+        """
+        Run the first attempt of a call on a thread of its own, so that
+        the calls in flight are not limited by the pool and do not wait in
+        its queue. The calling thread cannot run it because it returns as
+        soon as either attempt answers.
+        """
+        future = Future()
+
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(attempt())
+            except Exception as e:
+                future.set_exception(e)
+        thread = threading.Thread(target=run, name='hedging-primary')
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def _submit(self, attempt):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor.submit(attempt)
+
+    def _record(self, operation_id, seconds):
+        with self._lock:
+            latencies = self._latencies.get(operation_id)
+            if latencies is None:
+                latencies = self._latencies[operation_id] = collections.deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def close(self):
+        """
+        Stop the request threads once the requests in flight are done. They
+        are started again if the policy is used after being closed.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def as_dict(self):
+        """
+        :return: the counters and the current delay of each operation
+        """
+        with self._lock:
+            operation_ids = list(self._latencies)
+            counters = {
+                'calls': self.calls,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+                'hedges_suppressed': self.hedges_suppressed,
+            }
+        counters['delays'] = dict((operation_id, self.delay(operation_id)) for operation_id in operation_ids)
+        return counters
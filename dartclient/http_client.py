@@ -0,0 +1,313 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import re
+import threading
+import weakref
+import zlib
+
+from bravado.http_future import HttpFuture
+from bravado.requests_client import RequestsClient, RequestsFutureAdapter, RequestsResponseAdapter
+import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+
+from dartclient.codec import JsonCodec
+from dartclient.tracing import span
+
+
+_OPERATION_KIND = re.compile(r'^[a-z]*')
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class CompressionStats(object):
+    """
+    Counts the bytes that HTTP compression saved in each direction.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_compressed = 0
+        self.request_bytes = 0
+        self.request_bytes_sent = 0
+        self.responses_compressed = 0
+        self.response_bytes = 0
+        self.response_bytes_received = 0
+
+    def record_request(self, raw_size, sent_size):
+        with self._lock:
+            if sent_size < raw_size:
+                self.requests_compressed += 1
+            self.request_bytes += raw_size
+            self.request_bytes_sent += sent_size
+
+    def record_response(self, raw_size, received_size):
+        with self._lock:
+            if received_size < raw_size:
+                self.responses_compressed += 1
+            self.response_bytes += raw_size
+            self.response_bytes_received += received_size
+
+    @property
+    def bytes_saved(self):
+        return (self.request_bytes - self.request_bytes_sent) + \
+            (self.response_bytes - self.response_bytes_received)
+
+    def as_dict(self):
+        """
+        :return: the counters as a dictionary
+        """
+        return {
+            'requests_compressed': self.requests_compressed,
+            'request_bytes': self.request_bytes,
+            'request_bytes_sent': self.request_bytes_sent,
+            'responses_compressed': self.responses_compressed,
+            'response_bytes': self.response_bytes,
+            'response_bytes_received': self.response_bytes_received,
+            'bytes_saved': self.bytes_saved,
+        }
+
+
+class DartResponseAdapter(RequestsResponseAdapter):
+    """
+    A response adapter that decodes the body with a pluggable JsonCodec.
+    """
+
+    def __init__(self, requests_lib_response, json_codec):
+        super(DartResponseAdapter, self).__init__(requests_lib_response)
+        self.json_codec = json_codec
+
+    def json(self, **kwargs):
+        return self.json_codec.loads(self._delegate.content)
+
+
+class DartFutureAdapter(RequestsFutureAdapter):
+    """
+    Sends the request, gzip compressing large bodies when the client is
+    configured to, and records compression statistics.
+    """
+
+    def __init__(self, http_client, request, misc_options, operation_id=None):
+        super(DartFutureAdapter, self).__init__(http_client.session, request, misc_options)
+        self.http_client = http_client
+        self.operation_id = operation_id
+        # the decompressed size of the response body, once received
+        self.response_size = None
+
+    def result(self, timeout=None):
+        default_timeout = self.http_client.timeout_for(self.operation_id)
+        if default_timeout is not None:
+            timeout = default_timeout if timeout is None else min(timeout, default_timeout)
+        with span('dart.http %s' % (self.operation_id or self.request.method),
+                  **{'dart.operation_id': self.operation_id,
+                     'http.method': self.request.method,
+                     'http.url': self.request.url}) as current:
+            response, sent_size = self._send(timeout)
+            self.response_size = len(response.content)
+            current.set_attribute('http.status_code', response.status_code)
+            current.set_attribute('http.request_content_length', sent_size)
+            current.set_attribute('http.response_content_length', received_size(response))
+            return response
+
+    def _send(self, timeout):
+        http_client = self.http_client
+        # use the session of the thread waiting for the result
+        self.session = http_client.session
+        prepared_request = self.session.prepare_request(self.request)
+        body = prepared_request.body
+        raw_size = len(body) if body else 0
+        compressed = http_client.should_compress(raw_size)
+        if compressed:
+            uncompressed_body = body
+            prepared_request.body = gzip_compress(body)
+            prepared_request.headers['Content-Encoding'] = 'gzip'
+            prepared_request.headers['Content-Length'] = str(len(prepared_request.body))
+
+        response = self._send_prepared(prepared_request, timeout)
+
+        if compressed and response.status_code == 415:
+            # The server does not accept compressed bodies, so stop trying.
+            http_client.compress_request_threshold = None
+            prepared_request.body = uncompressed_body
+            del prepared_request.headers['Content-Encoding']
+            prepared_request.headers['Content-Length'] = str(raw_size)
+            compressed = False
+            response = self._send_prepared(prepared_request, timeout)
+
+        sent_size = len(prepared_request.body) if compressed else raw_size
+        http_client.compression_stats.record_request(raw_size, sent_size)
+        http_client.compression_stats.record_response(
+            len(response.content), received_size(response))
+        return response, sent_size
+
+    def _send_prepared(self, prepared_request, timeout):
+        rate_limiter = self.http_client.rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return self.session.send(prepared_request, timeout=self.build_timeout(timeout))
+
+
+class DartRequestsClient(RequestsClient):
+    """
+    The bravado RequestsClient used by create_client. Responses are always
+    requested with gzip/deflate content encoding, request bodies are gzip
+    compressed when they are larger than compress_request_threshold bytes.
+
+    The client is safe to share between threads: every thread gets its own
+    requests Session (a Session's cookies and adapters are not meant to be
+    shared), configured with the same headers and connection pool size.
+    Authenticators are shared; the bravado authenticators only attach
+    immutable credentials to each request.
+
+    A rate limiter, any object with an ``acquire()`` method that blocks
+    until the next request may be sent (e.g. a shard.SharedRateLimiter),
+    paces every request the client sends.
+    """
+
+    def __init__(self, json_codec=None, compress_request_threshold=None, pool_maxsize=None, timeouts=None,
+                 rate_limiter=None):
+        self._local = threading.local()
+        self._sessions = weakref.WeakSet()
+        self._pool_lock = threading.Lock()
+        self.headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        self.pool_maxsize = DEFAULT_POOLSIZE
+        super(DartRequestsClient, self).__init__()
+        self.json_codec = json_codec or JsonCodec()
+        self.compress_request_threshold = compress_request_threshold
+        self.compression_stats = CompressionStats()
+        self.timeouts = dict(timeouts or {})
+        self.rate_limiter = rate_limiter
+        if pool_maxsize:
+            self.ensure_pool_size(pool_maxsize)
+
+    @property
+    def session(self):
+        """
+        :return: the current thread's requests Session
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.session = requests.Session()
+        return session
+
+    @session.setter
+    def session(self, session):
+        with self._pool_lock:
+            session.headers.update(self.headers)
+            if self.pool_maxsize != DEFAULT_POOLSIZE:
+                _mount_adapters(session, self.pool_maxsize)
+            self._sessions.add(session)
+        self._local.session = session
+
+    def timeout_for(self, operation_id):
+        """
+        Look up the default timeout of an operation in timeouts, by its
+        operation id (e.g. 'listActions'), then by its kind, the leading
+        verb of the operation id (e.g. 'list'), then by 'default'.
+
+        :param operation_id: the operation id, or None
+        :return: the timeout in seconds, or None for no timeout
+        """
+        timeouts = self.timeouts
+        if operation_id in timeouts:
+            return timeouts[operation_id]
+        kind = _OPERATION_KIND.match(operation_id or '').group(0)
+        if kind in timeouts:
+            return timeouts[kind]
+        return timeouts.get('default')
+
+    def ensure_pool_size(self, pool_maxsize):
+        """
+        Make sure that each session keeps at least this many connections per
+        host, so that as many concurrent requests can reuse connections
+        instead of opening and discarding new ones.
+
+        :param pool_maxsize: the number of connections per host
+        """
+        with self._pool_lock:
+            if pool_maxsize <= self.pool_maxsize:
+                return
+            for session in list(self._sessions):
+                _mount_adapters(session, pool_maxsize)
+            self.pool_maxsize = pool_maxsize
+
+    def should_compress(self, body_size):
+        """
+        :param body_size: the size of the request body in bytes
+        :return: True if the body should be compressed
+        """
+        threshold = self.compress_request_threshold
+        return threshold is not None and body_size > threshold
+
+    def request(self, request_params, operation=None, response_callbacks=None,
+                also_return_response=False):
+        sanitized_params, misc_options = self.separate_params(request_params)
+
+        requests_future = DartFutureAdapter(
+            self,
+            self.authenticated_request(sanitized_params),
+            misc_options,
+            operation_id=getattr(operation, 'operation_id', None))
+
+        return HttpFuture(
+            requests_future,
+            self.response_adapter,
+            operation,
+            response_callbacks,
+            also_return_response)
+
+    def response_adapter(self, requests_lib_response):
+        """
+        Wrap a requests response for bravado.
+
+        :param requests_lib_response: the requests.Response
+        :return: the DartResponseAdapter
+        """
+        return DartResponseAdapter(requests_lib_response, self.json_codec)
+
+
+def _mount_adapters(session, pool_maxsize):
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, HTTPAdapter(pool_maxsize=pool_maxsize))
+
+
+def gzip_compress(body):
+    """
+    :param body: the request body as bytes or text
+    :return: the gzip compressed body
+    """
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def received_size(response):
+    """
+    :param response: a requests.Response whose content has been read
+    :return: the number of body bytes that came over the wire
+    """
+    try:
+        return response.raw.tell()
+    except (AttributeError, TypeError):
+        return len(response.content)
@@ -0,0 +1,187 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+
+# The operations that fetch a single entity by id, used to validate index
+# entries, as (resource, operation id).
+GET_OPERATIONS = {
+    'datastore': ('Datastore', 'getDatastore'),
+    'workflow': ('Workflow', 'getWorkflow'),
+    'action': ('Action', 'getAction'),
+    'trigger': ('Trigger', 'getTrigger'),
+    'dataset': ('Dataset', 'getDataset'),
+    'subscription': ('Subscription', 'getSubscription'),
+}
+
+IndexEntry = collections.namedtuple('IndexEntry', ['id', 'fingerprint', 'verified'])
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entities (
+    entity_type TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    fingerprint TEXT,
+    verified REAL NOT NULL,
+    PRIMARY KEY (entity_type, scope, name)
+)
+'''
+
+
+class EntityIndex(object):
+    """
+    A persistent name => id index in an SQLite file, for sharing entity ids
+    between processes and short-lived jobs. SQLite's locking makes it safe
+    for concurrent readers and writers in several processes, and each
+    thread uses its own connection.
+
+    Entries are keyed by entity type, name and scope (the other find
+    arguments, e.g. the datastore id of a workflow) and hold the entity id,
+    its last known fingerprint (the version id) and when it was last
+    verified against Dart. Entries are only hints: SyncManager validates
+    them on use and replaces stale ones.
+    """
+
+    def __init__(self, path, max_age=3600, timeout=30.0, clock=time.time):
+        """
+        :param path: the SQLite file, created if it does not exist
+        :param max_age: how long in seconds a verified entry is trusted by
+            SyncManager.resolve_id without asking Dart again
+        :param timeout: how long in seconds to wait for another process's
+            write lock
+        :param clock: a function returning the current time in seconds
+        """
+        self.path = path
+        self.max_age = max_age
+        self.timeout = timeout
+        self.clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        with self._connection() as connection:
+            connection.execute(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, entity_type, name, scope=()):
+        """
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param name: the entity name
+        :param scope: the other find arguments, e.g. (('datastore_id', 'ID'),)
+        :return: the IndexEntry, or None
+        """
+        row = self._connection().execute(
+            'SELECT id, fingerprint, verified FROM entities WHERE entity_type = ? AND scope = ? AND name = ?',
+            (entity_type, _scope(scope), name)).fetchone()
+        self._count('hits' if row else 'misses')
+        return IndexEntry(*row) if row else None
+
+    def is_fresh(self, entry):
+        """
+        :param entry: an IndexEntry
+        :return: True if the entry was verified less than max_age ago
+        """
+        return self.clock() - entry.verified < self.max_age
+
+    def put(self, entity_type, name, entity_id, fingerprint=None, scope=()):
+        """
+        Add or replace an entry, marking it as verified now.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO entities (entity_type, scope, name, id, fingerprint, verified) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (entity_type, _scope(scope), name, entity_id, fingerprint, self.clock()))
+
+    def discard(self, entity_type, name, scope=None):
+        """
+        Remove the entries for a name, in one scope or in every scope.
+        """
+        with self._connection() as connection:
+            if scope is None:
+                connection.execute('DELETE FROM entities WHERE entity_type = ? AND name = ?', (entity_type, name))
+            else:
+                connection.execute('DELETE FROM entities WHERE entity_type = ? AND scope = ? AND name = ?',
+                                   (entity_type, _scope(scope), name))
+
+    def mark_stale(self, entity_type, name, scope=()):
+        """
+        Remove an entry that failed validation.
+        """
+        self._count('stale')
+        self.discard(entity_type, name, scope)
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+
+    def as_dict(self):
+        """
+        :return: the counters as a dictionary
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'stale': self.stale, 'size': len(self)}
+
+
+def fingerprint(entity):
+    """
+    :param entity: an entity object
+    :return: a string that changes whenever the entity changes
+    """
+    value = entity.version_id if entity.version_id is not None else entity.updated
+    return None if value is None else str(value)
+
+
+def matches_filters(entity, filters):
+    """
+    :param entity: an entity object
+    :param filters: the find arguments, e.g. {'name': ..., 'datastore_id': ...}
+    :return: True if the entity still satisfies the find arguments
+    """
+    for field, value in filters.items():
+        actual = getattr(entity.data, field, None)
+        if isinstance(actual, list):
+            if str(value) not in [str(item) for item in actual]:
+                return False
+        elif str(actual) != str(value):
+            return False
+    return True
+
+
+def _scope(scope):
+    return json.dumps([list(item) for item in scope])
@@ -0,0 +1,167 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import os
+import threading
+import time
+
+
+class JournalEntry(object):
+    """
+    A completed sync step: the entity it created or updated and the
+    entity's fingerprint (its version id) right after the step.
+    """
+
+    def __init__(self, entity_type, name, key, id, fingerprint, recorded):
+        self.entity_type = entity_type
+        self.name = name
+        self.key = key
+        self.id = id
+        self.fingerprint = fingerprint
+        self.recorded = recorded
+
+    def __repr__(self):
+        return 'JournalEntry(%s %s, id=%s, fingerprint=%s)' % (self.entity_type, self.name, self.id, self.fingerprint)
+
+
+class SyncJournal(object):
+    """
+    An append-only journal of the sync steps a SyncManager has completed,
+    one JSON object per line, so that a large sync that failed part way can
+    be run again and resume where it stopped. A step is keyed by entity
+    type, entity name and the arguments that locate the entity (e.g. the id
+    of a workflow's datastore); when a step is repeated, SyncManager fetches
+    the journaled entity by id and skips the step if its fingerprint shows
+    that it has not changed since.
+
+    A journal belongs to one version of a model: steps are skipped without
+    calling their callbacks, so clear the journal, or use a new file, when
+    the model changes. A line cut short by a crash is ignored.
+    """
+
+    def __init__(self, path, fsync=False):
+        """
+        :param path: the journal file, created if it does not exist
+        :param fsync: if True, force each entry to disk before the step is
+            considered complete, at the cost of a disk sync per step
+        """
+        self.path = path
+        self.fsync = fsync
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.resumed = 0
+        self.invalidated = 0
+        self.recorded = 0
+        content = ''
+        if os.path.exists(path):
+            with open(path) as f:
+                content = f.read()
+            for line in content.splitlines():
+                self._load(line)
+        self._file = open(path, 'a')
+        if content and not content.endswith('\n'):
+            # terminate a line cut short by a crash so the next entry is whole
+            self._file.write('\n')
+
+    def _load(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        key = (record['type'], record['name'], tuple(record['key']))
+        self._entries[key] = JournalEntry(record['type'], record['name'], tuple(record['key']), record['id'],
+                                          record['fingerprint'], record['recorded'])
+
+    def get(self, entity_type, name, key=()):
+        """
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param name: the entity name
+        :param key: the other arguments of the step as a tuple
+        :return: the JournalEntry of the step, or None
+        """
+        with self._lock:
+            return self._entries.get((entity_type, name, tuple(key)))
+
+    def record(self, entity_type, name, key, entity_id, fingerprint):
+        """
+        Append a completed step.
+
+        :param entity_type: the entity type, e.g. 'workflow'
+        :param name: the entity name
+        :param key: the other arguments of the step as a tuple
+        :param entity_id: the id of the created or updated entity
+        :param fingerprint: the entity's fingerprint after the step
+        """
+        recorded = time.time()
+        line = json.dumps({'type': entity_type, 'name': name, 'key': list(key), 'id': entity_id,
+                           'fingerprint': fingerprint, 'recorded': recorded}, sort_keys=True)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._entries[(entity_type, name, tuple(key))] = JournalEntry(
+                entity_type, name, tuple(key), entity_id, fingerprint, recorded)
+            self.recorded += 1
+
+    def count(self, counter):
+        """
+        :param counter: 'resumed' or 'invalidated'
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        """
+        Forget every step, e.g. after a sync has finished or the model has
+        changed.
+        """
+        with self._lock:
+            self._file.close()
+            self._file = open(self.path, 'w')
+            self._entries.clear()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def as_dict(self):
+        """
+        :return: the counters as a dictionary
+        """
+        return {
+            'steps': len(self._entries),
+            'resumed': self.resumed,
+            'invalidated': self.invalidated,
+            'recorded': self.recorded,
+        }
@@ -0,0 +1,132 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
+
+from dartclient.http_client import DartRequestsClient
+
+
+# The operation that starts a workflow run. It takes workflow_id and returns
+# the new workflow instance in results.
+RUN_WORKFLOW_OPERATION = ('Workflow', 'manuallyRunWorkflow')
+
+
+class LaunchResult(object):
+    """
+    The outcome of starting a single workflow run.
+    """
+
+    def __init__(self, workflow_id, kwargs, seconds, instance=None, error=None):
+        self.workflow_id = workflow_id
+        self.kwargs = kwargs
+        self.seconds = seconds
+        self.instance = instance
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def instance_id(self):
+        return getattr(self.instance, 'id', None)
+
+    def __repr__(self):
+        return 'LaunchResult(%s, instance_id=%r, error=%r)' % (self.workflow_id, self.instance_id, self.error)
+
+
+class LaunchReport(object):
+    """
+    The results of launch_workflow_runs, in the order the runs were given.
+    """
+
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def instance_ids(self):
+        return [result.instance_id for result in self.results if result.ok]
+
+    @property
+    def failures(self):
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    def __repr__(self):
+        return 'LaunchReport(launched=%d, failures=%d, seconds=%.2f)' % (
+            len(self.results) - len(self.failures), len(self.failures), self.seconds)
+
+
+def launch_workflow_runs(sync_manager, runs, max_in_flight=16, progress=None):
+    """
+    Start many workflow runs concurrently, with at most max_in_flight
+    requests outstanding. A failed launch is recorded in the report and does
+    not stop the other runs.
+
+    :param sync_manager: the SyncManager
+    :param runs: an iterable of workflow ids, workflow objects, or
+        (workflow id, kwargs) tuples where kwargs are extra arguments for
+        the run operation
+    :param max_in_flight: the maximum number of concurrent requests
+    :param progress: an optional function with a signature
+        (result, completed, total) => None, called as each launch finishes
+    :return: the LaunchReport
+    """
+    runs = [_normalize_run(run) for run in runs]
+    http_client = getattr(getattr(sync_manager.client, 'swagger_spec', None), 'http_client', None)
+    if isinstance(http_client, DartRequestsClient):
+        http_client.ensure_pool_size(max_in_flight)
+    resource_name, operation_id = RUN_WORKFLOW_OPERATION
+    operation = getattr(getattr(sync_manager.client, resource_name), operation_id)
+
+    def launch(workflow_id, kwargs):
+        start = time.time()
+        try:
+            timeout = sync_manager.request_timeout(operation_id)
+            response = sync_manager._result(operation(workflow_id=workflow_id, **kwargs), operation_id, timeout)
+        except Exception as e:
+            return LaunchResult(workflow_id, kwargs, time.time() - start, error=e)
+        return LaunchResult(workflow_id, kwargs, time.time() - start, instance=response.results)
+
+    start = time.time()
+    results = [None] * len(runs)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        futures = dict((executor.submit(launch, *run), index) for (index, run) in enumerate(runs))
+        for completed, future in enumerate(as_completed(futures), 1):
+            result = results[futures[future]] = future.result()
+            if progress:
+                progress(result, completed, len(runs))
+    return LaunchReport(results, time.time() - start)
+
+
+def _normalize_run(run):
+    if isinstance(run, tuple):
+        workflow_id, kwargs = run
+    else:
+        workflow_id, kwargs = run, {}
+    return getattr(workflow_id, 'id', workflow_id), dict(kwargs or {})
@@ -0,0 +1,435 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+
+from six.moves import queue
+
+from dartclient.core import create_sync_manager
+from dartclient.plan import ModelPlan, PlanRunner
+
+
+OPERATIONS = ('find', 'sync', 'clean')
+
+DEFAULT_MIX = {'find': 0.7, 'sync': 0.25, 'clean': 0.05}
+
+LOAD_TAG = 'dartclient-loadtest'
+
+PERCENTILES = (50, 90, 99)
+
+# how often to check for clients that died while waiting for their messages
+_POLL_SECONDS = 1.0
+
+
+class LoadResult(object):
+    """
+    The measurements of one LoadTest run: the latencies of the successful
+    operations, the number of failed ones, and the CPU time and memory
+    used. In thread mode the CPU time and resident memory are those of the
+    whole process at the end of the run; in process mode they are the sums
+    of the client processes' CPU time and peak resident memory.
+    """
+
+    def __init__(self, clients, mode, seconds, latencies, errors, cpu_seconds, rss_mb, failed_clients=()):
+        self.clients = clients
+        self.mode = mode
+        self.seconds = seconds
+        self.latencies = dict((operation, sorted(values)) for (operation, values) in latencies.items())
+        self.errors = errors
+        self.cpu_seconds = cpu_seconds
+        self.rss_mb = rss_mb
+        # why each client that did not finish the run failed, e.g. killed for running out of memory
+        self.failed_clients = list(failed_clients)
+
+    @property
+    def operations(self):
+        return sum(len(values) for values in self.latencies.values()) + sum(self.errors.values())
+
+    @property
+    def throughput(self):
+        """
+        :return: the operations completed per second, including failed ones
+        """
+        return self.operations / self.seconds if self.seconds else 0.0
+
+    @property
+    def error_rate(self):
+        return float(sum(self.errors.values())) / self.operations if self.operations else 0.0
+
+    def percentiles(self, operation=None):
+        """
+        :param operation: an operation name, or None for every operation
+        :return: a dictionary of 'p50', 'p90', 'p99' and 'max' => latency in
+            seconds of the successful operations, or None without any
+        """
+        if operation is None:
+            latencies = sorted(value for values in self.latencies.values() for value in values)
+        else:
+            latencies = self.latencies.get(operation) or []
+        result = dict(('p%d' % (percentile,), _percentile(latencies, percentile)) for percentile in PERCENTILES)
+        result['max'] = latencies[-1] if latencies else None
+        return result
+
+    def as_dict(self):
+        """
+        :return: the measurements as a JSON serializable dictionary
+        """
+        return {
+            'clients': self.clients,
+            'mode': self.mode,
+            'seconds': self.seconds,
+            'operations': self.operations,
+            'throughput': self.throughput,
+            'error_rate': self.error_rate,
+            'cpu_seconds': self.cpu_seconds,
+            'rss_mb': self.rss_mb,
+            'failed_clients': self.failed_clients,
+            'latency': self.percentiles(),
+            'by_operation': dict((operation, dict(self.percentiles(operation), count=len(values),
+                                                  errors=self.errors.get(operation, 0)))
+                                 for (operation, values) in self.latencies.items()),
+        }
+
+    def summary(self):
+        """
+        :return: a one line, human readable summary
+        """
+        latency = self.percentiles()
+        summary = '%4d clients  %8.1f ops/s  p50 %s  p90 %s  p99 %s  max %s  errors %5.2f%%  cpu %6.2fs  rss %7.1fMB' % (
+            self.clients, self.throughput, _ms(latency['p50']), _ms(latency['p90']), _ms(latency['p99']),
+            _ms(latency['max']), self.error_rate * 100, self.cpu_seconds, self.rss_mb)
+        if self.failed_clients:
+            summary += '  %d clients failed: %s' % (len(self.failed_clients), self.failed_clients[0])
+        return summary
+
+
+class LoadTest(object):
+    """
+    Drives a Dart server with many concurrent SyncManager clients to find
+    how many one process or host can run before latency collapses. Each
+    client has its own client and SyncManager and runs a closed loop of
+    operations drawn at random from a mix:
+
+    * ``find``: find one of the prepared datasets by name
+    * ``sync``: create or update one of the client's own datasets
+    * ``clean``: delete one of the datasets the client synced, or sync one
+      if it has none yet
+
+    Clients run as threads of this process or as separate processes. Point
+    it at a StubDartServer (ideally a StubDartServerProcess) with injected
+    latency and errors, or at a test Dart server. Everything it creates is
+    tagged with the tag so that cleanup can remove it.
+    """
+
+    def __init__(self, api_url, mix=None, mode='thread', duration=10.0, operations=None, find_pool=100,
+                 sync_pool=20, columns=10, think_time=0.0, seed=None, sync_manager_kwargs=None, tag=LOAD_TAG):
+        """
+        :param api_url: the Dart API URL
+        :param mix: a dictionary of operation => relative weight, by default
+            DEFAULT_MIX
+        :param mode: 'thread' or 'process'
+        :param duration: the seconds each client runs for, or None to run
+            a number of operations
+        :param operations: the maximum number of operations per client, or
+            None to run for the duration
+        :param find_pool: the number of datasets prepared for find operations
+        :param sync_pool: the number of datasets each client syncs
+        :param columns: the number of columns of each synced dataset
+        :param think_time: the seconds each client waits between operations
+        :param seed: the seed of the operation choices
+        :param sync_manager_kwargs: keyword arguments of create_sync_manager,
+            e.g. {'coalesce_reads': True}
+        :param tag: the tag of the entities the load test creates
+        """
+        mix = dict(mix or DEFAULT_MIX)
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ValueError('Unknown operations: %s' % (', '.join(sorted(unknown)),))
+        if mode not in ('thread', 'process'):
+            raise ValueError('mode must be thread or process')
+        if duration is None and operations is None:
+            raise ValueError('A duration or a number of operations is required')
+        self.api_url = api_url
+        self.mode = mode
+        self.sync_manager_kwargs = dict(sync_manager_kwargs or {})
+        self.tag = tag
+        self.settings = {
+            'api_url': api_url, 'mix': mix, 'duration': duration, 'operations': operations,
+            'find_pool': find_pool, 'sync_pool': sync_pool, 'columns': columns, 'think_time': think_time,
+            'seed': seed, 'sync_manager_kwargs': self.sync_manager_kwargs, 'tag': tag,
+        }
+
+    def _sync_manager(self):
+        return create_sync_manager(api_url=self.api_url, model_defaults={'tags': [self.tag]},
+                                   **self.sync_manager_kwargs)
+
+    def prepare(self, workers=8):
+        """
+        Create the datasets that find operations look up.
+
+        :param workers: the maximum number of concurrent requests
+        :return: the RunReport
+        """
+        plan = ModelPlan({'datasets': [{'name': _find_name(index)} for index in range(self.settings['find_pool'])]})
+        return PlanRunner(self._sync_manager(), plan, workers=workers).sync()
+
+    def cleanup(self, workers=8):
+        """
+        Delete every dataset the load test created.
+
+        :param workers: the maximum number of concurrent requests
+        :return: the CleanReport
+        """
+        return self._sync_manager().clean_by_tag(self.tag, entity_types=('dataset',), workers=workers)
+
+    def run(self, clients):
+        """
+        Run the clients until each has run for the duration or completed its
+        operations. The clients are created, and download the Swagger spec,
+        before the measurement starts.
+
+        :param clients: the number of concurrent clients
+        :return: the LoadResult
+        """
+        if self.mode == 'thread':
+            messages, start, stop = queue.Queue(), threading.Event(), threading.Event()
+            workers = [threading.Thread(target=_run_client, args=(index, self.settings, messages, start, stop))
+                       for index in range(clients)]
+        else:
+            messages, start, stop = multiprocessing.Queue(), multiprocessing.Event(), multiprocessing.Event()
+            workers = [multiprocessing.Process(target=_run_client, args=(index, self.settings, messages, start, stop))
+                       for index in range(clients)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        failures = [error for error in _collect(messages, workers).values() if error is not None]
+        if failures:
+            stop.set()
+            start.set()
+            for worker in workers:
+                worker.join()
+            raise RuntimeError('%d of %d clients could not start: %s' % (len(failures), clients, failures[0]))
+
+        started, cpu_started = time.time(), _cpu_seconds()
+        start.set()
+        messages_done = _collect(messages, workers, results=True)
+        seconds, cpu_seconds = time.time() - started, _cpu_seconds() - cpu_started
+        for worker in workers:
+            worker.join()
+        results = [result for (error, result) in messages_done.values() if error is None]
+        failed_clients = [error for (error, _) in messages_done.values() if error is not None]
+
+        latencies = dict((operation, []) for operation in self.settings['mix'])
+        errors = dict((operation, 0) for operation in self.settings['mix'])
+        for result in results:
+            for operation, values in result['latencies'].items():
+                latencies.setdefault(operation, []).extend(values)
+            for operation, count in result['errors'].items():
+                errors[operation] = errors.get(operation, 0) + count
+        if self.mode == 'process':
+            cpu_seconds = sum(result['cpu_seconds'] for result in results)
+            rss_mb = sum(result['max_rss_mb'] for result in results)
+        else:
+            rss_mb = _rss_mb()
+        return LoadResult(clients, self.mode, seconds, latencies, errors, cpu_seconds, rss_mb,
+                          failed_clients=failed_clients)
+
+    def sweep(self, client_counts, progress=None):
+        """
+        Run the load test once per client count, e.g. [1, 2, 4, 8, 16, 32],
+        to find where throughput stops growing and latency collapses.
+
+        :param client_counts: the numbers of clients
+        :param progress: an optional function called with each LoadResult
+        :return: a list of LoadResults
+        """
+        results = []
+        for clients in client_counts:
+            result = self.run(clients)
+            results.append(result)
+            if progress:
+                progress(result)
+        return results
+
+
+class _LoadClient(object):
+
+    def __init__(self, index, settings):
+        self.index = index
+        self.settings = settings
+        self.sync_manager = create_sync_manager(api_url=settings['api_url'], model_defaults={'tags': [settings['tag']]},
+                                                **settings['sync_manager_kwargs'])
+        seed = settings['seed']
+        self.random = random.Random(None if seed is None else seed * 1000003 + index)
+        self.columns = [('column%d' % (column,), 'VARCHAR') for column in range(settings['columns'])]
+        self.synced = set()
+        self.count = 0
+
+    def find(self):
+        self.sync_manager.find_dataset(_find_name(self.random.randrange(self.settings['find_pool'])))
+        return 'find'
+
+    def sync(self):
+        self.count += 1
+        name = 'loadtest-%d-%d' % (self.index, self.random.randrange(self.settings['sync_pool']))
+        description = 'load test operation %d' % (self.count,)
+
+        def callback(dataset):
+            dataset.data.description = description
+            return dataset
+
+        self.sync_manager.sync_dataset(name, callback, columns=self.columns)
+        self.synced.add(name)
+        return 'sync'
+
+    def clean(self):
+        if not self.synced:
+            return self.sync()
+        name = self.random.choice(sorted(self.synced))
+        self.synced.discard(name)
+        self.sync_manager.clean_dataset(self.sync_manager.find_dataset(name))
+        return 'clean'
+
+    def run(self, stop):
+        settings = self.settings
+        mix = sorted(settings['mix'].items())
+        total = float(sum(weight for (_, weight) in mix))
+        latencies = dict((operation, []) for (operation, _) in mix)
+        errors = dict((operation, 0) for (operation, _) in mix)
+        deadline = time.time() + settings['duration'] if settings['duration'] is not None else None
+        completed = 0
+        while not stop.is_set() and (settings['operations'] is None or completed < settings['operations']) and \
+                (deadline is None or time.time() < deadline):
+            choice = self.random.random() * total
+            for operation, weight in mix:
+                choice -= weight
+                if choice < 0:
+                    break
+            started = time.time()
+            try:
+                operation = getattr(self, operation)()
+            except Exception:
+                errors[operation] += 1
+            else:
+                latencies.setdefault(operation, []).append(time.time() - started)
+                errors.setdefault(operation, 0)
+            completed += 1
+            if settings['think_time']:
+                time.sleep(settings['think_time'])
+        return {'latencies': latencies, 'errors': errors}
+
+
+def _run_client(index, settings, messages, start, stop):
+    try:
+        client = _LoadClient(index, settings)
+    except Exception as e:
+        messages.put(('ready', index, '%s: %s' % (type(e).__name__, e)))
+        return
+    messages.put(('ready', index, None))
+    start.wait()
+    if stop.is_set():
+        return
+    result, error = None, None
+    try:
+        cpu_started = _cpu_seconds()
+        result = client.run(stop)
+        result.update(cpu_seconds=_cpu_seconds() - cpu_started, max_rss_mb=_max_rss_mb())
+    except BaseException as e:
+        error = 'client %d failed: %s: %s' % (index, type(e).__name__, e)
+        raise
+    finally:
+        messages.put(('done', index, error, result))
+
+
+def _collect(messages, workers, results=False):
+    """
+    Wait for one message from each client. A client that exits without
+    posting its message, e.g. a process killed for running out of memory,
+    is reported as failed instead of waiting for it forever.
+
+    :param results: True to collect the 'done' messages, False for 'ready'
+    :return: a dictionary of client index => error, or (error, result) when
+        collecting results; the error is None for the clients that succeeded
+    """
+    received = {}
+    suspects = set()
+    while len(received) < len(workers):
+        try:
+            message = messages.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            # a message posted just before the client exited may still be on
+            # its way, so a client is only given up on after a second poll
+            dead = set(index for (index, worker) in enumerate(workers)
+                       if index not in received and not worker.is_alive())
+            for index in dead & suspects:
+                exitcode = getattr(workers[index], 'exitcode', None)
+                error = 'client %d exited without reporting%s' % (
+                    index, '' if exitcode is None else ' (exit code %s)' % (exitcode,))
+                received[index] = (error, None) if results else error
+            suspects = dead
+            continue
+        received[message[1]] = (message[2], message[3]) if results else message[2]
+    return received
+
+
+def _find_name(index):
+    return 'loadtest-find-%d' % (index,)
+
+
+def _percentile(values, percentile):
+    if not values:
+        return None
+    return values[int(round((len(values) - 1) * percentile / 100.0))]
+
+
+def _ms(seconds):
+    return '%8.1fms' % (seconds * 1000,) if seconds is not None else '       -  '
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else max_rss / 1024.0
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+    except (IOError, OSError, ValueError):
+        return _max_rss_mb()
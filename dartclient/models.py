@@ -0,0 +1,59 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+ENTITY_TYPES = ('datastore', 'workflow', 'action', 'trigger', 'dataset', 'subscription')
+
+SERVER_FIELDS = ('id', 'version_id', 'created', 'updated')
+
+
+def is_model(value):
+    """
+    :param value: any value
+    :return: True if the value is a bravado model object
+    """
+    return hasattr(type(value), '__dir__') and '_additional_props' in getattr(value, '__dict__', {})
+
+
+def model_to_dict(value):
+    """
+    Convert a bravado model object, and any models nested in it, into plain
+    json-like dictionaries and lists.
+
+    :param value: a model object, dictionary, list or primitive value
+    :return: the json-like value
+    """
+    if is_model(value):
+        return dict((name, model_to_dict(getattr(value, name))) for name in dir(value))
+    if isinstance(value, dict):
+        return dict((key, model_to_dict(item)) for (key, item) in value.items())
+    if isinstance(value, (list, tuple)):
+        return [model_to_dict(item) for item in value]
+    return value
+
+
+def strip_server_fields(entity):
+    """
+    :param entity: an entity as a dictionary
+    :return: a copy of the entity without the fields that Dart assigns
+    """
+    return dict((key, value) for (key, value) in entity.items() if key not in SERVER_FIELDS)
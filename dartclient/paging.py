@@ -0,0 +1,137 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import threading
+
+
+class PageStats(object):
+    """
+    The page size chosen for one entity type and what was observed.
+    """
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.pages = 0
+        self.entities = 0
+        self.seconds = 0.0
+        self.bytes_per_entity = None
+        self.grown = 0
+        self.shrunk = 0
+
+    def as_dict(self):
+        return {
+            'page_size': self.page_size,
+            'pages': self.pages,
+            'entities': self.entities,
+            'mean_seconds': self.seconds / self.pages if self.pages else None,
+            'bytes_per_entity': self.bytes_per_entity,
+            'grown': self.grown,
+            'shrunk': self.shrunk,
+        }
+
+
+class PageSizeTuner(object):
+    """
+    Chooses the limit of list operations per entity type from the observed
+    response times and response sizes. A type's page size grows while full
+    pages come back well within target_seconds, and shrinks when a page is
+    slower than that or larger than max_page_bytes. Whatever the latency,
+    the page size is capped so that the expected response, based on the
+    average bytes per entity seen so far, stays under max_page_bytes.
+    """
+
+    def __init__(self, initial=1024, minimum=50, maximum=10000, target_seconds=1.0,
+                 max_page_bytes=8 * 1024 * 1024, growth=2.0):
+        """
+        :param initial: the first page size for every entity type
+        :param minimum: the smallest page size
+        :param maximum: the largest page size
+        :param target_seconds: the response time to stay within
+        :param max_page_bytes: the largest response body to aim for
+        :param growth: the factor by which the page size grows or shrinks
+        """
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_page_bytes = max_page_bytes
+        self.growth = growth
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def page_size(self, entity_type):
+        """
+        :param entity_type: the entity type, e.g. 'action'
+        :return: the page size to request next
+        """
+        with self._lock:
+            return self._get(entity_type).page_size
+
+    def record(self, entity_type, limit, count, seconds, size=None):
+        """
+        Adjust an entity type's page size after a list call.
+
+        :param entity_type: the entity type, e.g. 'action'
+        :param limit: the limit that was requested
+        :param count: the number of entities returned
+        :param seconds: the response time
+        :param size: the response body size in bytes, if known
+        """
+        with self._lock:
+            stats = self._get(entity_type)
+            stats.pages += 1
+            stats.entities += count
+            stats.seconds += seconds
+            if size is not None and count:
+                per_entity = float(size) / count
+                stats.bytes_per_entity = per_entity if stats.bytes_per_entity is None \
+                    else (stats.bytes_per_entity + per_entity) / 2
+
+            page_size = stats.page_size
+            if seconds > self.target_seconds or (size is not None and size > self.max_page_bytes):
+                page_size = int(min(page_size, limit) / self.growth)
+            elif count >= limit and seconds < self.target_seconds / self.growth:
+                # only a full page says how long a bigger one would take
+                page_size = int(max(page_size, limit) * self.growth)
+            if stats.bytes_per_entity:
+                page_size = min(page_size, int(self.max_page_bytes / stats.bytes_per_entity))
+            page_size = max(self.minimum, min(self.maximum, page_size))
+
+            if page_size > stats.page_size:
+                stats.grown += 1
+            elif page_size < stats.page_size:
+                stats.shrunk += 1
+            stats.page_size = page_size
+
+    def _get(self, entity_type):
+        stats = self._stats.get(entity_type)
+        if stats is None:
+            stats = self._stats[entity_type] = PageStats(self.initial)
+        return stats
+
+    def as_dict(self):
+        """
+        :return: the page size and counters of each entity type
+        """
+        with self._lock:
+            return dict((entity_type, stats.as_dict()) for (entity_type, stats) in self._stats.items())
@@ -0,0 +1,124 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import threading
+
+
+# The JSON Patch (RFC 6902) operations used for partial updates, as
+# (resource, operation id, body parameter). SyncManager only uses an
+# operation if the client's Swagger specification has it.
+PATCH_OPERATIONS = {
+    'datastore': ('Datastore', 'patchDatastore', 'patch'),
+    'workflow': ('Workflow', 'patchWorkflow', 'patch'),
+    'action': ('Action', 'patchAction', 'patch'),
+    'trigger': ('Trigger', 'patchTrigger', 'patch'),
+    'dataset': ('Dataset', 'patchDataset', 'patch'),
+}
+
+
+class UpdateStats(object):
+    """
+    Counts the updates made with partial updates enabled, and the request
+    body bytes sent compared with sending every update in full.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.full = 0
+        self.patched = 0
+        self.unchanged = 0
+        self.bytes_sent = 0
+        self.bytes_full = 0
+
+    def record(self, kind, bytes_sent, bytes_full):
+        """
+        :param kind: 'full', 'patched' or 'unchanged'
+        :param bytes_sent: the size of the request body that was sent
+        :param bytes_full: the size of the full update request body
+        """
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            self.bytes_sent += bytes_sent
+            self.bytes_full += bytes_full
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_full - self.bytes_sent
+
+    def as_dict(self):
+        """
+        :return: the counters as a dictionary
+        """
+        return {
+            'full': self.full,
+            'patched': self.patched,
+            'unchanged': self.unchanged,
+            'bytes_sent': self.bytes_sent,
+            'bytes_full': self.bytes_full,
+            'bytes_saved': self.bytes_saved,
+        }
+
+
+class UnchangedResponse(object):
+    """
+    Stands in for the response of an update that was not sent because
+    nothing changed.
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+
+def patch_operations(original, desired):
+    """
+    Compute the JSON Patch operations that turn the original entity into the
+    desired one. Fields of the entity's data are compared as a whole, so a
+    changed column list or args dictionary is sent in full but unchanged
+    fields are not sent at all.
+
+    :param original: the entity as fetched, as a dictionary
+    :param desired: the entity after the changes, as a dictionary
+    :return: a list of JSON Patch operations
+    """
+    original = original.get('data') or {}
+    desired = desired.get('data') or {}
+    operations = []
+    for field in sorted(set(original) | set(desired)):
+        value = desired.get(field)
+        if value == original.get(field):
+            continue
+        path = '/data/' + field.replace('~', '~0').replace('/', '~1')
+        if value is None:
+            operations.append({'op': 'remove', 'path': path})
+        else:
+            operations.append({'op': 'add', 'path': path, 'value': value})
+    return operations
+
+
+def payload_size(value):
+    """
+    :param value: a json-like value
+    :return: the size of the value serialized as compact JSON, in bytes
+    """
+    return len(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8'))
@@ -0,0 +1,429 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
+
+import yaml
+
+from dartclient.columns import ColumnSchema
+from dartclient.models import ENTITY_TYPES
+
+
+class ModelPlan(object):
+    """
+    A declarative description of a Dart model, usually loaded from a YAML or
+    JSON file::
+
+        defaults:
+          tags: [my_team]
+        datasets:
+          - name: dataset1
+            columns: [[column1, VARCHAR], [column2, DATETIME]]
+            data: {table_name: table1, location: 's3://bucket/path'}
+            subscriptions:
+              - name: subscription1
+                data: {state: INACTIVE}
+        datastores:
+          - name: datastore1
+            state: ACTIVE
+            data: {engine_name: no_op_engine, concurrency: 1}
+            workflows:
+              - name: workflow1
+                data: {engine_name: no_op_engine}
+                actions:
+                  - name: action1
+                    dataset: dataset1
+                    data: {action_type_name: fake_load_dataset, order_idx: 0}
+                triggers:
+                  - name: trigger1
+                    subscription: subscription1
+                    data: {trigger_type_name: subscription_batch}
+
+    ``data`` holds the fields to set on the entity's data object; nested
+    dictionaries are applied field by field to nested models such as a
+    dataset's data_format. Dataset ``columns`` accepts anything that
+    ColumnSchema.coerce accepts, or ``{csv: path}`` / ``{ddl: text}``. Actions
+    and triggers refer to datasets and subscriptions by name.
+    """
+
+    def __init__(self, description, base_path='.'):
+        """
+        :param description: the model description as a dictionary
+        :param base_path: the directory that relative CSV paths are read from
+        """
+        self.description = description
+        self.base_path = base_path
+        self.defaults = description.get('defaults') or {}
+        self.datastores = description.get('datastores') or []
+        self.datasets = description.get('datasets') or []
+        self._validate()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model description from a YAML or JSON file.
+
+        :param path: the file path
+        :return: the ModelPlan
+        """
+        with open(path) as f:
+            if path.endswith('.json'):
+                description = json.load(f)
+            else:
+                description = yaml.safe_load(f)
+        return cls(description or {}, base_path=os.path.dirname(os.path.abspath(path)))
+
+    def _validate(self):
+        subscriptions = set()
+        datasets = set()
+        for dataset in self.datasets:
+            _require_name('dataset', dataset)
+            datasets.add(dataset['name'])
+            for subscription in dataset.get('subscriptions') or []:
+                _require_name('subscription', subscription)
+                subscriptions.add(subscription['name'])
+        for datastore in self.datastores:
+            _require_name('datastore', datastore)
+            for workflow in datastore.get('workflows') or []:
+                _require_name('workflow', workflow)
+                for child_type in ('action', 'trigger'):
+                    for child in workflow.get(child_type + 's') or []:
+                        _require_name(child_type, child)
+                        if child.get('dataset') and child['dataset'] not in datasets:
+                            raise ValueError('%s %s refers to unknown dataset %s' % (
+                                child_type, child['name'], child['dataset']))
+                        if child.get('subscription') and child['subscription'] not in subscriptions:
+                            raise ValueError('%s %s refers to unknown subscription %s' % (
+                                child_type, child['name'], child['subscription']))
+
+    def columns(self, dataset):
+        """
+        :param dataset: a dataset description
+        :return: the dataset's ColumnSchema, or None if it has no columns
+        """
+        columns = dataset.get('columns')
+        if columns is None:
+            return None
+        if isinstance(columns, dict):
+            if 'csv' in columns:
+                return ColumnSchema.from_csv(os.path.join(self.base_path, columns['csv']))
+            if 'ddl' in columns:
+                return ColumnSchema.from_ddl(columns['ddl'])
+            raise ValueError('Dataset %s columns must be a list or have a csv or ddl key' % (dataset['name'],))
+        return ColumnSchema.coerce(columns)
+
+    def count(self):
+        """
+        :return: the number of entities in the plan
+        """
+        count = len(self.datasets) + len(self.datastores)
+        for dataset in self.datasets:
+            count += len(dataset.get('subscriptions') or [])
+        for datastore in self.datastores:
+            for workflow in datastore.get('workflows') or []:
+                count += 1 + len(workflow.get('actions') or []) + len(workflow.get('triggers') or [])
+        return count
+
+
+def apply_data(entity, data):
+    """
+    Set the fields in data on entity.data. Dictionary values are applied
+    field by field when the current value is a model object, and replace the
+    current value otherwise.
+
+    :param entity: the model object
+    :param data: a dictionary of field name => value
+    :return: the entity
+    """
+    for key, value in (data or {}).items():
+        current = getattr(entity.data, key, None)
+        if isinstance(value, dict) and current is not None and not isinstance(current, dict):
+            for nested_key, nested_value in value.items():
+                setattr(current, nested_key, nested_value)
+        else:
+            setattr(entity.data, key, value)
+    return entity
+
+
+def data_callback(description):
+    """
+    :param description: an entity description from a ModelPlan
+    :return: a SyncManager callback that applies the description's data
+    """
+    data = description.get('data')
+    return lambda entity: apply_data(entity, data)
+
+
+class StepResult(object):
+    """
+    The outcome of syncing or cleaning a single entity.
+    """
+
+    def __init__(self, entity_type, path, seconds, error=None, skipped=False):
+        self.entity_type = entity_type
+        self.path = path
+        self.seconds = seconds
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def ok(self):
+        return self.error is None and not self.skipped
+
+    def __repr__(self):
+        return 'StepResult(%s %s, %.3fs, error=%r, skipped=%r)' % (
+            self.entity_type, '/'.join(self.path), self.seconds, self.error, self.skipped)
+
+
+class RunReport(object):
+    """
+    The step results and timings of a PlanRunner run.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.started = time.time()
+        self.seconds = 0.0
+
+    @property
+    def failures(self):
+        return [step for step in self.steps if step.error is not None]
+
+    @property
+    def skipped(self):
+        return [step for step in self.steps if step.skipped]
+
+    @property
+    def ok(self):
+        return not self.failures and not self.skipped
+
+    def summary(self, slowest=5):
+        """
+        :param slowest: the number of slowest steps to list
+        :return: a human readable timing summary
+        """
+        lines = ['%d steps in %.2fs (%d failed, %d skipped)' % (
+            len(self.steps), self.seconds, len(self.failures), len(self.skipped))]
+        for entity_type in ENTITY_TYPES:
+            steps = [step for step in self.steps if step.entity_type == entity_type and not step.skipped]
+            if steps:
+                total = sum(step.seconds for step in steps)
+                lines.append('  %-12s %5d  total %8.2fs  mean %6.3fs  max %6.3fs' % (
+                    entity_type, len(steps), total, total / len(steps), max(step.seconds for step in steps)))
+        timed = sorted((step for step in self.steps if not step.skipped), key=lambda step: -step.seconds)
+        if timed[:slowest]:
+            lines.append('slowest:')
+            for step in timed[:slowest]:
+                lines.append('  %6.3fs  %s %s' % (step.seconds, step.entity_type, '/'.join(step.path)))
+        for step in self.failures:
+            lines.append('FAILED %s %s: %s' % (step.entity_type, '/'.join(step.path), step.error))
+        return '\n'.join(lines)
+
+
+class PlanRunner(object):
+    """
+    Syncs or cleans a ModelPlan through a SyncManager using a thread pool.
+    Entities are processed in dependency order: datasets and datastores
+    first, then subscriptions and workflows, then actions and triggers.
+    Everything within a stage runs concurrently, and the children of an
+    entity that failed are skipped.
+    """
+
+    def __init__(self, sync_manager, plan, workers=8, progress=None):
+        """
+        :param sync_manager: the SyncManager
+        :param plan: the ModelPlan
+        :param workers: the maximum number of concurrent requests
+        :param progress: an optional function with a signature
+            (step_result, completed, total) called as each step finishes
+        """
+        self.sync_manager = sync_manager
+        self.plan = plan
+        self.workers = workers
+        self.progress = progress
+        self._lock = threading.Lock()
+
+    def _run_stage(self, executor, report, tasks, total):
+        """
+        :param tasks: a list of (entity_type, path, parent_ok, function)
+        :return: a dictionary of (entity_type,) + path => the function's result,
+            for the steps whose children may run
+        """
+        def run(entity_type, path, fn):
+            started = time.time()
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, e
+            if error is None and hasattr(type(result), 'step_error'):
+                # a FanOutSyncManager result that failed on some targets
+                error = result.step_error()
+            return result, StepResult(entity_type, path, time.time() - started, error=error)
+
+        futures, results = [], {}
+        for entity_type, path, parent_ok, fn in tasks:
+            if parent_ok:
+                futures.append(executor.submit(run, entity_type, path, fn))
+            else:
+                self._record(report, StepResult(entity_type, path, 0.0, skipped=True), total)
+        for future in as_completed(futures):
+            result, step = future.result()
+            # the targets of a fan-out where the step succeeded still sync its children
+            if step.ok or getattr(result, 'succeeded', None):
+                results[(step.entity_type,) + step.path] = result
+            self._record(report, step, total)
+        return results
+
+    def _record(self, report, step, total):
+        with self._lock:
+            report.steps.append(step)
+            completed = len(report.steps)
+        if self.progress:
+            self.progress(step, completed, total)
+
+    def sync(self):
+        """
+        Create or update every entity in the plan.
+
+        :return: the RunReport
+        """
+        sm = self.sync_manager
+        plan = self.plan
+        report = RunReport()
+        total = self.plan.count()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            def sync_dataset(dataset):
+                # read the columns in the step, so that a missing CSV file fails only this dataset
+                return sm.sync_dataset(dataset['name'], data_callback(dataset), columns=plan.columns(dataset))
+
+            stage = []
+            for dataset in plan.datasets:
+                stage.append(('dataset', (dataset['name'],), True, _bind(sync_dataset, dataset)))
+            for datastore in plan.datastores:
+                stage.append(('datastore', (datastore['name'],), True, _bind(
+                    sm.sync_datastore, datastore['name'], datastore.get('state', 'ACTIVE'), data_callback(datastore))))
+            parents = self._run_stage(executor, report, stage, total)
+
+            stage = []
+            for dataset in plan.datasets:
+                synced = parents.get(('dataset', dataset['name']))
+                for subscription in dataset.get('subscriptions') or []:
+                    stage.append(('subscription', (dataset['name'], subscription['name']), synced is not None, _bind(
+                        sm.sync_subscription, subscription['name'], synced, data_callback(subscription))))
+            for datastore in plan.datastores:
+                synced = parents.get(('datastore', datastore['name']))
+                for workflow in datastore.get('workflows') or []:
+                    stage.append(('workflow', (datastore['name'], workflow['name']), synced is not None, _bind(
+                        sm.sync_workflow, workflow['name'], synced, data_callback(workflow))))
+            children = self._run_stage(executor, report, stage, total)
+
+            datasets = dict((key[1], entity) for (key, entity) in parents.items() if key[0] == 'dataset')
+            subscriptions = dict((key[2], entity) for (key, entity) in children.items() if key[0] == 'subscription')
+            stage = []
+            for datastore in plan.datastores:
+                for workflow in datastore.get('workflows') or []:
+                    path = (datastore['name'], workflow['name'])
+                    synced = children.get(('workflow',) + path)
+                    for action in workflow.get('actions') or []:
+                        dataset, subscription, ok = _references(action, datasets, subscriptions, synced)
+                        stage.append(('action', path + (action['name'],), ok, _bind(
+                            sm.sync_action, action['name'], synced, data_callback(action), dataset=dataset,
+                            subscription=subscription, action_state=action.get('state'))))
+                    for trigger in workflow.get('triggers') or []:
+                        dataset, subscription, ok = _references(trigger, datasets, subscriptions, synced)
+                        stage.append(('trigger', path + (trigger['name'],), ok, _bind(
+                            sm.sync_trigger, trigger['name'], synced, data_callback(trigger),
+                            subscription=subscription)))
+            self._run_stage(executor, report, stage, total)
+
+        report.seconds = time.time() - report.started
+        return report
+
+    def clean(self):
+        """
+        Delete every datastore and dataset in the plan along with their
+        children. Datastores are deleted first, so that no action or trigger
+        still refers to a dataset or subscription when it is deleted; a
+        dataset referred to by a datastore that could not be deleted is
+        skipped.
+
+        :return: the RunReport
+        """
+        sm = self.sync_manager
+        plan = self.plan
+        report = RunReport()
+        total = len(plan.datastores) + len(plan.datasets)
+
+        def clean_datastore(datastore):
+            sm.clean_datastore(sm.find_datastore(datastore['name'], datastore.get('state', 'ACTIVE')))
+
+        def clean_dataset(dataset):
+            sm.clean_dataset(sm.find_dataset(dataset['name']))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            cleaned = self._run_stage(executor, report, [
+                ('datastore', (datastore['name'],), True, _bind(clean_datastore, datastore))
+                for datastore in plan.datastores
+            ], total)
+
+            owners = dict((subscription['name'], dataset['name'])
+                          for dataset in plan.datasets for subscription in dataset.get('subscriptions') or [])
+            still_referenced = set()
+            for datastore in plan.datastores:
+                if ('datastore', datastore['name']) in cleaned:
+                    continue
+                for workflow in datastore.get('workflows') or []:
+                    for child in (workflow.get('actions') or []) + (workflow.get('triggers') or []):
+                        still_referenced.add(child.get('dataset'))
+                        still_referenced.add(owners.get(child.get('subscription')))
+            self._run_stage(executor, report, [
+                ('dataset', (dataset['name'],), dataset['name'] not in still_referenced,
+                 _bind(clean_dataset, dataset))
+                for dataset in plan.datasets
+            ], total)
+
+        report.seconds = time.time() - report.started
+        return report
+
+
+def _require_name(entity_type, description):
+    if not isinstance(description, dict) or not description.get('name'):
+        raise ValueError('Every %s needs a name: %r' % (entity_type, description))
+
+
+def _bind(fn, *args, **kwargs):
+    return lambda: fn(*args, **kwargs)
+
+
+def _references(description, datasets, subscriptions, workflow):
+    dataset = datasets.get(description['dataset']) if description.get('dataset') else None
+    subscription = subscriptions.get(description['subscription']) if description.get('subscription') else None
+    ok = workflow is not None and \
+        (dataset is not None or not description.get('dataset')) and \
+        (subscription is not None or not description.get('subscription'))
+    return dataset, subscription, ok
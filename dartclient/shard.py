@@ -0,0 +1,257 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import heapq
+import multiprocessing
+import time
+
+from dartclient.core import create_client, create_sync_manager
+from dartclient.plan import ModelPlan, PlanRunner, RunReport
+
+
+class ShardStepError(Exception):
+    """
+    The error of a step that failed in a worker process, carrying the
+    original exception's type name and message.
+    """
+
+
+class SharedRateLimiter(object):
+    """
+    A token bucket kept in shared memory, so that every process of a
+    ShardedPlanRunner draws from one request-rate budget. Create it before
+    the processes that share it; it is passed to them when they start.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: the number of requests per second for all processes
+        :param burst: the number of requests that may be sent at once after
+            an idle period, by default a tenth of a second's worth (at least 1)
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate / 10.0)
+        # tokens, time of the last refill, requests acquired, seconds waited
+        self._state = multiprocessing.Array('d', [self.burst, time.time(), 0.0, 0.0])
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        state = self._state
+        waited = 0.0
+        while True:
+            with state.get_lock():
+                now = time.time()
+                tokens = min(self.burst, state[0] + max(0.0, now - state[1]) * self.rate)
+                state[1] = now
+                if tokens >= 1.0:
+                    state[0] = tokens - 1.0
+                    state[2] += 1
+                    state[3] += waited
+                    return
+                state[0] = tokens
+                wait = (1.0 - tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def as_dict(self):
+        """
+        :return: the rate, the burst, the number of requests acquired by all
+            processes and the total seconds they waited
+        """
+        with self._state.get_lock():
+            acquired, waited = self._state[2], self._state[3]
+        return {'rate': self.rate, 'burst': self.burst, 'acquired': int(acquired), 'seconds_waited': waited}
+
+
+def partition_plan(plan, shards):
+    """
+    Split a ModelPlan into independent plans of roughly equal size. A
+    datastore is kept with its workflows, actions and triggers, a dataset
+    with its subscriptions, and a datastore whose actions or triggers refer
+    to a dataset or subscription is kept with that dataset, so each plan can
+    be synced on its own.
+
+    :param plan: the ModelPlan
+    :param shards: the maximum number of plans
+    :return: a list of ModelPlans, without empty ones
+    """
+    units = [('datasets', dataset, 1 + len(dataset.get('subscriptions') or [])) for dataset in plan.datasets]
+    dataset_units = dict((dataset['name'], index) for (index, dataset) in enumerate(plan.datasets))
+    subscription_units = dict((subscription['name'], dataset_units[dataset['name']])
+                              for dataset in plan.datasets
+                              for subscription in dataset.get('subscriptions') or [])
+    parents = list(range(len(units) + len(plan.datastores)))
+
+    def root(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for datastore in plan.datastores:
+        index = len(units)
+        size = 1
+        for workflow in datastore.get('workflows') or []:
+            size += 1
+            for child in (workflow.get('actions') or []) + (workflow.get('triggers') or []):
+                size += 1
+                for referenced in (dataset_units.get(child.get('dataset')),
+                                   subscription_units.get(child.get('subscription'))):
+                    if referenced is not None:
+                        parents[root(referenced)] = root(index)
+        units.append(('datastores', datastore, size))
+
+    groups = {}
+    for index in range(len(units)):
+        groups.setdefault(root(index), []).append(index)
+    # the largest groups first, each to the smallest shard so far
+    heap = [(0, shard) for shard in range(max(1, min(shards, len(groups))))]
+    members = dict((shard, []) for (_, shard) in heap)
+    for group in sorted(groups.values(), key=lambda group: -sum(units[index][2] for index in group)):
+        size, shard = heapq.heappop(heap)
+        members[shard].extend(group)
+        heapq.heappush(heap, (size + sum(units[index][2] for index in group), shard))
+
+    plans = []
+    for shard in sorted(members):
+        if not members[shard]:
+            continue
+        description = dict(plan.description, datasets=[], datastores=[])
+        for index in sorted(members[shard]):
+            key, entity, _ = units[index]
+            description[key].append(entity)
+        plans.append(ModelPlan(description, base_path=plan.base_path))
+    return plans
+
+
+class ShardedPlanRunner(object):
+    """
+    Syncs or cleans a ModelPlan with a pool of processes, so that the CPU
+    work of marshalling requests, validating responses and evaluating
+    callbacks for very large models is not limited to one core. The plan is
+    split with partition_plan; each process creates its own client and
+    SyncManager and runs a PlanRunner on one shard at a time. All processes
+    share one request-rate budget, and their step results are merged into a
+    single RunReport.
+
+    Only declarative ModelPlans can be sharded: callbacks written in Python
+    cannot be sent to other processes. A journal cannot be shared by
+    several processes either.
+    """
+
+    def __init__(self, plan, client_kwargs, sync_manager_kwargs=None, processes=None, shards=None, workers=8,
+                 rate=None, burst=None, progress=None):
+        """
+        :param plan: the ModelPlan
+        :param client_kwargs: the keyword arguments of create_client, e.g.
+            {'api_url': ...}, used by every process
+        :param sync_manager_kwargs: the keyword arguments of
+            create_sync_manager other than client, e.g. {'coalesce_reads': True}
+        :param processes: the number of processes, by default one per CPU
+        :param shards: the number of shards, by default two per process so
+            that a large shard does not leave the other processes idle
+        :param workers: the maximum number of concurrent requests per process
+        :param rate: the maximum number of requests per second for all
+            processes together, or None for no limit
+        :param burst: see SharedRateLimiter
+        :param progress: an optional function with a signature
+            (step_result, completed, total), called as each shard's steps
+            are merged
+        """
+        self.sync_manager_kwargs = dict(sync_manager_kwargs or {})
+        if self.sync_manager_kwargs.get('journal') is not None:
+            raise ValueError('A journal cannot be shared by several processes')
+        self.plan = plan
+        self.client_kwargs = dict(client_kwargs)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shards = partition_plan(plan, shards or self.processes * 2)
+        self.workers = workers
+        self.rate_limiter = SharedRateLimiter(rate, burst) if rate else None
+        self.progress = progress
+
+    def sync(self):
+        """
+        Create or update every entity in the plan.
+
+        :return: the merged RunReport
+        """
+        return self._run('sync', self.plan.count())
+
+    def clean(self):
+        """
+        Delete every datastore and dataset in the plan along with their
+        children.
+
+        :return: the merged RunReport
+        """
+        return self._run('clean', len(self.plan.datastores) + len(self.plan.datasets))
+
+    def _run(self, command, total):
+        report = RunReport()
+        if self.shards:
+            pool = multiprocessing.Pool(processes=min(self.processes, len(self.shards)), initializer=_init_worker,
+                                        initargs=(self.client_kwargs, self.sync_manager_kwargs, self.rate_limiter))
+            try:
+                tasks = [(command, shard.description, shard.base_path, self.workers) for shard in self.shards]
+                for shard_report in pool.imap_unordered(_run_shard, tasks):
+                    for step in shard_report.steps:
+                        report.steps.append(step)
+                        if self.progress:
+                            self.progress(step, len(report.steps), total)
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        report.seconds = time.time() - report.started
+        return report
+
+
+_worker = {}
+
+
+def _init_worker(client_kwargs, sync_manager_kwargs, rate_limiter):
+    # a failing initializer would be restarted forever, so fail the tasks instead
+    try:
+        client = create_client(rate_limiter=rate_limiter, **client_kwargs)
+        _worker['sync_manager'] = create_sync_manager(client=client, **sync_manager_kwargs)
+    except Exception as e:
+        _worker['error'] = '%s: %s' % (type(e).__name__, e)
+
+
+def _run_shard(task):
+    command, description, base_path, workers = task
+    if 'error' in _worker:
+        raise RuntimeError('Could not create the worker\'s client: %s' % (_worker['error'],))
+    runner = PlanRunner(_worker['sync_manager'], ModelPlan(description, base_path=base_path), workers=workers)
+    report = runner.sync() if command == 'sync' else runner.clean()
+    for step in report.steps:
+        # the original exception may not be picklable
+        if step.error is not None:
+            step.error = ShardStepError('%s: %s' % (type(step.error).__name__, step.error))
+    return report
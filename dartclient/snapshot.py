@@ -0,0 +1,334 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import collections
+import datetime
+import gzip
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import six
+
+from dartclient.core import DEFAULT_PAGE_SIZE
+from dartclient.models import ENTITY_TYPES, model_to_dict, strip_server_fields
+
+
+SNAPSHOT_FORMAT = 'dartclient-snapshot'
+SNAPSHOT_VERSION = 1
+
+# Entity types are imported in this order; each stage only depends on the
+# stages before it.
+IMPORT_STAGES = (('datastore', 'dataset'), ('workflow', 'subscription'), ('action', 'trigger'))
+
+
+def entity_parents(entity_type, entity):
+    """
+    Find the entities that an entity refers to.
+
+    :param entity_type: the entity type
+    :param entity: the entity as a dictionary
+    :return: a list of (entity type, id) tuples
+    """
+    data = entity.get('data') or {}
+    args = data.get('args') or {}
+    parents = []
+    if entity_type == 'workflow':
+        parents.append(('datastore', data.get('datastore_id')))
+    elif entity_type == 'action':
+        parents.append(('workflow', data.get('workflow_id')))
+    elif entity_type == 'trigger':
+        parents.extend(('workflow', workflow_id) for workflow_id in data.get('workflow_ids') or [])
+    elif entity_type == 'subscription':
+        parents.append(('dataset', data.get('dataset_id')))
+    if entity_type in ('action', 'trigger'):
+        for parent_type in ('dataset', 'subscription'):
+            if args.get(parent_type + '_id'):
+                parents.append((parent_type, args[parent_type + '_id']))
+    return [(parent_type, parent_id) for (parent_type, parent_id) in parents if parent_id]
+
+
+class SnapshotReport(object):
+    """
+    Counts and timings for a snapshot export or import.
+    """
+
+    def __init__(self):
+        self.counts = dict((entity_type, 0) for entity_type in ENTITY_TYPES)
+        self.skipped = []
+        self.failures = []
+        self.id_map = dict((entity_type, {}) for entity_type in ENTITY_TYPES)
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def __repr__(self):
+        return 'SnapshotReport(total=%d, counts=%r, skipped=%d, failures=%d, bytes=%d, seconds=%.2f)' % (
+            self.total, self.counts, len(self.skipped), len(self.failures), self.bytes, self.seconds)
+
+
+def export_snapshot(sync_manager, path, entity_types=ENTITY_TYPES, filters=None,
+                    page_size=DEFAULT_PAGE_SIZE, workers=8):
+    """
+    Write every entity of the given types to a gzip compressed JSON lines
+    file. The first page of every type is requested, then the remaining
+    pages of each type are requested concurrently once its total is known. At most
+    twice as many pages as workers are requested but not yet written at any
+    time, and pages are written as they arrive, so memory use is bounded by
+    the page size and the number of workers rather than by the size of the
+    deployment.
+
+    Each line after the header is an object with the entity ``type``, its
+    ``id``, its ``parents`` as [type, id] pairs (including the datasets and
+    subscriptions referred to by action and trigger args) and the
+    ``entity`` itself.
+
+    :param sync_manager: the SyncManager to list entities with
+    :param path: the file to write
+    :param entity_types: the entity types to export
+    :param filters: an optional dictionary of entity type => filters, e.g.
+        {'action': {'state': 'TEMPLATE'}} to leave out action instances
+    :param page_size: the number of entities to request per page
+    :param workers: the maximum number of concurrent requests
+    :return: a SnapshotReport
+    """
+    filters = filters or {}
+    report = SnapshotReport()
+    started = time.time()
+
+    def fetch(entity_type, offset):
+        response = sync_manager.list_page(entity_type, offset=offset, limit=page_size,
+                                          **filters.get(entity_type, {}))
+        return entity_type, offset, response
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        with gzip.open(path, 'wb') as f:
+            _write_line(f, {
+                'format': SNAPSHOT_FORMAT,
+                'version': SNAPSHOT_VERSION,
+                'created': datetime.datetime.utcnow().isoformat(),
+                'entity_types': list(entity_types),
+            })
+            # (entity type, offsets) still to be requested, oldest first
+            queued = collections.deque((entity_type, iter([0])) for entity_type in entity_types)
+            pending = set()
+
+            def submit(unwritten=0):
+                while queued and len(pending) + unwritten < 2 * workers:
+                    entity_type, offsets = queued[0]
+                    offset = next(offsets, None)
+                    if offset is None:
+                        queued.popleft()
+                    else:
+                        pending.add(executor.submit(fetch, entity_type, offset))
+
+            submit()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                done = list(done)
+                for index, future in enumerate(done):
+                    entity_type, offset, response = future.result()
+                    if offset == 0 and response.results:
+                        # Step by the size of the first page in case the
+                        # server caps the limit below page_size.
+                        stride = len(response.results)
+                        queued.append((entity_type, iter(six.moves.range(stride, response.total, stride))))
+                    for entity in response.results:
+                        entity = model_to_dict(entity)
+                        _write_line(f, {
+                            'type': entity_type,
+                            'id': entity.get('id'),
+                            'parents': entity_parents(entity_type, entity),
+                            'entity': entity,
+                        })
+                        report.counts[entity_type] += 1
+                    submit(unwritten=len(done) - index - 1)
+
+    report.bytes = os.path.getsize(path)
+    report.seconds = time.time() - started
+    return report
+
+
+def read_snapshot(path, entity_types=None):
+    """
+    Stream the records of a snapshot file.
+
+    :param path: the snapshot file
+    :param entity_types: only yield records of these types
+    :return: a generator of record dictionaries
+    """
+    with gzip.open(path, 'rb') as f:
+        header = json.loads(f.readline().decode('utf-8'))
+        if header.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError('%s is not a dartclient snapshot' % (path,))
+        if header.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version: %s' % (header.get('version'),))
+        for line in f:
+            record = json.loads(line.decode('utf-8'))
+            if entity_types is None or record['type'] in entity_types:
+                yield record
+
+
+def import_snapshot(sync_manager, path, workers=8, batch_size=100):
+    """
+    Re-create the entities in a snapshot. Entities are created in dependency
+    order (datastores and datasets, then workflows and subscriptions, then
+    actions and triggers) with ids and cross references rewritten to the
+    newly created entities. Actions are created in batches per workflow with
+    createWorkflowActions and everything else is created concurrently. The
+    file is streamed once per stage and at most twice as many requests as
+    workers are pending at any time, so only the id mapping and the
+    unfinished action batches are kept in memory.
+
+    The target is expected not to contain the entities yet; existing
+    entities with the same names are not looked up or updated.
+
+    :param sync_manager: the SyncManager to create entities with
+    :param path: the snapshot file
+    :param workers: the maximum number of concurrent requests
+    :param batch_size: the maximum number of actions per createWorkflowActions
+    :return: a SnapshotReport whose id_map maps old ids to new ids per type
+    """
+    report = SnapshotReport()
+    started = time.time()
+    for stage in IMPORT_STAGES:
+        create_records(sync_manager, read_snapshot(path, stage), report, workers=workers, batch_size=batch_size)
+    report.seconds = time.time() - started
+    return report
+
+
+def create_records(sync_manager, records, report, workers=8, batch_size=100):
+    """
+    Create entities from snapshot records whose parents have already been
+    created, rewriting their ids and cross references with report.id_map.
+    Records whose parents are not in the id map are skipped. Actions are
+    created in batches per workflow with createWorkflowActions and
+    everything else is created concurrently, with at most twice as many
+    requests as workers pending at a time.
+
+    :param sync_manager: the SyncManager to create entities with
+    :param records: an iterable of snapshot records
+    :param report: the SnapshotReport to record ids, counts and failures in
+    :param workers: the maximum number of concurrent requests
+    :param batch_size: the maximum number of actions per createWorkflowActions
+    """
+    id_map = report.id_map
+    pending = {}
+    batches = {}
+
+    def collect(futures):
+        for future in futures:
+            entity_type, records = pending.pop(future)
+            try:
+                pairs = future.result()
+            except Exception as e:
+                report.failures.extend((entity_type, record['id'], e) for record in records)
+                continue
+            for old_id, new_id in pairs:
+                id_map[entity_type][old_id] = new_id
+                report.counts[entity_type] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(entity_type, records):
+            if len(pending) >= 2 * workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+            pending[executor.submit(_create, sync_manager, entity_type, records, id_map)] = (entity_type, records)
+
+        for record in records:
+            entity_type = record['type']
+            missing = [parent for parent in record.get('parents') or []
+                       if parent[1] not in id_map[parent[0]]]
+            if missing:
+                report.skipped.append((entity_type, record['id'], missing))
+                continue
+            if entity_type == 'action':
+                workflow_id = record['entity']['data']['workflow_id']
+                batch = batches.setdefault(workflow_id, [])
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    submit(entity_type, batch)
+                    batches[workflow_id] = []
+            else:
+                submit(entity_type, [record])
+        for batch in batches.values():
+            if batch:
+                submit('action', batch)
+        collect(list(pending))
+
+
+def _create(sync_manager, entity_type, records, id_map):
+    bodies = []
+    for record in records:
+        body = strip_server_fields(record['entity'])
+        body['data'] = _remap(entity_type, dict(body.get('data') or {}), id_map)
+        bodies.append(body)
+    names = [item['data'].get('name') for item in bodies]
+    data = bodies[0]['data']
+    if entity_type == 'datastore':
+        response = sync_manager._write('datastore', names, 'Datastore', 'createDatastore', datastore=bodies[0])
+    elif entity_type == 'dataset':
+        response = sync_manager._write('dataset', names, 'Dataset', 'createDataset', dataset=bodies[0])
+    elif entity_type == 'workflow':
+        response = sync_manager._write('workflow', names, 'Datastore', 'createDatastoreWorkflow',
+                                       datastore_id=data['datastore_id'], workflow=bodies[0])
+    elif entity_type == 'subscription':
+        response = sync_manager._write('subscription', names, 'Dataset', 'createDatasetSubscription',
+                                       dataset_id=data['dataset_id'], subscription=bodies[0])
+    elif entity_type == 'trigger':
+        response = sync_manager._write('trigger', names, 'Trigger', 'createTrigger', trigger=bodies[0])
+    else:
+        response = sync_manager._write('action', names, 'Workflow', 'createWorkflowActions',
+                                       workflow_id=data['workflow_id'], actions=bodies)
+    results = response.results if isinstance(response.results, list) else [response.results]
+    return [(record['id'], result.id) for (record, result) in zip(records, results)]
+
+
+def _remap(entity_type, data, id_map):
+    def new_id(parent_type, old_id):
+        return id_map[parent_type].get(old_id, old_id)
+
+    if entity_type == 'workflow' and data.get('datastore_id'):
+        data['datastore_id'] = new_id('datastore', data['datastore_id'])
+    elif entity_type == 'action' and data.get('workflow_id'):
+        data['workflow_id'] = new_id('workflow', data['workflow_id'])
+    elif entity_type == 'trigger' and data.get('workflow_ids'):
+        data['workflow_ids'] = [new_id('workflow', workflow_id) for workflow_id in data['workflow_ids']]
+    elif entity_type == 'subscription' and data.get('dataset_id'):
+        data['dataset_id'] = new_id('dataset', data['dataset_id'])
+    if entity_type in ('action', 'trigger') and data.get('args'):
+        args = dict(data['args'])
+        for parent_type in ('dataset', 'subscription'):
+            if args.get(parent_type + '_id'):
+                args[parent_type + '_id'] = new_id(parent_type, args[parent_type + '_id'])
+        if args.get('completed_workflow_id'):
+            args['completed_workflow_id'] = new_id('workflow', args['completed_workflow_id'])
+        data['args'] = args
+    return data
+
+
+def _write_line(f, record):
+    f.write((json.dumps(record, sort_keys=True) + '\n').encode('utf-8'))
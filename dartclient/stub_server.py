@@ -0,0 +1,495 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import copy
+import datetime
+import itertools
+import json
+import multiprocessing
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib import parse as urlparse
+
+
+# entity type => (Swagger resource and model name, URL path)
+ENTITIES = {
+    'datastore': ('Datastore', 'datastore'),
+    'workflow': ('Workflow', 'workflow'),
+    'action': ('Action', 'action'),
+    'trigger': ('Trigger', 'trigger'),
+    'dataset': ('Dataset', 'dataset'),
+    'subscription': ('Subscription', 'subscription'),
+    'workflow_instance': ('WorkflowInstance', 'workflow/instance'),
+}
+
+_STRING = {'type': 'string'}
+_STRINGS = {'type': 'array', 'items': {'type': 'string'}}
+_OBJECT = {'type': 'object'}
+
+DATA_PROPERTIES = {
+    'name': _STRING,
+    'state': _STRING,
+    'description': _STRING,
+    'tags': _STRINGS,
+    'engine_name': _STRING,
+    'args': _OBJECT,
+    'datastore_id': _STRING,
+    'workflow_id': _STRING,
+    'workflow_ids': _STRINGS,
+    'workflow_instance_id': _STRING,
+    'dataset_id': _STRING,
+    'on_failure_email': _STRINGS,
+    'on_started_email': _STRINGS,
+    'on_success_email': _STRINGS,
+    'columns': {'type': 'array', 'items': _OBJECT},
+    'table_name': _STRING,
+    'location': _STRING,
+    'concurrency': {'type': 'integer'},
+    'data_format': {'$ref': '#/definitions/DataFormat'},
+}
+
+
+def swagger_spec(host, base_path='/api/1'):
+    """
+    Build a Swagger 2.0 specification with the subset of the Dart API that
+    dartclient uses.
+
+    :param host: the host:port of the server
+    :param base_path: the API base path
+    :return: the specification as a dictionary
+    """
+    definitions = {
+        'DataFormat': {'type': 'object', 'properties': {
+            'file_format': _STRING, 'row_format': _STRING, 'delimited_by': _STRING,
+            'num_header_rows': {'type': 'integer'}}},
+        'OkResponse': {'type': 'object', 'properties': {'results': _STRING}},
+    }
+    paths = {}
+
+    def ref(name):
+        return {'$ref': '#/definitions/%s' % (name,)}
+
+    def param(name, location, schema=None):
+        if location == 'body':
+            return {'name': name, 'in': 'body', 'required': True, 'schema': schema}
+        if location == 'path':
+            return {'name': name, 'in': 'path', 'required': True, 'type': 'string'}
+        return {'name': name, 'in': 'query', 'required': False, 'type': schema or 'string'}
+
+    def operation(path, method, tag, operation_id, parameters, response):
+        paths.setdefault(path, {})[method] = {
+            'tags': [tag], 'operationId': operation_id, 'parameters': parameters,
+            'responses': {'200': {'description': 'OK', 'schema': ref(response)}}}
+
+    for entity_type, (name, path) in ENTITIES.items():
+        definitions[name + 'Data'] = {'type': 'object', 'properties': DATA_PROPERTIES}
+        definitions[name] = {'type': 'object', 'properties': {
+            'id': _STRING, 'version_id': {'type': 'integer'}, 'created': _STRING, 'updated': _STRING,
+            'data': ref(name + 'Data')}}
+        definitions[name + 'Response'] = {'type': 'object', 'properties': {'results': ref(name)}}
+        definitions[name + 'sResponse'] = {'type': 'object', 'properties': {
+            'results': {'type': 'array', 'items': ref(name)}, 'total': {'type': 'integer'},
+            'limit': {'type': 'integer'}, 'offset': {'type': 'integer'}}}
+        tag = 'Workflow' if entity_type == 'workflow_instance' else name
+        id_param = param(entity_type + '_id', 'path')
+        item_path = '/%s/{%s_id}' % (path, entity_type)
+        operation('/' + path, 'get', tag, 'list%ss' % (name,),
+                  [param('filters', 'query'), param('limit', 'query', 'integer'), param('offset', 'query', 'integer')],
+                  name + 'sResponse')
+        operation(item_path, 'get', tag, 'get' + name, [id_param], name + 'Response')
+        if entity_type == 'workflow_instance':
+            continue
+        operation(item_path, 'put', tag, 'update' + name, [id_param, param(entity_type, 'body', ref(name))],
+                  name + 'Response')
+        operation(item_path, 'delete', tag, 'delete' + name, [id_param], 'OkResponse')
+        if entity_type in ('datastore', 'trigger', 'dataset'):
+            operation('/' + path, 'post', tag, 'create' + name, [param(entity_type, 'body', ref(name))],
+                      name + 'Response')
+
+    definitions['ActionsResponse'] = {'type': 'object', 'properties': {
+        'results': {'type': 'array', 'items': ref('Action')}}}
+    operation('/datastore/{datastore_id}/workflow', 'post', 'Datastore', 'createDatastoreWorkflow',
+              [param('datastore_id', 'path'), param('workflow', 'body', ref('Workflow'))], 'WorkflowResponse')
+    operation('/workflow/{workflow_id}/action', 'post', 'Workflow', 'createWorkflowActions',
+              [param('workflow_id', 'path'), param('actions', 'body', {'type': 'array', 'items': ref('Action')})],
+              'ActionsResponse')
+    operation('/workflow/{workflow_id}/do-manual-run', 'post', 'Workflow', 'manuallyRunWorkflow',
+              [param('workflow_id', 'path')], 'WorkflowInstanceResponse')
+    operation('/dataset/{dataset_id}/subscription', 'post', 'Dataset', 'createDatasetSubscription',
+              [param('dataset_id', 'path'), param('subscription', 'body', ref('Subscription'))],
+              'SubscriptionResponse')
+    return {
+        'swagger': '2.0',
+        'info': {'title': 'Dart stand-in', 'version': '1'},
+        'host': host,
+        'basePath': base_path,
+        'schemes': ['http'],
+        'consumes': ['application/json'],
+        'produces': ['application/json'],
+        'paths': paths,
+        'definitions': definitions,
+    }
+
+
+class NotFound(Exception):
+    pass
+
+
+class StubStore(object):
+    """
+    The in-memory entities of a StubDartServer, keyed by entity type and id.
+    """
+
+    def __init__(self):
+        self.entities = dict((entity_type, {}) for entity_type in ENTITIES)
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def add(self, entity_type, entity, **data):
+        """
+        :param entity_type: the entity type
+        :param entity: the entity as a dictionary; its id and server fields
+            are assigned
+        :param data: fields to set in the entity's data
+        :return: a copy of the stored entity
+        """
+        with self._lock:
+            entity = copy.deepcopy(entity)
+            entity.setdefault('data', {}).update(data)
+            now = _now()
+            entity.update(id='%s-%d' % (entity_type.upper(), next(self._ids)), version_id=1, created=now, updated=now)
+            self.entities[entity_type][entity['id']] = entity
+            return copy.deepcopy(entity)
+
+    def get(self, entity_type, entity_id):
+        with self._lock:
+            if entity_id not in self.entities[entity_type]:
+                raise NotFound('%s %s not found' % (entity_type, entity_id))
+            return copy.deepcopy(self.entities[entity_type][entity_id])
+
+    def update(self, entity_type, entity_id, entity):
+        with self._lock:
+            current = self.entities[entity_type].get(entity_id)
+            if current is None:
+                raise NotFound('%s %s not found' % (entity_type, entity_id))
+            current = dict(current, data=copy.deepcopy(entity.get('data') or {}),
+                           version_id=current['version_id'] + 1, updated=_now())
+            self.entities[entity_type][entity_id] = current
+            return copy.deepcopy(current)
+
+    def delete(self, entity_type, entity_id):
+        with self._lock:
+            if self.entities[entity_type].pop(entity_id, None) is None:
+                raise NotFound('%s %s not found' % (entity_type, entity_id))
+
+    def list(self, entity_type, filters=None, limit=None, offset=0):
+        expressions = json.loads(filters) if filters else []
+        with self._lock:
+            matches = sorted((entity for entity in self.entities[entity_type].values()
+                              if all(_matches(entity, expression) for expression in expressions)),
+                             key=lambda entity: entity['id'])
+            page = matches[offset:offset + limit] if limit is not None else matches[offset:]
+            response = {'results': copy.deepcopy(page), 'total': len(matches), 'offset': offset}
+            if limit is not None:
+                response['limit'] = limit
+            return response
+
+
+def _now():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _matches(entity, expression):
+    field, operator, value = re.match(r'^(\w+) (=|!=|>=|<=|>|<|IN|NOT_IN) (.*)$', expression).groups()
+    actual = entity.get(field) if field in ('id', 'created', 'updated', 'version_id') else entity['data'].get(field)
+    if isinstance(actual, list):
+        found = value in [str(item) for item in actual]
+        return found if operator == '=' else not found
+    actual = '' if actual is None else str(actual)
+    if operator == '=':
+        return actual == value
+    if operator == '!=':
+        return actual != value
+    if operator in ('IN', 'NOT_IN'):
+        return (actual in value.split(',')) == (operator == 'IN')
+    return {'>=': actual >= value, '<=': actual <= value, '>': actual > value, '<': actual < value}[operator]
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self, method):
+        server = self.server.stub
+        url = urlparse.urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+        if url.path == server.base_path + '/swagger.json':
+            return self._send(200, swagger_spec('%s:%d' % self.server.server_address[:2], server.base_path))
+        server.store.count_request()
+        delay = server.latency() if callable(server.latency) else server.latency
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and server.random.random() < server.error_rate:
+            return self._send(503, {'error': 'injected error'})
+        query = dict((key, values[0]) for (key, values) in urlparse.parse_qs(url.query).items())
+        try:
+            status, result = server.route(method, url.path[len(server.base_path):], query, body)
+        except NotFound as e:
+            status, result = 404, {'error': str(e)}
+        self._send(status, result)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        socketserver.ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        # end idle keep-alive connections so that their handler threads exit
+        for request in list(self.connections):
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def handle_error(self, request, client_address):
+        # clients that disconnect, e.g. losing hedged requests, are expected
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+class StubDartServer(object):
+    """
+    A local, in-memory stand-in for the Dart API, for tests, benchmarks and
+    load tests. It serves a Swagger specification at BASE_PATH/swagger.json
+    with the operations that dartclient uses, handles each request on its
+    own thread, and can inject latency and errors.
+
+    Use it as a context manager, or call start and stop::
+
+        with StubDartServer(latency=0.01) as server:
+            client = create_client(api_url=server.api_url)
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None, base_path='/api/1', port=0):
+        """
+        :param latency: the delay in seconds added to each API request, or a
+            function returning one
+        :param error_rate: the fraction of API requests answered with a 503
+        :param seed: the seed for the error injection
+        :param base_path: the API base path
+        :param port: the port to listen on, by default any free port
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.base_path = base_path
+        self.port = port
+        self.store = StubStore()
+        self._server = None
+        self._thread = None
+
+    @property
+    def api_url(self):
+        return 'http://%s:%d%s' % (self._server.server_address[:2] + (self.base_path,))
+
+    def start(self):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', self.port), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='dart-stub-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.close_connections()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def route(self, method, path, query, body):
+        """
+        :return: a tuple of (status code, response body)
+        """
+        store = self.store
+        parts = path.strip('/').split('/')
+        if parts[:2] == ['workflow', 'instance']:
+            parts = ['workflow_instance'] + parts[2:]
+        entity_type = parts[0]
+        if entity_type not in ENTITIES:
+            raise NotFound(path)
+        if len(parts) == 1 and method == 'GET':
+            limit = int(query['limit']) if 'limit' in query else None
+            return 200, store.list(entity_type, query.get('filters'), limit, int(query.get('offset', 0)))
+        if len(parts) == 1 and method == 'POST':
+            return 200, {'results': store.add(entity_type, body)}
+        if len(parts) == 2:
+            if method == 'GET':
+                return 200, {'results': store.get(entity_type, parts[1])}
+            if method == 'PUT':
+                return 200, {'results': store.update(entity_type, parts[1], body)}
+            if method == 'DELETE':
+                store.delete(entity_type, parts[1])
+                return 200, {'results': 'OK'}
+        if len(parts) == 3 and method == 'POST':
+            parent_id, child = parts[1], parts[2]
+            store.get(entity_type, parent_id)
+            if child == 'workflow':
+                return 200, {'results': store.add('workflow', body, datastore_id=parent_id)}
+            if child == 'action':
+                return 200, {'results': [store.add('action', action, workflow_id=parent_id) for action in body]}
+            if child == 'subscription':
+                return 200, {'results': store.add('subscription', body, dataset_id=parent_id)}
+            if child == 'do-manual-run':
+                return 200, {'results': store.add('workflow_instance', {}, workflow_id=parent_id, state='QUEUED')}
+        raise NotFound(path)
+
+
+class ExponentialLatency(object):
+    """
+    A latency function for StubDartServer: exponentially distributed delays,
+    so that a few requests are much slower than the mean, as with a real
+    server under load. Unlike a lambda, it can be passed to another process.
+    """
+
+    def __init__(self, mean, seed=None):
+        """
+        :param mean: the mean delay in seconds
+        :param seed: the seed of the delays
+        """
+        self.mean = mean
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            return self.random.expovariate(1.0 / self.mean) if self.mean > 0 else 0.0
+
+    def __getstate__(self):
+        return {'mean': self.mean, 'random': self.random}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock())
+
+
+class StubDartServerProcess(object):
+    """
+    Runs a StubDartServer in a child process, so that the server does not
+    compete for the GIL and CPU time of the process whose clients are being
+    measured. Its store is not accessible from the parent process.
+
+    Use it as a context manager, or call start and stop::
+
+        with StubDartServerProcess(latency=0.01, error_rate=0.001) as server:
+            client = create_client(api_url=server.api_url)
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: the keyword arguments of StubDartServer
+        """
+        self.kwargs = kwargs
+        self.api_url = None
+        self._process = None
+        self._stop = None
+
+    def start(self):
+        urls = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(target=_serve, args=(self.kwargs, urls, self._stop),
+                                                name='dart-stub-server')
+        self._process.daemon = True
+        self._process.start()
+        self.api_url = urls.get(timeout=60)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _serve(kwargs, urls, stop):
+    with StubDartServer(**kwargs) as server:
+        urls.put(server.api_url)
+        stop.wait()
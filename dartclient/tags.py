@@ -0,0 +1,135 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
+
+from dartclient.http_client import DartRequestsClient
+from dartclient.models import ENTITY_TYPES
+
+
+DELETE_OPERATIONS = {
+    'datastore': ('Datastore', 'deleteDatastore'),
+    'workflow': ('Workflow', 'deleteWorkflow'),
+    'action': ('Action', 'deleteAction'),
+    'trigger': ('Trigger', 'deleteTrigger'),
+    'dataset': ('Dataset', 'deleteDataset'),
+    'subscription': ('Subscription', 'deleteSubscription'),
+}
+
+# The order in which entity types are deleted: an entity is deleted before
+# whatever it references. The types within a stage do not reference each
+# other and are deleted together.
+CLEAN_ORDER = (
+    ('trigger',),
+    ('action', 'subscription'),
+    ('workflow', 'dataset'),
+    ('datastore',),
+)
+
+
+class CleanReport(object):
+    """
+    What clean_by_tag deleted, and the deletes that failed as a list of
+    (entity type, entity id, error) tuples.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.deleted = dict((entity_type, 0) for entity_type in ENTITY_TYPES)
+        self.failures = []
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    def __repr__(self):
+        return 'CleanReport(%s, deleted=%d, failures=%d, seconds=%.2f)' % (
+            self.tag, sum(self.deleted.values()), len(self.failures), self.seconds)
+
+
+def find_by_tag(sync_manager, tag, entity_types=ENTITY_TYPES, page_size=None, workers=6):
+    """
+    Find the entities of several types that have a tag, listing the types
+    concurrently, one page at a time.
+
+    :param sync_manager: the SyncManager
+    :param tag: the tag
+    :param entity_types: the entity types to search
+    :param page_size: the number of entities to request per page, by
+        default chosen by SyncManager.iter_entities
+    :param workers: the maximum number of concurrent requests
+    :return: a dictionary of entity type => list of entities
+    """
+    def find_type(entity_type):
+        return list(sync_manager.iter_entities(entity_type, page_size=page_size, tags=tag))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = dict((entity_type, executor.submit(find_type, entity_type)) for entity_type in entity_types)
+        return dict((entity_type, future.result()) for (entity_type, future) in futures.items())
+
+
+def clean_by_tag(sync_manager, tag, entity_types=ENTITY_TYPES, workers=8, progress=None):
+    """
+    Delete every entity of the given types that has a tag, e.g. everything
+    a CI run created. Entities are deleted in CLEAN_ORDER, each stage with a
+    pool of concurrent deletes, so nothing is deleted while a tagged entity
+    still references it. Entities that are not tagged are left alone, so a
+    tagged workflow with untagged actions may fail to delete.
+
+    :param sync_manager: the SyncManager
+    :param tag: the tag
+    :param entity_types: the entity types to clean
+    :param workers: the maximum number of concurrent requests
+    :param progress: an optional function with a signature
+        (entity_type, entity, error) => None, called after each delete
+    :return: the CleanReport
+    """
+    start = time.time()
+    report = CleanReport(tag)
+    found = find_by_tag(sync_manager, tag, entity_types, workers=workers)
+    http_client = getattr(getattr(sync_manager.client, 'swagger_spec', None), 'http_client', None)
+    if isinstance(http_client, DartRequestsClient):
+        http_client.ensure_pool_size(workers)
+
+    def delete(entity_type, entity):
+        resource_name, operation_id = DELETE_OPERATIONS[entity_type]
+        sync_manager._write(entity_type, [entity.data.name], resource_name, operation_id,
+                            **{entity_type + '_id': entity.id})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for stage in CLEAN_ORDER:
+            futures = dict((executor.submit(delete, entity_type, entity), (entity_type, entity))
+                           for entity_type in stage for entity in found.get(entity_type, ()))
+            for future in as_completed(futures):
+                entity_type, entity = futures[future]
+                error = future.exception()
+                if error is None:
+                    report.deleted[entity_type] += 1
+                else:
+                    report.failures.append((entity_type, entity.id, error))
+                if progress:
+                    progress(entity_type, entity, error)
+    report.seconds = time.time() - start
+    return report
@@ -0,0 +1,201 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import contextlib
+import functools
+import inspect
+
+import six
+
+try:
+    from opentelemetry import context as otel_context, trace as otel_trace
+except ImportError:
+    otel_context = otel_trace = None
+
+
+TRACER_NAME = 'dartclient'
+
+_tracer = None
+
+
+class NoOpSpan(object):
+    """
+    Stands in for a span when tracing is disabled.
+    """
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+
+NOOP_SPAN = NoOpSpan()
+
+
+def set_tracer(tracer):
+    """
+    Use a specific tracer instead of the OpenTelemetry global tracer
+    provider's, e.g. in tests. Any object with an OpenTelemetry compatible
+    start_as_current_span(name, attributes=...) method works.
+
+    :param tracer: the tracer, or None to go back to the default
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    """
+    :return: the tracer set with set_tracer, else the OpenTelemetry tracer
+        if opentelemetry-api is installed, else None
+    """
+    if _tracer is not None:
+        return _tracer
+    if otel_trace is not None:
+        return otel_trace.get_tracer(TRACER_NAME)
+    return None
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Open a span as a child of the current span. Attributes whose value is
+    None are left out. Without a tracer this is a no-op.
+
+    :param name: the span name
+    :param attributes: the span attributes
+    :return: a context manager yielding the span
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+    attributes = dict((key, value) for (key, value) in attributes.items() if value is not None)
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def capture_context():
+    """
+    Capture the current span context so that work handed to another thread
+    can be traced as its child, see attach_context. A tracer set with
+    set_tracer may manage its own context by providing
+    get_current_context() and attach_context(context) methods; otherwise
+    the OpenTelemetry context is used.
+
+    :return: the context, or None without a tracer
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return None
+    if hasattr(tracer, 'get_current_context'):
+        return tracer.get_current_context()
+    if otel_context is not None:
+        return otel_context.get_current()
+    return None
+
+
+@contextlib.contextmanager
+def attach_context(context):
+    """
+    Make a context captured with capture_context, usually in another
+    thread, the current one for the duration of the block.
+
+    :param context: the captured context, or None
+    :return: a context manager
+    """
+    tracer = get_tracer()
+    if context is None or tracer is None:
+        yield
+    elif hasattr(tracer, 'attach_context'):
+        with tracer.attach_context(context):
+            yield
+    elif otel_context is not None:
+        token = otel_context.attach(context)
+        try:
+            yield
+        finally:
+            otel_context.detach(token)
+    else:
+        yield
+
+
+def traced(entity_type):
+    """
+    Decorate a SyncManager method so that each call opens a span named after
+    the method, tagged with the entity type and the entity name (the
+    <entity_type>_name argument, or the data.name of the <entity_type>
+    argument), or with the tag of find_by_tag and clean_by_tag.
+
+    :param entity_type: the entity type, e.g. 'workflow', or None
+    :return: the decorator
+    """
+    def decorator(fn):
+        name = 'dartclient.SyncManager.' + fn.__name__
+        # the arguments are read from the undecorated method, e.g. under _journaled
+        undecorated = fn
+        while hasattr(undecorated, '__wrapped__'):
+            undecorated = undecorated.__wrapped__
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if get_tracer() is None:
+                return fn(self, *args, **kwargs)
+            call_args = inspect.getcallargs(undecorated, self, *args, **kwargs)
+            entity_name = None
+            if entity_type is not None:
+                entity_name = call_args.get(entity_type + '_name', call_args.get(entity_type))
+            if entity_name is not None and not isinstance(entity_name, six.string_types):
+                entity_name = getattr(getattr(entity_name, 'data', None), 'name', None)
+            with span(name, **{'dart.entity_type': entity_type, 'dart.entity_name': entity_name,
+                               'dart.tag': call_args.get('tag')}):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable_file_export(path):
+    """
+    Export every span as JSON to a local file, for looking at a sync run
+    without a tracing backend. Requires opentelemetry-sdk.
+
+    :param path: the file to append the spans to
+    :return: the TracerProvider; its shutdown() closes the file, and it
+        shuts down at exit
+    """
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+
+    out = open(path, 'a')
+
+    class FileSpanExporter(ConsoleSpanExporter):
+
+        def shutdown(self):
+            super(FileSpanExporter, self).shutdown()
+            out.close()
+
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(FileSpanExporter(out=out)))
+    otel_trace.set_tracer_provider(provider)
+    return provider
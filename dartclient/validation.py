@@ -0,0 +1,207 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import random
+import re
+import threading
+import time
+
+import bravado.client
+import bravado.http_future
+import bravado_core.param
+import bravado_core.response
+from bravado_core.param import get_param_type_spec
+from bravado_core.swagger20_validator import get_validator_type
+from bravado_core.validate import validate_schema_object
+
+
+FULL = 'full'
+SKIP = 'skip'
+
+_OPERATION_KIND = re.compile(r'^[a-z]*')
+
+_context = threading.local()
+_install_lock = threading.Lock()
+_installed = []
+
+
+class ValidationPolicy(object):
+    """
+    Controls how requests and responses are validated against the Swagger
+    specification, operation by operation. bravado builds a new validator
+    and resolves every $ref of the schema each time it validates a value;
+    a policy instead compiles one validator per schema, with the references
+    inlined, when it is attached to a client, and can skip validation, or
+    validate a random sample of the calls, for operations where the cost is
+    not worth it, such as large list responses.
+
+    Policies are looked up by operation id (e.g. 'listActions'), then by
+    operation kind (its leading verb, e.g. 'list'), then default. A policy
+    is FULL, SKIP or the fraction of calls to validate.
+    """
+
+    def __init__(self, policies=None, default=FULL, seed=None):
+        """
+        :param policies: a dictionary of operation id or kind => FULL, SKIP
+            or a sample rate between 0 and 1, e.g. {'list': 0.01}
+        :param default: the policy of the other operations
+        :param seed: the seed for sampling
+        """
+        self.policies = dict(policies or {})
+        self.default = default
+        self.random = random.Random(seed)
+        self._validators = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def policy(self, operation_id):
+        """
+        :param operation_id: the operation id, or None if unknown
+        :return: FULL, SKIP or a sample rate
+        """
+        policies = self.policies
+        if operation_id in policies:
+            return policies[operation_id]
+        kind = _OPERATION_KIND.match(operation_id or '').group(0)
+        return policies.get(kind, self.default)
+
+    def attach(self, client):
+        """
+        Validate the client's requests and responses with this policy, and
+        compile the validators of all its operations.
+
+        :param client: a bravado SwaggerClient
+        :return: the client
+        """
+        install()
+        swagger_spec = client.swagger_spec
+        deref = swagger_spec.deref
+        for resource in swagger_spec.resources.values():
+            for operation in resource.operations.values():
+                for param in operation.params.values():
+                    self.validator(swagger_spec, deref(get_param_type_spec(param)))
+                for response in (deref(operation.op_spec.get('responses')) or {}).values():
+                    response = deref(response)
+                    if 'schema' in response:
+                        self.validator(swagger_spec, deref(response['schema']))
+        swagger_spec.validation_policy = self
+        return client
+
+    def validator(self, swagger_spec, schema):
+        """
+        :param swagger_spec: the bravado_core Spec
+        :param schema: a dereferenced schema object of the spec
+        :return: the compiled validator of the schema
+        """
+        entry = self._validators.get(id(schema))
+        if entry is None:
+            validator = get_validator_type(swagger_spec)(
+                _inline(swagger_spec, schema, ()), format_checker=swagger_spec.format_checker,
+                resolver=swagger_spec.resolver)
+            # the schema is kept so that its id cannot be reused
+            entry = self._validators[id(schema)] = (schema, validator)
+        return entry[1]
+
+    def validate(self, swagger_spec, operation_id, schema, value):
+        """
+        Validate a request parameter or response body according to the
+        operation's policy.
+
+        :raises jsonschema.ValidationError: if the value is invalid
+        """
+        policy = self.policy(operation_id)
+        if policy == SKIP or (policy != FULL and self.random.random() >= policy):
+            self._record(operation_id, False, 0.0)
+            return
+        start = time.time()
+        if swagger_spec.deref(schema.get('type')) != 'file':
+            self.validator(swagger_spec, schema).validate(value)
+        self._record(operation_id, True, time.time() - start)
+
+    def _record(self, operation_id, validated, seconds):
+        with self._lock:
+            stats = self._stats.get(operation_id)
+            if stats is None:
+                stats = self._stats[operation_id] = {'validated': 0, 'skipped': 0, 'seconds': 0.0}
+            stats['validated' if validated else 'skipped'] += 1
+            stats['seconds'] += seconds
+
+    def as_dict(self):
+        """
+        :return: a dictionary of operation id => the number of values
+            validated and skipped and the seconds spent validating
+        """
+        with self._lock:
+            return dict((operation_id, dict(stats)) for (operation_id, stats) in self._stats.items())
+
+
+def _inline(swagger_spec, schema, refs):
+    """
+    :return: a copy of the schema with its references replaced by what they
+        point to, except references back to a schema being inlined
+    """
+    if isinstance(schema, dict):
+        ref = schema.get('$ref')
+        if ref is not None:
+            if ref in refs:
+                return schema
+            return _inline(swagger_spec, swagger_spec.deref(schema), refs + (ref,))
+        return dict((key, _inline(swagger_spec, value, refs)) for (key, value) in schema.items())
+    if isinstance(schema, list):
+        return [_inline(swagger_spec, item, refs) for item in schema]
+    return schema
+
+
+def _validate_schema_object(swagger_spec, schema_object_spec, value):
+    policy = getattr(swagger_spec, 'validation_policy', None)
+    if policy is None:
+        return validate_schema_object(swagger_spec, schema_object_spec, value)
+    policy.validate(swagger_spec, getattr(_context, 'operation_id', None), swagger_spec.deref(schema_object_spec), value)
+
+
+def _with_operation(fn, get_operation):
+    def wrapper(*args, **kwargs):
+        previous = getattr(_context, 'operation_id', None)
+        _context.operation_id = getattr(get_operation(*args), 'operation_id', None)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _context.operation_id = previous
+    return wrapper
+
+
+def install():
+    """
+    Route bravado's request and response validation through the policy
+    attached to each client's spec. Like install_request_codec this patches
+    bravado process-wide; clients without a policy are validated as before.
+    """
+    with _install_lock:
+        if _installed:
+            return
+        bravado_core.param.validate_schema_object = _validate_schema_object
+        bravado_core.response.validate_schema_object = _validate_schema_object
+        bravado.client.marshal_param = _with_operation(bravado.client.marshal_param, lambda param, *args: param.op)
+        bravado.http_future.unmarshal_response = _with_operation(
+            bravado.http_future.unmarshal_response, lambda response, operation, *args: operation)
+        _installed.append(True)
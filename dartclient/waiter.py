@@ -0,0 +1,219 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 RetailMeNot, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import threading
+import time
+
+from concurrent.futures import Future
+
+from dartclient.core import LIST_OPERATIONS
+
+
+TERMINAL_STATES = {
+    'action': ('COMPLETED', 'FAILED', 'SKIPPED'),
+    'workflow_instance': ('COMPLETED', 'FAILED'),
+}
+
+
+class EntityNotFound(Exception):
+    """
+    Raised from a watched entity's future when Dart no longer returns it,
+    e.g. because it was deleted while it was being watched.
+    """
+
+
+class AdaptiveInterval(object):
+    """
+    The delay between poll rounds: it returns to the initial interval
+    whenever a round observes progress and grows geometrically, up to the
+    maximum, while nothing changes.
+    """
+
+    def __init__(self, initial=1.0, maximum=30.0, multiplier=1.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.current = initial
+
+    def reset(self):
+        self.current = self.initial
+        return self.current
+
+    def next(self, progressed):
+        """
+        :param progressed: whether the last round observed a state change
+        :return: the delay before the next round, in seconds
+        """
+        if progressed:
+            return self.reset()
+        self.current = min(self.current * self.multiplier, self.maximum)
+        return self.current
+
+
+class Waiter(object):
+    """
+    Waits for many actions and workflow instances at once. Each poll round
+    fetches every watched entity of a type with a single filtered list call
+    (per batch_size entities) instead of one request per entity, and the
+    delay between rounds adapts to how quickly the states are changing.
+
+    Watching an entity returns a concurrent.futures.Future that resolves to
+    the entity once it reaches one of its TERMINAL_STATES. A FAILED entity
+    is a result, not an exception; check entity.data.state.
+    """
+
+    def __init__(self, sync_manager, initial_interval=1.0, max_interval=30.0, multiplier=1.5, batch_size=100,
+                 sleep=time.sleep, clock=time.time):
+        """
+        :param sync_manager: the SyncManager used to make the list calls
+        :param initial_interval: the delay after a round that observed
+            progress, in seconds
+        :param max_interval: the longest delay between rounds, in seconds
+        :param multiplier: how much the delay grows after each idle round
+        :param batch_size: the maximum number of ids in one list call
+        :param sleep: the function used to wait between rounds
+        :param clock: the function used to measure timeouts
+        """
+        self.sync_manager = sync_manager
+        self.interval = AdaptiveInterval(initial_interval, max_interval, multiplier)
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.clock = clock
+        self.polls = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._watched = dict((entity_type, {}) for entity_type in TERMINAL_STATES)
+        self._states = {}
+
+    def watch(self, entity_type, entity_id, callback=None):
+        """
+        Start watching an entity. Watching an entity that is already watched
+        returns the existing future.
+
+        :param entity_type: 'action' or 'workflow_instance'
+        :param entity_id: the entity id
+        :param callback: an optional function with a signature (entity) => None,
+            called once the entity reaches a terminal state
+        :return: a Future that resolves to the entity
+        """
+        with self._lock:
+            future = self._watched[entity_type].get(entity_id)
+            if future is None:
+                future = self._watched[entity_type][entity_id] = Future()
+        if callback is not None:
+            future.add_done_callback(_on_resolved(callback))
+        return future
+
+    def watch_action(self, action_id, callback=None):
+        return self.watch('action', action_id, callback)
+
+    def watch_workflow_instance(self, workflow_instance_id, callback=None):
+        return self.watch('workflow_instance', workflow_instance_id, callback)
+
+    @property
+    def pending(self):
+        """
+        :return: the number of watched entities that are not yet resolved
+        """
+        with self._lock:
+            return sum(len(watched) for watched in self._watched.values())
+
+    def poll(self):
+        """
+        Run a single poll round, resolving the futures of every entity that
+        has reached a terminal state.
+
+        :return: True if any watched entity changed state
+        """
+        self.polls += 1
+        progressed = False
+        for entity_type, terminal_states in TERMINAL_STATES.items():
+            with self._lock:
+                watched = self._watched[entity_type]
+                for entity_id in [entity_id for (entity_id, future) in watched.items() if future.cancelled()]:
+                    del watched[entity_id]
+                ids = sorted(watched)
+            for start in range(0, len(ids), self.batch_size):
+                batch = ids[start:start + self.batch_size]
+                found = self._fetch(entity_type, batch)
+                for entity_id in batch:
+                    entity = found.get(entity_id)
+                    state = entity.data.state if entity is not None else None
+                    if self._states.get((entity_type, entity_id)) != state:
+                        self._states[(entity_type, entity_id)] = state
+                        progressed = True
+                    if entity is None:
+                        self._resolve(entity_type, entity_id, exception=EntityNotFound(
+                            'The %s %s was not found' % (entity_type, entity_id)))
+                    elif state in terminal_states:
+                        self._resolve(entity_type, entity_id, result=entity)
+        return progressed
+
+    def _fetch(self, entity_type, ids):
+        resource_name, operation_id = LIST_OPERATIONS[entity_type]
+        self.requests += 1
+        response = self.sync_manager._read(resource_name, operation_id, offset=0, limit=len(ids),
+                                           filters=json.dumps(['id IN %s' % (','.join(ids),)]))
+        return dict((entity.id, entity) for entity in response.results or [])
+
+    def _resolve(self, entity_type, entity_id, result=None, exception=None):
+        with self._lock:
+            future = self._watched[entity_type].pop(entity_id, None)
+            self._states.pop((entity_type, entity_id), None)
+        if future is None or future.cancelled():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def wait(self, timeout=None):
+        """
+        Poll until every watched entity is resolved or the timeout expires.
+        The first round starts immediately.
+
+        :param timeout: the maximum time to wait in seconds, or None to wait
+            indefinitely
+        :return: True if every watched entity was resolved
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        self.interval.reset()
+        while True:
+            progressed = self.poll()
+            if not self.pending:
+                return True
+            delay = self.interval.next(progressed)
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            self.sleep(delay)
+
+
+def _on_resolved(callback):
+    def done(future):
+        if not future.cancelled() and future.exception() is None:
+            callback(future.result())
+    return done
@@ -36,6 +36,18 @@ setup(
     zip_safe=False,
     install_requires=[
         'bravado>=8.3.0',
-        'bravado_core>=4.3.2'
-    ]
+        'bravado_core>=4.3.2',
+        'futures>=3.0.5; python_version < "3"',
+        'PyYAML>=3.11',
+        'six>=1.10.0'
+    ],
+    extras_require={
+        # opentelemetry-api only supports Python 3; without it tracing is a no-op
+        'tracing': ['opentelemetry-api; python_version >= "3"']
+    },
+    entry_points={
+        'console_scripts': [
+            'dartclient = dartclient.cli:main'
+        ]
+    }
 )
@@ -0,0 +1,269 @@
+"""
+An in-memory stand-in for the bravado client of a Dart server, for testing
+SyncManager and the modules built on it without a network connection.
+"""
+import copy
+import itertools
+import json
+import threading
+
+
+class FakeModel(object):
+    """
+    Behaves enough like a bravado model: attributes are the fields, unset
+    fields read as None and dir() lists the fields.
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__['_additional_props'] = []
+        self.__dict__.update(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return None
+
+    def __dir__(self):
+        return sorted(key for key in self.__dict__ if not key.startswith('_'))
+
+    def __eq__(self, other):
+        return isinstance(other, FakeModel) and dir(self) == dir(other) and \
+            all(getattr(self, key) == getattr(other, key) for key in dir(self))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'FakeModel(%s)' % (', '.join('%s=%r' % (key, getattr(self, key)) for key in dir(self)),)
+
+
+def to_model(value):
+    if isinstance(value, FakeModel):
+        value = dict((key, getattr(value, key)) for key in dir(value))
+    model = FakeModel(**value)
+    if isinstance(model.data, (dict, FakeModel)):
+        model.data = to_model(model.data) if isinstance(model.data, dict) else copy.deepcopy(model.data)
+    if model.data is not None and isinstance(model.data.data_format, dict):
+        model.data.data_format = FakeModel(**model.data.data_format)
+    return model
+
+
+class Response(object):
+
+    def __init__(self, results=None, total=None):
+        self.results = results
+        self.total = total
+
+
+class NotFound(Exception):
+
+    status_code = 404
+
+
+class Future(object):
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def result(self, timeout=None):
+        return self.fn()
+
+
+class Resource(object):
+
+    def __init__(self, dart, name):
+        self.dart = dart
+        self.name = name
+
+    def __getattr__(self, operation_id):
+        if not hasattr(self.dart, operation_id):
+            raise AttributeError(operation_id)
+
+        def operation(**kwargs):
+            self.dart.calls.append((operation_id, kwargs))
+            return Future(lambda: getattr(self.dart, operation_id)(**kwargs))
+        return operation
+
+
+class FakeDart(object):
+    """
+    The fake client. Entities are stored per type; every call is recorded
+    in calls as (operation id, kwargs).
+    """
+
+    def __init__(self):
+        self.entities = dict((entity_type, {}) for entity_type in
+                             ('datastore', 'workflow', 'action', 'trigger', 'dataset', 'subscription',
+                              'workflow_instance'))
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name in ('Datastore', 'Workflow', 'Action', 'Trigger', 'Dataset', 'Subscription'):
+            return Resource(self, name)
+        raise AttributeError(name)
+
+    def get_model(self, name):
+        return lambda **kwargs: FakeModel(**kwargs)
+
+    def operation_count(self, operation_id):
+        return len([call for call in self.calls if call[0] == operation_id])
+
+    def add(self, entity_type, entity):
+        with self._lock:
+            entity = to_model(entity)
+            entity.id = entity.id or '%s%d' % (entity_type.upper(), next(self._ids))
+            entity.version_id = 1
+            entity.created = entity.updated = '2016-06-01T00:00:00'
+            self.entities[entity_type][entity.id] = entity
+            return copy.deepcopy(entity)
+
+    def _list(self, entity_type, filters=None, limit=None, offset=0):
+        matches = [entity for entity in self.entities[entity_type].values() if _matches(entity, filters)]
+        matches.sort(key=lambda entity: entity.id)
+        page = matches[offset:offset + limit] if limit is not None else matches[offset:]
+        return Response(results=copy.deepcopy(page), total=len(matches))
+
+    def _get(self, entity_type, entity_id):
+        if entity_id not in self.entities[entity_type]:
+            raise NotFound(entity_id)
+        return Response(results=copy.deepcopy(self.entities[entity_type][entity_id]))
+
+    def _update(self, entity_type, entity_id, entity):
+        entity = to_model(entity)
+        entity.id = entity_id
+        entity.version_id = (self.entities[entity_type][entity_id].version_id or 0) + 1
+        self.entities[entity_type][entity_id] = entity
+        return Response(results=copy.deepcopy(entity))
+
+    def _delete(self, entity_type, entity_id):
+        del self.entities[entity_type][entity_id]
+        return Response()
+
+    def getDatastore(self, datastore_id):
+        return self._get('datastore', datastore_id)
+
+    def getWorkflow(self, workflow_id):
+        return self._get('workflow', workflow_id)
+
+    def getAction(self, action_id):
+        return self._get('action', action_id)
+
+    def getTrigger(self, trigger_id):
+        return self._get('trigger', trigger_id)
+
+    def getDataset(self, dataset_id):
+        return self._get('dataset', dataset_id)
+
+    def getSubscription(self, subscription_id):
+        return self._get('subscription', subscription_id)
+
+    def listDatastores(self, **kwargs):
+        return self._list('datastore', **kwargs)
+
+    def listWorkflows(self, **kwargs):
+        return self._list('workflow', **kwargs)
+
+    def listActions(self, **kwargs):
+        return self._list('action', **kwargs)
+
+    def listTriggers(self, **kwargs):
+        return self._list('trigger', **kwargs)
+
+    def listDatasets(self, **kwargs):
+        return self._list('dataset', **kwargs)
+
+    def listSubscriptions(self, **kwargs):
+        return self._list('subscription', **kwargs)
+
+    def listWorkflowInstances(self, **kwargs):
+        return self._list('workflow_instance', **kwargs)
+
+    def createDatastore(self, datastore):
+        return Response(results=self.add('datastore', datastore))
+
+    def createDataset(self, dataset):
+        return Response(results=self.add('dataset', dataset))
+
+    def createTrigger(self, trigger):
+        return Response(results=self.add('trigger', trigger))
+
+    def createDatastoreWorkflow(self, datastore_id, workflow):
+        workflow = to_model(workflow)
+        workflow.data.datastore_id = datastore_id
+        return Response(results=self.add('workflow', workflow))
+
+    def createDatasetSubscription(self, dataset_id, subscription):
+        subscription = to_model(subscription)
+        subscription.data.dataset_id = dataset_id
+        return Response(results=self.add('subscription', subscription))
+
+    def createWorkflowActions(self, workflow_id, actions):
+        results = []
+        for action in actions:
+            action = to_model(action)
+            action.data.workflow_id = workflow_id
+            results.append(self.add('action', action))
+        return Response(results=results)
+
+    def manuallyRunWorkflow(self, workflow_id, **kwargs):
+        if workflow_id not in self.entities['workflow']:
+            raise KeyError(workflow_id)
+        return Response(results=self.add('workflow_instance', {'data': {
+            'workflow_id': workflow_id, 'state': 'QUEUED'}}))
+
+    def updateDatastore(self, datastore_id, datastore):
+        return self._update('datastore', datastore_id, datastore)
+
+    def updateWorkflow(self, workflow_id, workflow):
+        return self._update('workflow', workflow_id, workflow)
+
+    def updateAction(self, action_id, action):
+        return self._update('action', action_id, action)
+
+    def updateTrigger(self, trigger_id, trigger):
+        return self._update('trigger', trigger_id, trigger)
+
+    def updateDataset(self, dataset_id, dataset):
+        return self._update('dataset', dataset_id, dataset)
+
+    def deleteDatastore(self, datastore_id):
+        return self._delete('datastore', datastore_id)
+
+    def deleteWorkflow(self, workflow_id):
+        return self._delete('workflow', workflow_id)
+
+    def deleteAction(self, action_id):
+        return self._delete('action', action_id)
+
+    def deleteTrigger(self, trigger_id):
+        return self._delete('trigger', trigger_id)
+
+    def deleteDataset(self, dataset_id):
+        return self._delete('dataset', dataset_id)
+
+    def deleteSubscription(self, subscription_id):
+        return self._delete('subscription', subscription_id)
+
+
+def _matches(entity, filters):
+    for expression in json.loads(filters) if filters else []:
+        if ' IN ' in expression:
+            field, values = expression.split(' IN ', 1)
+            if str(getattr(entity, field, None) or getattr(entity.data, field)) not in values.split(','):
+                return False
+            continue
+        if ' >= ' in expression:
+            field, value = expression.split(' >= ', 1)
+            if str(getattr(entity, field, None) or getattr(entity.data, field)) < value:
+                return False
+            continue
+        field, value = expression.split(' = ', 1)
+        actual = getattr(entity.data, field)
+        if isinstance(actual, list):
+            if value not in [str(item) for item in actual]:
+                return False
+        elif str(actual) != value:
+            return False
+    return True
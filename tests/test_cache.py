@@ -0,0 +1,72 @@
+import mock
+
+from dartclient.cache import ResponseCache
+from dartclient.core import ModelFactory, SyncManager
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_per_entity_type():
+    clock = Clock()
+    cache = ResponseCache(default_ttl=10, ttls={'dataset': 100}, clock=clock)
+    cache.put('workflow', 'workflow1', (), {'id': 'W1'})
+    cache.put('dataset', 'dataset1', (), {'id': 'D1'})
+
+    clock.now += 50
+    assert cache.get('workflow', 'workflow1') == (False, None)
+    assert cache.get('dataset', 'dataset1') == (True, {'id': 'D1'})
+    assert cache.as_dict()['expirations'] == 1
+
+
+def test_negative_caching():
+    clock = Clock()
+    cache = ResponseCache(default_ttl=60, negative_ttl=5, clock=clock)
+    cache.put('dataset', 'missing', (), None)
+    assert cache.get('dataset', 'missing') == (True, None)
+    clock.now += 6
+    assert cache.get('dataset', 'missing') == (False, None)
+
+
+def test_lru_eviction_and_copies():
+    cache = ResponseCache(max_size=2)
+    cache.put('dataset', 'a', (), {'id': 'A'})
+    cache.put('dataset', 'b', (), {'id': 'B'})
+    hit, entity = cache.get('dataset', 'a')
+    entity['id'] = 'modified'
+    cache.put('dataset', 'c', (), {'id': 'C'})
+
+    assert cache.get('dataset', 'a') == (True, {'id': 'A'})
+    assert cache.get('dataset', 'b') == (False, None)
+    assert cache.as_dict() == {'size': 2, 'hits': 2, 'misses': 1, 'evictions': 1, 'expirations': 0,
+                               'invalidations': 0}
+
+
+def test_sync_manager_invalidates_on_write():
+    client = mock.Mock()
+    dataset = mock.Mock(id='DATASET1')
+    dataset.data.name = 'dataset1'
+    dataset.data.columns = []
+    client.Dataset.listDatasets.return_value.result.return_value = mock.Mock(total=1, results=[dataset])
+    sync_manager = SyncManager(client, ModelFactory(client), cache=ResponseCache())
+
+    assert sync_manager.find_dataset('dataset1').id == 'DATASET1'
+    assert sync_manager.find_dataset('dataset1').id == 'DATASET1'
+    assert client.Dataset.listDatasets.call_count == 1
+
+    sync_manager.sync_dataset('dataset1', lambda d: d)
+    assert client.Dataset.listDatasets.call_count == 1
+    sync_manager.find_dataset('dataset1')
+    assert client.Dataset.listDatasets.call_count == 2
+
+    client.Subscription.listSubscriptions.return_value.result.return_value = mock.Mock(total=0, results=[])
+    sync_manager.clean_dataset(dataset)
+    sync_manager.find_dataset('dataset1')
+    assert client.Dataset.listDatasets.call_count == 3
+    assert sync_manager.cache.as_dict()['invalidations'] == 2
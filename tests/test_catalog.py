@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from dartclient.catalog import EntityCatalog
+from dartclient.core import ModelFactory, SyncManager
+from tests.fake_dart import FakeDart
+
+
+def test_catalog_incremental_and_full_refresh():
+    dart = FakeDart()
+    dataset = dart.add('dataset', {'data': {'name': 'dataset1'}})
+    dart.add('dataset', {'data': {'name': 'dataset2'}})
+    now = [100.0]
+    catalog = EntityCatalog(SyncManager(dart, ModelFactory(dart)), entity_types=['dataset'],
+                            full_refresh_every=3, clock=lambda: now[0])
+    with pytest.raises(RuntimeError):
+        catalog.find('dataset', 'dataset1')
+
+    catalog.load()
+    assert catalog.find('dataset', 'dataset1').id == dataset.id
+    assert catalog.get('dataset', dataset.id).data.name == 'dataset1'
+
+    renamed = dart.entities['dataset'][dataset.id]
+    renamed.data.name = 'renamed'
+    renamed.updated = '2016-06-02T00:00:00'
+    added = dart.add('dataset', {'data': {'name': 'dataset3'}})
+    dart.entities['dataset'][added.id].updated = '2016-06-03T00:00:00'
+    now[0] += 30
+    assert catalog.staleness == 30
+    catalog.refresh()
+    assert dart.calls[-1][1]['filters'] == '["updated >= 2016-06-01T00:00:00"]'
+    assert catalog.find('dataset', 'dataset1') is None
+    assert catalog.find('dataset', 'renamed').id == dataset.id
+    assert catalog.find('dataset', 'dataset3').id == added.id
+    assert catalog.staleness == 0
+
+    del dart.entities['dataset'][added.id]
+    catalog.refresh()
+    assert dart.calls[-1][1]['filters'] == '["updated >= 2016-06-03T00:00:00"]'
+    assert catalog.find('dataset', 'dataset3') is not None
+    catalog.refresh()
+    assert 'filters' not in dart.calls[-1][1]
+    assert catalog.find('dataset', 'dataset3') is None
+    assert catalog.as_dict()['entities'] == {'dataset': 2}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status_code):
+        super(HTTPError, self).__init__(status_code)
+        self.status_code = status_code
+
+
+def failing_incremental_lists(dart, *errors):
+    errors = list(errors)
+    list_workflows = dart.listWorkflows
+
+    def list_workflows_or_fail(**kwargs):
+        if 'updated' in kwargs.get('filters', '') and errors:
+            raise errors.pop(0)
+        return list_workflows(**kwargs)
+    dart.listWorkflows = list_workflows_or_fail
+
+
+def test_catalog_falls_back_to_full_refresh():
+    dart = FakeDart()
+    dart.add('workflow', {'data': {'name': 'workflow1'}})
+    failing_incremental_lists(dart, HTTPError(400))
+    catalog = EntityCatalog(SyncManager(dart, ModelFactory(dart)), entity_types=['workflow'])
+    catalog.load()
+    catalog.refresh()
+    assert not catalog.incremental
+    assert catalog.find('workflow', 'workflow1') is not None
+    catalog.refresh()
+    assert 'filters' not in dart.calls[-1][1]
+
+
+def test_catalog_stays_incremental_after_transient_failures():
+    dart = FakeDart()
+    dart.add('workflow', {'data': {'name': 'workflow1'}})
+    failing_incremental_lists(dart, HTTPError(503), HTTPError(429), ValueError('connection reset'))
+    catalog = EntityCatalog(SyncManager(dart, ModelFactory(dart)), entity_types=['workflow'])
+    catalog.load()
+    for _ in range(3):
+        catalog.refresh()
+        assert 'filters' not in dart.calls[-1][1]
+        assert catalog.incremental
+    catalog.refresh()
+    assert 'updated >= ' in dart.calls[-1][1]['filters']
+    assert catalog.find('workflow', 'workflow1') is not None
+
+
+def test_background_refresh():
+    dart = FakeDart()
+    refreshed = threading.Event()
+    catalog = EntityCatalog(SyncManager(dart, ModelFactory(dart)), entity_types=['dataset'], refresh_interval=0.01)
+    with catalog:
+        dart.add('dataset', {'data': {'name': 'dataset1'}})
+        for _ in range(500):
+            if catalog.find('dataset', 'dataset1') is not None:
+                refreshed.set()
+                break
+            refreshed.wait(0.01)
+    assert refreshed.is_set()
+    assert catalog._thread is None
@@ -0,0 +1,57 @@
+import pytest
+
+from dartclient.clone import clone_datastore
+from dartclient.core import ModelFactory, SyncManager
+from tests.fake_dart import FakeDart
+
+
+def populate(dart):
+    datastore = dart.add('datastore', {'data': {'name': 'template1', 'state': 'TEMPLATE', 'engine_name': 'emr_engine'}})
+    dataset = dart.add('dataset', {'data': {'name': 'dataset1'}})
+    workflows = [dart.add('workflow', {'data': {'name': 'workflow%d' % (i,), 'datastore_id': datastore.id}})
+                 for i in range(2)]
+    for workflow in workflows:
+        for index in range(3):
+            dart.add('action', {'data': {'name': 'action%d' % (index,), 'workflow_id': workflow.id,
+                                         'args': {'dataset_id': dataset.id}}})
+    dart.add('action', {'data': {'name': 'action0', 'workflow_id': workflows[0].id,
+                                 'workflow_instance_id': 'WORKFLOW_INSTANCE1'}})
+    dart.add('trigger', {'data': {'name': 'trigger1', 'workflow_ids': [workflows[1].id],
+                                  'args': {'completed_workflow_id': workflows[0].id}}})
+    return datastore, dataset, workflows
+
+
+def test_clone_datastore():
+    dart = FakeDart()
+    datastore, dataset, workflows = populate(dart)
+    other_dataset = dart.add('dataset', {'data': {'name': 'dataset2'}})
+
+    def callback(entity_type, entity):
+        if entity_type == 'trigger':
+            entity['data']['name'] = 'team1_' + entity['data']['name']
+        return entity
+
+    report = clone_datastore(SyncManager(dart, ModelFactory(dart)), 'template1', 'TEMPLATE', 'team1', 'ACTIVE',
+                             callback=callback, id_map={'dataset': {dataset.id: other_dataset.id}}, batch_size=2)
+
+    assert not report.failures and not report.skipped
+    assert report.counts == {'datastore': 1, 'workflow': 2, 'action': 6, 'trigger': 1, 'dataset': 0,
+                             'subscription': 0}
+    assert dart.operation_count('createWorkflowActions') == 4
+    new_datastore = dart.entities['datastore'][report.id_map['datastore'][datastore.id]]
+    assert (new_datastore.data.name, new_datastore.data.state) == ('team1', 'ACTIVE')
+    assert new_datastore.data.engine_name == 'emr_engine'
+    new_workflows = [dart.entities['workflow'][report.id_map['workflow'][w.id]] for w in workflows]
+    assert all(workflow.data.datastore_id == new_datastore.id for workflow in new_workflows)
+    new_actions = [dart.entities['action'][action_id] for action_id in report.id_map['action'].values()]
+    assert all(action.data.args == {'dataset_id': other_dataset.id} for action in new_actions)
+    new_trigger = dart.entities['trigger'][list(report.id_map['trigger'].values())[0]]
+    assert new_trigger.data.name == 'team1_trigger1'
+    assert new_trigger.data.workflow_ids == [new_workflows[1].id]
+    assert new_trigger.data.args == {'completed_workflow_id': new_workflows[0].id}
+
+
+def test_clone_missing_datastore():
+    dart = FakeDart()
+    with pytest.raises(Exception):
+        clone_datastore(SyncManager(dart, ModelFactory(dart)), 'missing', 'TEMPLATE', 'team1')
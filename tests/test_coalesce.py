@@ -0,0 +1,94 @@
+import threading
+import time
+
+import mock
+import pytest
+
+from dartclient.coalesce import SingleFlight
+from dartclient.core import ModelFactory, SyncManager
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def test_single_flight_shares_result():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait()
+        return 'value'
+
+    threads, results, errors = run_concurrently(5, lambda: single_flight.do('key', fn))
+    wait_for(lambda: single_flight.coalesced == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [('value', False)] + [('value', True)] * 4
+    assert single_flight.as_dict() == {'executed': 1, 'coalesced': 4}
+
+    assert single_flight.do('key', lambda: 'again') == ('again', False)
+
+
+def test_single_flight_shares_exception():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait()
+        raise ValueError('boom')
+
+    threads, results, errors = run_concurrently(3, lambda: single_flight.do('key', fn))
+    wait_for(lambda: single_flight.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == []
+    assert [str(e) for e in errors] == ['boom'] * 3
+    with pytest.raises(KeyError):
+        single_flight.do('key', lambda: {}['missing'])
+
+
+def test_sync_manager_coalesces_find_workflow():
+    client = mock.Mock()
+    release = threading.Event()
+    workflow = {'id': 'WORKFLOW1'}
+
+    def list_workflows(**kwargs):
+        release.wait()
+        return mock.Mock(total=1, results=[workflow])
+
+    client.Workflow.listWorkflows.return_value.result.side_effect = list_workflows
+    sync_manager = SyncManager(client, ModelFactory(client), coalesce_reads=True)
+    datastore = mock.Mock(id='DATASTORE1')
+
+    threads, results, errors = run_concurrently(4, lambda: sync_manager.find_workflow('workflow1', datastore))
+    wait_for(lambda: sync_manager.single_flight.coalesced == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert client.Workflow.listWorkflows.call_count == 1
+    assert results == [workflow] * 4
+    assert len(set(id(result) for result in results)) == 4
@@ -0,0 +1,58 @@
+import bravado_core.param
+import mock
+import pytest
+import simplejson
+
+from dartclient.codec import get_json_codec, install_request_codec, JsonCodec, StdlibJsonCodec
+from dartclient.http_client import DartRequestsClient, DartResponseAdapter
+
+
+class RecordingCodec(JsonCodec):
+    name = 'recording'
+
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, value):
+        self.calls.append('dumps')
+        return super(RecordingCodec, self).dumps(value)
+
+    def loads(self, content):
+        self.calls.append('loads')
+        return super(RecordingCodec, self).loads(content)
+
+
+def test_get_json_codec():
+    assert isinstance(get_json_codec('auto'), JsonCodec)
+    assert isinstance(get_json_codec('json'), StdlibJsonCodec)
+    codec = RecordingCodec()
+    assert get_json_codec(codec) is codec
+    with pytest.raises(ValueError):
+        get_json_codec('xml')
+
+
+def test_codec_round_trip():
+    value = {'results': [{'id': 'ABC', 'data': {'columns': [{'name': 'c1'}]}}], 'total': 1}
+    for name in ('auto', 'simplejson', 'json'):
+        codec = get_json_codec(name)
+        assert codec.loads(codec.dumps(value)) == value
+
+
+def test_response_adapter_uses_codec():
+    codec = RecordingCodec()
+    response = mock.Mock(content=b'{"total": 0, "results": []}')
+    adapter = DartRequestsClient(json_codec=codec).response_adapter(response)
+    assert isinstance(adapter, DartResponseAdapter)
+    assert adapter.json() == {'total': 0, 'results': []}
+    assert codec.calls == ['loads']
+
+
+def test_install_request_codec():
+    codec = RecordingCodec()
+    install_request_codec(codec)
+    try:
+        assert bravado_core.param.json.dumps({'name': 'x'}) == '{"name": "x"}'
+        assert codec.calls == ['dumps']
+    finally:
+        install_request_codec(None)
+    assert bravado_core.param.json is simplejson
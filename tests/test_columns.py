@@ -0,0 +1,70 @@
+import mock
+from six import StringIO
+
+from dartclient.columns import ColumnSchema, diff_columns
+from dartclient.core import ModelFactory, SyncManager
+
+
+def test_from_rows():
+    schema = ColumnSchema.from_rows([('column1', 'VARCHAR', 64), ('column2', 'DATETIME', None)],
+                                    fields=('name', 'data_type', 'length'))
+    assert len(schema) == 2
+    assert schema.to_payload() == [
+        {'name': 'column1', 'data_type': 'VARCHAR', 'length': 64},
+        {'name': 'column2', 'data_type': 'DATETIME'},
+    ]
+
+
+def test_from_ddl():
+    schema = ColumnSchema.from_ddl('''
+        CREATE TABLE table1 (
+            column1 varchar(64) NOT NULL,
+            column2 DECIMAL(10, 2),
+            column3 DATETIME,
+            PRIMARY KEY (column1)
+        )''')
+    assert schema.to_payload() == [
+        {'name': 'column1', 'data_type': 'VARCHAR', 'length': 64},
+        {'name': 'column2', 'data_type': 'DECIMAL', 'precision': 10, 'scale': 2},
+        {'name': 'column3', 'data_type': 'DATETIME'},
+    ]
+
+
+def test_from_csv():
+    schema = ColumnSchema.from_csv(StringIO(u'name,data_type,length\ncolumn1,VARCHAR,64\ncolumn2,DATETIME,\n'))
+    assert schema.names == ['column1', 'column2']
+    assert schema.column(0) == {'name': 'column1', 'data_type': 'VARCHAR', 'length': 64}
+
+
+def test_diff_columns():
+    existing = [mock.Mock(spec=[], name='c', data_type='VARCHAR', length=None, precision=None, scale=None,
+                          date_pattern=None, description=None, path=None)
+                for _ in range(3)]
+    existing[0].name, existing[1].name, existing[2].name = 'column1', 'column2', 'column3'
+    diff = diff_columns(existing, [('column1', 'VARCHAR'), ('column2', 'BIGINT'), ('column4', 'DATE')])
+    assert diff.added == ['column4']
+    assert diff.removed == ['column3']
+    assert diff.changed == {'column2': {'data_type': ('VARCHAR', 'BIGINT')}}
+    assert not diff.reordered
+    assert not diff_columns(existing, ColumnSchema.from_dicts(existing))
+
+
+def test_model_factory_create_dataset_with_columns():
+    model_factory = ModelFactory(mock.Mock())
+    dataset = model_factory.create_dataset(columns=[('column1', 'VARCHAR')])
+    assert dataset.data.columns == [{'name': 'column1', 'data_type': 'VARCHAR'}]
+
+
+def test_sync_dataset_skips_unchanged_columns():
+    client = mock.Mock()
+    existing = mock.Mock()
+    existing.data.columns = [{'name': 'column1', 'data_type': 'VARCHAR'}]
+    client.Dataset.listDatasets.return_value.result.return_value = mock.Mock(total=1, results=[existing])
+    sync_manager = SyncManager(client, ModelFactory(client))
+
+    sync_manager.sync_dataset('dataset1', lambda dataset: dataset, columns=[('column1', 'VARCHAR')])
+    assert client.Dataset.updateDataset.call_args[1]['dataset'].data.columns is existing.data.columns
+
+    sync_manager.sync_dataset('dataset1', lambda dataset: dataset, columns=[('column1', 'BIGINT')])
+    assert client.Dataset.updateDataset.call_args[1]['dataset'].data.columns == [
+        {'name': 'column1', 'data_type': 'BIGINT'}]
@@ -0,0 +1,93 @@
+import time
+
+import mock
+import pytest
+import requests
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.deadline import Deadline, DeadlineExceeded
+from dartclient.hedge import HedgingPolicy
+from dartclient.http_client import DartRequestsClient
+from dartclient.stub_server import StubDartServer
+
+
+def test_deadline_timeouts():
+    now = [100.0]
+    deadline = Deadline(10, clock=lambda: now[0])
+    assert deadline.timeout() == 10
+    now[0] += 7.5
+    assert deadline.remaining() == 2.5
+    assert not deadline.expired
+    now[0] += 3
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout('listWorkflows')
+
+
+def test_sync_manager_passes_remaining_time_as_timeout():
+    client = mock.Mock()
+    client.Datastore.listDatastores.return_value.result.return_value = mock.Mock(total=0, results=[])
+    now = [100.0]
+    sync_manager = SyncManager(client, ModelFactory(client))
+    bounded = sync_manager.with_deadline(Deadline(30, clock=lambda: now[0]))
+    assert sync_manager.deadline is None and bounded.client is client
+
+    now[0] += 10
+    assert bounded.find_datastore('datastore1', 'ACTIVE') is None
+    client.Datastore.listDatastores.return_value.result.assert_called_with(timeout=20)
+    sync_manager.find_datastore('datastore1', 'ACTIVE')
+    client.Datastore.listDatastores.return_value.result.assert_called_with(timeout=None)
+
+    now[0] += 20
+    client.reset_mock()
+    with pytest.raises(DeadlineExceeded):
+        bounded.find_datastore('datastore1', 'ACTIVE')
+    assert not client.Datastore.listDatastores.called
+
+
+def test_hedged_attempts_get_the_time_left_when_they_start():
+    client = mock.Mock()
+    now = [100.0]
+    timeouts = []
+
+    def result(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) == 1:
+            now[0] += 5
+            time.sleep(0.5)
+        return mock.Mock(total=0, results=[])
+    client.Datastore.listDatastores.return_value.result.side_effect = result
+    hedging = HedgingPolicy(initial_delay=0.05, max_extra_load=1.0)
+    sync_manager = SyncManager(client, ModelFactory(client), hedging=hedging)
+
+    with sync_manager:
+        bounded = sync_manager.with_deadline(Deadline(30, clock=lambda: now[0]))
+        assert bounded.find_datastore('datastore1', 'ACTIVE') is None
+    assert timeouts == [30, 25]
+    assert hedging.hedges_won == 1
+
+
+def test_deadline_bounds_a_hung_request():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        sync_manager = SyncManager(client, ModelFactory(client))
+        server.latency = 5.0
+        start = time.time()
+        with pytest.raises(DeadlineExceeded):
+            sync_manager.with_deadline(0.3).sync_datastore('datastore1', 'ACTIVE', lambda datastore: datastore)
+        assert time.time() - start < 2
+
+
+def test_per_operation_timeouts():
+    http_client = DartRequestsClient(timeouts={'listActions': 1, 'list': 2, 'default': 3})
+    assert http_client.timeout_for('listActions') == 1
+    assert http_client.timeout_for('listWorkflows') == 2
+    assert http_client.timeout_for('updateWorkflow') == 3
+    assert DartRequestsClient().timeout_for('listActions') is None
+
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url, timeouts={'list': 0.2})
+        sync_manager = SyncManager(client, ModelFactory(client))
+        server.latency = 5.0
+        with pytest.raises(requests.exceptions.Timeout):
+            sync_manager.find_datastore('datastore1', 'ACTIVE')
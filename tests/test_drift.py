@@ -0,0 +1,84 @@
+import copy
+import json
+
+import mock
+
+from dartclient import cli
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.drift import DesiredModel, detect_drift, LiveState
+from dartclient.plan import ModelPlan, PlanRunner
+from dartclient.snapshot import export_snapshot
+from tests.fake_dart import FakeDart
+from tests.test_plan import MODEL
+
+
+def synced_dart():
+    dart = FakeDart()
+    sync_manager = SyncManager(dart, ModelFactory(dart, engine_name='no_op_engine'))
+    assert PlanRunner(sync_manager, ModelPlan(MODEL)).sync().ok
+    return dart, sync_manager
+
+
+def desired_model(dart, model=MODEL):
+    return DesiredModel.from_plan(ModelFactory(dart, engine_name='no_op_engine'), ModelPlan(model))
+
+
+def test_no_drift_after_sync():
+    dart, sync_manager = synced_dart()
+    calls = len(dart.calls)
+    live = LiveState.fetch(sync_manager, workers=2)
+    assert len(dart.calls) - calls == 6
+
+    report = detect_drift(desired_model(dart), live)
+    assert report.ok, report.summary()
+    assert len(report.entities) == 7
+
+
+def test_detects_changes_and_missing_entities():
+    dart, sync_manager = synced_dart()
+    model = copy.deepcopy(MODEL)
+    model['datasets'][0]['columns'].append(['column3', 'BIGINT'])
+    model['datastores'][0]['workflows'][0]['actions'].append({'name': 'action3'})
+    model['datastores'][0]['workflows'].append({'name': 'workflow2', 'actions': [{'name': 'action4'}]})
+    workflow = [entity for entity in dart.entities['workflow'].values()][0]
+    workflow.data.engine_name = 'other_engine'
+
+    report = detect_drift(desired_model(dart, model), LiveState.fetch(sync_manager))
+
+    drifted = dict(((entity.entity_type, entity.path), entity) for entity in report.drifted)
+    assert sorted(drifted) == [('action', ('datastore1', 'workflow1', 'action3')),
+                               ('action', ('datastore1', 'workflow2', 'action4')),
+                               ('dataset', ('dataset1',)),
+                               ('workflow', ('datastore1', 'workflow1')),
+                               ('workflow', ('datastore1', 'workflow2'))]
+    assert drifted[('workflow', ('datastore1', 'workflow1'))].differences == {
+        'engine_name': ('other_engine', 'no_op_engine')}
+    assert drifted[('dataset', ('dataset1',))].differences['columns'][1].added == ['column3']
+    assert drifted[('action', ('datastore1', 'workflow2', 'action4'))].status == 'missing'
+    assert 'engine_name' in report.summary()
+
+
+def test_detects_changed_references_from_snapshot(tmpdir):
+    dart, sync_manager = synced_dart()
+    action = [entity for entity in dart.entities['action'].values() if entity.data.name == 'action1'][0]
+    action.data.args = {'dataset_id': 'DATASET999'}
+    path = str(tmpdir.join('snapshot.jsonl.gz'))
+    export_snapshot(sync_manager, path)
+
+    report = detect_drift(desired_model(dart), LiveState.from_snapshot(path))
+
+    assert [(entity.path, entity.status) for entity in report.drifted] == [
+        (('datastore1', 'workflow1', 'action1'), 'changed')]
+    assert list(report.drifted[0].differences) == ['args.dataset_id']
+
+
+def test_cli_drift(tmpdir):
+    dart, sync_manager = synced_dart()
+    model = tmpdir.join('model.json')
+    model.write(json.dumps(MODEL))
+
+    with mock.patch('dartclient.cli.create_client'), \
+            mock.patch('dartclient.cli.create_sync_manager', return_value=sync_manager):
+        assert cli.main(['--api-url', 'https://dart.example.com/api/1', 'drift', str(model)]) == 0
+        dart.entities['dataset'].clear()
+        assert cli.main(['--api-url', 'https://dart.example.com/api/1', 'drift', str(model)]) == 1
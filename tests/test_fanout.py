@@ -0,0 +1,95 @@
+import threading
+import time
+
+import mock
+
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.fanout import FanOutError, FanOutSyncManager
+from dartclient.plan import ModelPlan, PlanRunner
+from tests.fake_dart import FakeDart
+from tests.test_plan import MODEL
+
+
+def targets(*names):
+    darts = dict((name, FakeDart()) for name in names)
+    return darts, [(name, SyncManager(dart, ModelFactory(dart))) for (name, dart) in sorted(darts.items())]
+
+
+def test_fan_out_plan():
+    darts, sync_managers = targets('production', 'staging')
+    existing = darts['production'].add('datastore', {'data': {
+        'name': 'datastore1', 'state': 'ACTIVE', 'engine_name': 'old_engine', 'description': 'kept'}})
+
+    with FanOutSyncManager(sync_managers) as fan_out:
+        report = PlanRunner(fan_out, ModelPlan(MODEL)).sync()
+        counts = fan_out.report()
+
+    assert report.ok
+    assert counts['staging']['ok'] == counts['production']['ok'] == 7
+    for dart in darts.values():
+        assert dict((entity_type, len(entities)) for (entity_type, entities) in dart.entities.items()) == {
+            'datastore': 1, 'workflow': 1, 'action': 2, 'trigger': 1, 'dataset': 1, 'subscription': 1,
+            'workflow_instance': 0}
+        action = [a for a in dart.entities['action'].values() if a.data.name == 'action1'][0]
+        assert action.data.args == {'dataset_id': list(dart.entities['dataset'])[0]}
+    datastore = darts['production'].entities['datastore'][existing.id]
+    assert (datastore.data.engine_name, datastore.data.description) == ('no_op_engine', 'kept')
+
+
+def test_callbacks_run_once_and_failures_are_per_target():
+    darts, sync_managers = targets('a', 'b')
+    darts['b'].createDatastore = mock.Mock(side_effect=RuntimeError('boom'))
+    callback = mock.Mock(side_effect=lambda entity: entity)
+
+    with FanOutSyncManager(sync_managers) as fan_out:
+        datastore = fan_out.sync_datastore('datastore1', 'ACTIVE', callback)
+        workflow = fan_out.sync_workflow('workflow1', datastore, callback)
+
+    assert callback.call_count == 2
+    assert [result.target for result in datastore.failures] == ['b']
+    assert workflow.get('a').data.datastore_id == datastore.get('a').id
+    assert workflow.results['b'].skipped
+    assert fan_out.report()['b'] == {'ok': 0, 'failed': 1, 'skipped': 1, 'seconds': mock.ANY}
+
+
+def test_plan_runner_reports_target_failures():
+    darts, sync_managers = targets('a', 'b')
+    darts['b'].createDatastore = mock.Mock(side_effect=RuntimeError('boom'))
+
+    with FanOutSyncManager(sync_managers) as fan_out:
+        report = PlanRunner(fan_out, ModelPlan(MODEL)).sync()
+
+    assert not report.ok
+    [failure] = report.failures
+    assert (failure.entity_type, failure.path) == ('datastore', ('datastore1',))
+    assert isinstance(failure.error, FanOutError)
+    assert [result.target for result in failure.error.results] == ['b']
+    assert 'b (boom)' in str(failure.error)
+    # the healthy target still syncs the children of the failed step
+    assert len(darts['a'].entities['workflow']) == len(darts['a'].entities['trigger']) == 1
+    assert not darts['b'].entities['workflow']
+
+
+def test_workers_are_per_target():
+    model = {'datasets': [{'name': 'dataset%d' % i, 'data': {'table_name': 'table%d' % i}} for i in range(4)]}
+    darts, sync_managers = targets('a', 'b')
+    lock, running = threading.Lock(), [0, 0]
+
+    def slow(sync_dataset):
+        def wrapper(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+            return sync_dataset(*args, **kwargs)
+        return wrapper
+
+    for _, sync_manager in sync_managers:
+        sync_manager.sync_dataset = slow(sync_manager.sync_dataset)
+    with FanOutSyncManager(sync_managers, workers=4) as fan_out:
+        report = PlanRunner(fan_out, ModelPlan(model), workers=4).sync()
+
+    assert report.ok
+    assert running[1] == 8
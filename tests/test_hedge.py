@@ -0,0 +1,106 @@
+import itertools
+import threading
+import time
+
+import mock
+import pytest
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.hedge import HedgingPolicy
+from dartclient.stub_server import StubDartServer
+
+
+def slow_first(results, delay=1.0):
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            attempt = next(counter)
+        if attempt == 0:
+            time.sleep(delay)
+        return results[attempt]
+    return fn
+
+
+def test_delay_is_a_percentile_of_recent_latencies():
+    policy = HedgingPolicy(percentile=90, initial_delay=0.2, min_samples=10, max_delay=1.0)
+    assert policy.delay('listWorkflows') == 0.2
+    for latency in range(1, 11):
+        policy._record('listWorkflows', latency / 100.0)
+    assert policy.delay('listWorkflows') == 0.09
+    for _ in range(10):
+        policy._record('listWorkflows', 5.0)
+    assert policy.delay('listWorkflows') == 1.0
+    assert policy.delay('listActions') == 0.2
+
+
+def test_hedges_slow_calls():
+    policy = HedgingPolicy(initial_delay=0.05, max_extra_load=1.0)
+    start = time.time()
+    assert policy.call('listDatastores', slow_first(['primary', 'hedge'])) == 'hedge'
+    assert time.time() - start < 0.5
+    assert policy.as_dict()['hedges_fired'] == policy.as_dict()['hedges_won'] == 1
+
+
+def test_caps_extra_load():
+    policy = HedgingPolicy(initial_delay=0.05, max_extra_load=0.0)
+    assert policy.call('listDatastores', slow_first(['primary', 'hedge'], delay=0.2)) == 'primary'
+    assert policy.hedges_fired == 0
+    assert policy.hedges_suppressed == 1
+
+
+def test_does_not_hedge_failures_or_other_operations():
+    policy = HedgingPolicy(initial_delay=0.05, max_extra_load=1.0, operations=['listDatastores'])
+
+    def fail():
+        raise ValueError('failed')
+    with pytest.raises(ValueError):
+        policy.call('listDatastores', fail)
+    assert policy.call('updateDatastore', slow_first(['primary', 'hedge'], delay=0.2)) == 'primary'
+    assert policy.hedges_fired == 0
+
+
+def test_sync_manager_hedges_reads():
+    latencies = iter([1.0])
+    with StubDartServer(latency=lambda: next(latencies, 0.0)) as server:
+        client = create_client(api_url=server.api_url)
+        hedging = HedgingPolicy(initial_delay=0.05, max_extra_load=1.0)
+        sync_manager = SyncManager(client, ModelFactory(client), hedging=hedging)
+        start = time.time()
+        assert sync_manager.find_datastore('datastore1', 'ACTIVE') is None
+        assert time.time() - start < 0.5
+        assert hedging.as_dict()['hedges_won'] == 1
+        hedging.close()
+
+
+def test_threads_start_on_first_hedge_and_stop_on_close():
+    with SyncManager(mock.Mock(), mock.Mock(), hedging=HedgingPolicy(initial_delay=0.05, max_extra_load=1.0)) \
+            as sync_manager:
+        policy = sync_manager.hedging
+        assert policy.call('listDatastores', lambda: 'result') == 'result'
+        assert policy._executor is None
+        assert policy.call('listDatastores', slow_first(['primary', 'hedge'], delay=0.2)) == 'hedge'
+        assert policy._executor is not None
+    assert policy._executor is None
+    assert policy.call('listDatastores', slow_first(['primary', 'again'], delay=0.2)) == 'again'
+    policy.close()
+
+
+def test_calls_in_flight_are_not_limited_by_the_pool():
+    policy = HedgingPolicy(initial_delay=1.0, max_workers=1)
+
+    def fn():
+        time.sleep(0.2)
+        return 'result'
+    threads = [threading.Thread(target=policy.call, args=('listDatastores', fn)) for _ in range(4)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.time() - start < 0.5
+    latencies = policy._latencies['listDatastores']
+    assert len(latencies) == 4
+    assert max(latencies) < 0.35
+    assert policy.hedges_fired == 0
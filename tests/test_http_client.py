@@ -0,0 +1,107 @@
+import gzip
+import io
+import threading
+
+import pytest
+from six.moves import BaseHTTPServer
+
+from dartclient.http_client import DartRequestsClient, gzip_compress
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    received = []
+    reject_compressed = False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            if self.reject_compressed:
+                self.send_response(415)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        self.received.append((self.headers.get('Content-Encoding'), body))
+
+        content = b'{"results": [' + b','.join([b'{"name": "entity"}'] * 500) + b']}'
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip_compress(content)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    Handler.received = []
+    Handler.reject_compressed = False
+    yield 'http://127.0.0.1:%d/api/1/dataset' % (server.server_address[1],)
+    server.shutdown()
+    server.server_close()
+
+
+def post(http_client, url, body):
+    return http_client.request({'method': 'POST', 'url': url, 'params': {}, 'headers': {}, 'data': body}).result()
+
+
+def test_compresses_large_request_bodies(server_url):
+    http_client = DartRequestsClient(compress_request_threshold=1024)
+    small, large = b'{"a": 1}', b'{"columns": [' + b','.join([b'{"name": "column"}'] * 500) + b']}'
+
+    post(http_client, server_url, small)
+    response = post(http_client, server_url, large)
+
+    assert Handler.received == [(None, small), ('gzip', large)]
+    assert len(response.json()['results']) == 500
+    stats = http_client.compression_stats
+    assert stats.requests_compressed == 1
+    assert stats.request_bytes == len(small) + len(large)
+    assert stats.request_bytes_sent < stats.request_bytes
+    assert stats.responses_compressed == 2
+    assert stats.response_bytes_received < stats.response_bytes
+    assert stats.as_dict()['bytes_saved'] == stats.bytes_saved > 0
+
+
+def test_falls_back_when_server_rejects_compression(server_url):
+    Handler.reject_compressed = True
+    http_client = DartRequestsClient(compress_request_threshold=10)
+    body = b'{"name": "a dataset with a long name"}'
+
+    post(http_client, server_url, body)
+
+    assert Handler.received == [(None, body)]
+    assert http_client.compress_request_threshold is None
+    assert http_client.compression_stats.requests_compressed == 0
+
+
+def test_uses_one_session_per_thread(server_url):
+    http_client = DartRequestsClient(pool_maxsize=16)
+    sessions = []
+
+    def request():
+        post(http_client, server_url, b'{}')
+        sessions.append(http_client.session)
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(id(session) for session in sessions)) == 3
+    assert all(session.headers['Accept-Encoding'] == http_client.headers['Accept-Encoding'] for session in sessions)
+    assert all(session.get_adapter(server_url)._pool_maxsize == 16 for session in sessions)
+    http_client.ensure_pool_size(32)
+    assert all(session.get_adapter(server_url)._pool_maxsize == 32 for session in sessions)
@@ -0,0 +1,60 @@
+import multiprocessing
+
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.index import EntityIndex
+from tests.fake_dart import FakeDart
+
+
+def write_entries(path, worker):
+    index = EntityIndex(path)
+    for i in range(50):
+        index.put('dataset', 'dataset%d' % (i,), 'DATASET%d-%d' % (worker, i), str(worker))
+
+
+def test_index_is_shared_between_processes(tmpdir):
+    path = str(tmpdir.join('index.db'))
+    processes = [multiprocessing.Process(target=write_entries, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    index = EntityIndex(path)
+    assert len(index) == 50
+    assert index.get('dataset', 'dataset1').id.endswith('-1')
+    assert index.get('dataset', 'missing') is None
+
+
+def test_sync_manager_uses_and_validates_index(tmpdir):
+    path = str(tmpdir.join('index.db'))
+    dart = FakeDart()
+    datastore = dart.add('datastore', {'data': {'name': 'datastore1', 'state': 'ACTIVE'}})
+    workflow = dart.add('workflow', {'data': {'name': 'workflow1', 'datastore_id': datastore.id}})
+
+    first = SyncManager(dart, ModelFactory(dart), index=EntityIndex(path))
+    assert first.find_workflow('workflow1', datastore).id == workflow.id
+    assert dart.operation_count('listWorkflows') == 1
+
+    # a later job finds the workflow by id, or resolves its id without a request
+    now = [0.0]
+    second = SyncManager(dart, ModelFactory(dart), index=EntityIndex(path, max_age=60, clock=lambda: now[0] + 1e10))
+    assert second.find_workflow('workflow1', datastore).id == workflow.id
+    assert dart.operation_count('getWorkflow') == 1
+    assert dart.operation_count('listWorkflows') == 1
+    calls = len(dart.calls)
+    assert second.resolve_id('workflow', 'workflow1', datastore_id=datastore.id) == workflow.id
+    assert len(dart.calls) == calls
+
+    # the workflow is replaced by someone else, so the entry is stale
+    del dart.entities['workflow'][workflow.id]
+    replacement = dart.add('workflow', {'data': {'name': 'workflow1', 'datastore_id': datastore.id}})
+    now[0] += 120
+    assert second.resolve_id('workflow', 'workflow1', datastore_id=datastore.id) == replacement.id
+    assert second.index.stale == 1
+    assert dart.operation_count('listWorkflows') == 2
+    assert EntityIndex(path).get('workflow', 'workflow1', (('datastore_id', datastore.id),)).id == replacement.id
+
+    # writes through a SyncManager discard the entry
+    second.clean_workflow(second.find_workflow('workflow1', datastore))
+    assert second.index.get('workflow', 'workflow1', (('datastore_id', datastore.id),)) is None
@@ -0,0 +1,67 @@
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.journal import SyncJournal
+from tests.fake_dart import FakeDart
+
+
+def test_journal_survives_reopening(tmpdir):
+    path = str(tmpdir.join('sync.journal'))
+    with SyncJournal(path) as journal:
+        journal.record('workflow', 'workflow1', ('DATASTORE1',), 'WORKFLOW2', '1')
+        journal.record('workflow', 'workflow1', ('DATASTORE1',), 'WORKFLOW2', '2')
+    with open(path, 'a') as f:
+        f.write('{"type": "workflow", "name": "work')
+
+    with SyncJournal(path) as journal:
+        assert len(journal) == 1
+        assert journal.get('workflow', 'workflow1', ('DATASTORE1',)).fingerprint == '2'
+        assert journal.get('workflow', 'workflow1', ('DATASTORE3',)) is None
+        journal.record('action', 'action1', ('WORKFLOW2', None, None, None), 'ACTION4', '1')
+    with SyncJournal(path) as journal:
+        assert journal.get('action', 'action1', ('WORKFLOW2', None, None, None)).id == 'ACTION4'
+        journal.clear()
+        assert len(journal) == 0
+    assert len(SyncJournal(path)) == 0
+
+
+def sync_model(sync_manager, fail_on=None):
+    datastore = sync_manager.sync_datastore('datastore1', 'ACTIVE', lambda datastore: datastore)
+    workflow = sync_manager.sync_workflow('workflow1', datastore, lambda workflow: workflow)
+    for number in range(3):
+        if number == fail_on:
+            raise RuntimeError('network blip')
+        sync_manager.sync_action('action%d' % (number,), workflow, lambda action: action)
+
+
+def test_sync_resumes_from_journal(tmpdir):
+    path = str(tmpdir.join('sync.journal'))
+    dart = FakeDart()
+    try:
+        sync_model(SyncManager(dart, ModelFactory(dart), journal=SyncJournal(path)), fail_on=2)
+    except RuntimeError:
+        pass
+    assert len(dart.entities['action']) == 2
+
+    dart.calls = []
+    sync_manager = SyncManager(dart, ModelFactory(dart), journal=SyncJournal(path))
+    sync_model(sync_manager)
+    assert len(dart.entities['action']) == 3
+    assert sync_manager.journal.as_dict() == {'steps': 5, 'resumed': 4, 'invalidated': 0, 'recorded': 1}
+    assert [call[0] for call in dart.calls] == [
+        'getDatastore', 'getWorkflow', 'getAction', 'getAction', 'listActions', 'createWorkflowActions']
+
+
+def test_changed_entities_are_synced_again(tmpdir):
+    path = str(tmpdir.join('sync.journal'))
+    dart = FakeDart()
+    sync_model(SyncManager(dart, ModelFactory(dart), journal=SyncJournal(path)))
+    workflow = list(dart.entities['workflow'].values())[0]
+    workflow.version_id += 1
+    del dart.entities['action'][sorted(dart.entities['action'])[0]]
+
+    dart.calls = []
+    sync_manager = SyncManager(dart, ModelFactory(dart), journal=SyncJournal(path))
+    sync_model(sync_manager)
+    assert sync_manager.journal.as_dict()['invalidated'] == 2
+    assert dart.operation_count('updateWorkflow') == 1
+    assert dart.operation_count('createWorkflowActions') == 1
+    assert len(dart.entities['action']) == 3
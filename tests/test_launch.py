@@ -0,0 +1,69 @@
+import threading
+import time
+
+import mock
+import requests
+
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.deadline import Deadline, DeadlineExceeded
+from dartclient.http_client import DartRequestsClient
+from tests.fake_dart import FakeDart
+
+
+def test_launch_workflow_runs():
+    dart = FakeDart()
+    workflows = [dart.add('workflow', {'data': {'name': 'workflow%d' % (i,)}}) for i in range(3)]
+    lock = threading.Lock()
+    in_flight = [0, 0]
+    run = dart.manuallyRunWorkflow
+
+    def slow_run(workflow_id, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return run(workflow_id, **kwargs)
+
+    dart.manuallyRunWorkflow = slow_run
+    progress = []
+    runs = [workflows[i % 3] for i in range(30)] + ['WORKFLOW999', (workflows[0].id, {'partition': '2016-06-01'})]
+
+    report = SyncManager(dart, ModelFactory(dart)).launch_workflow_runs(
+        runs, max_in_flight=4, progress=lambda result, done, total: progress.append((done, total)))
+
+    assert not report.ok
+    assert [result.workflow_id for result in report.failures] == ['WORKFLOW999']
+    assert len(report.instance_ids) == 31
+    assert len(dart.entities['workflow_instance']) == 31
+    assert report.results[0].instance.data.workflow_id == workflows[0].id
+    assert report.results[-1].kwargs == {'partition': '2016-06-01'}
+    assert ('manuallyRunWorkflow', {'workflow_id': workflows[0].id, 'partition': '2016-06-01'}) in dart.calls
+    assert 1 < in_flight[1] <= 4
+    assert progress[-1] == (32, 32)
+
+
+def test_launch_grows_connection_pool():
+    http_client = DartRequestsClient()
+    client = mock.Mock()
+    client.swagger_spec.http_client = http_client
+    SyncManager(client, ModelFactory(client)).launch_workflow_runs([], max_in_flight=32)
+    assert http_client.pool_maxsize == 32
+    assert http_client.session.get_adapter('https://dart.example.com')._pool_maxsize == 32
+
+
+def test_launch_timeouts_past_the_deadline_are_deadline_exceeded():
+    client = mock.Mock()
+    now = [100.0]
+
+    def time_out(timeout):
+        now[0] += timeout
+        raise requests.exceptions.ReadTimeout('timed out')
+    client.Workflow.manuallyRunWorkflow.return_value.result.side_effect = time_out
+    sync_manager = SyncManager(client, ModelFactory(client)).with_deadline(Deadline(10, clock=lambda: now[0]))
+
+    report = sync_manager.launch_workflow_runs(['WORKFLOW1'])
+
+    [failure] = report.failures
+    assert isinstance(failure.error, DeadlineExceeded)
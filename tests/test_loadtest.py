@@ -0,0 +1,97 @@
+import os
+
+import mock
+import pytest
+
+from dartclient import loadtest
+
+from dartclient.loadtest import LoadResult, LoadTest
+from dartclient.stub_server import ExponentialLatency, StubDartServer, StubDartServerProcess
+
+
+def test_load_result():
+    result = LoadResult(4, 'thread', 2.0, {'find': [0.3, 0.1, 0.2], 'sync': [0.5]}, {'find': 1, 'sync': 1},
+                        1.5, 60.0)
+    assert result.operations == 6
+    assert result.throughput == 3.0
+    assert result.percentiles() == {'p50': 0.3, 'p90': 0.5, 'p99': 0.5, 'max': 0.5}
+    assert result.percentiles('find')['p50'] == 0.2
+    assert result.percentiles('clean') == {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    assert result.as_dict()['by_operation']['find']['errors'] == 1
+    assert '4 clients' in result.summary()
+
+    with pytest.raises(ValueError):
+        LoadTest('http://localhost', mix={'delete': 1})
+    with pytest.raises(ValueError):
+        LoadTest('http://localhost', duration=None)
+
+
+def test_thread_load_test_with_injected_errors():
+    with StubDartServer(error_rate=0.1, seed=1) as server:
+        load_test = LoadTest(server.api_url, mix={'find': 2, 'sync': 1, 'clean': 1}, duration=None, operations=25,
+                             find_pool=5, sync_pool=3, seed=1)
+        server.error_rate = 0
+        assert load_test.prepare().ok
+        server.error_rate = 0.1
+
+        results = load_test.sweep([1, 3])
+        assert [result.clients for result in results] == [1, 3]
+        assert results[1].operations == 75
+        assert 0 < results[1].error_rate < 0.5
+        latency = results[1].percentiles()
+        assert 0 < latency['p50'] <= latency['p90'] <= latency['p99'] <= latency['max']
+        assert results[1].cpu_seconds > 0 and results[1].rss_mb > 0
+
+        server.error_rate = 0
+        report = load_test.cleanup()
+        assert not report.failures
+        assert not server.store.entities['dataset']
+
+
+def test_process_load_test():
+    with StubDartServerProcess(latency=ExponentialLatency(0.002, seed=1)) as server:
+        load_test = LoadTest(server.api_url, mode='process', duration=0.5, find_pool=3)
+        load_test.prepare()
+        result = load_test.run(2)
+        assert result.mode == 'process' and result.operations > 0 and result.error_rate == 0
+        assert result.rss_mb > 0
+        assert not load_test.cleanup().failures
+
+
+def dying_run(run):
+    def wrapper(client, stop):
+        if client.index == 0:
+            # as if killed for running out of memory: nothing is reported
+            os._exit(9)
+        if client.index == 1:
+            raise ValueError('broken client')
+        return run(client, stop)
+    return wrapper
+
+
+def test_processes_that_die_are_reported_as_failures():
+    with StubDartServer() as server:
+        load_test = LoadTest(server.api_url, mode='process', duration=None, operations=5, find_pool=1)
+        with mock.patch.object(loadtest, '_POLL_SECONDS', 0.05), \
+                mock.patch.object(loadtest._LoadClient, 'run', dying_run(loadtest._LoadClient.run)):
+            result = load_test.run(3)
+    assert sorted(result.failed_clients) == ['client 0 exited without reporting (exit code 9)',
+                                             'client 1 failed: ValueError: broken client']
+    assert result.operations == 5
+    assert '2 clients failed' in result.summary()
+
+
+def test_threads_that_fail_are_reported_as_failures():
+    run = loadtest._LoadClient.run
+
+    def failing_run(client, stop):
+        if client.index == 1:
+            raise ValueError('broken client')
+        return run(client, stop)
+
+    with StubDartServer() as server:
+        load_test = LoadTest(server.api_url, duration=None, operations=5, find_pool=1)
+        with mock.patch.object(loadtest._LoadClient, 'run', failing_run):
+            result = load_test.run(2)
+    assert result.failed_clients == ['client 1 failed: ValueError: broken client']
+    assert result.operations == 5
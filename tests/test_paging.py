@@ -0,0 +1,108 @@
+import json
+import threading
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.hedge import HedgingPolicy
+from dartclient.paging import PageSizeTuner
+from dartclient.stub_server import StubDartServer
+from tests.fake_dart import FakeDart
+
+
+def test_grows_on_fast_full_pages_and_shrinks_on_slow_ones():
+    tuner = PageSizeTuner(initial=100, minimum=10, maximum=1000, target_seconds=1.0)
+    tuner.record('action', 100, 100, 0.1)
+    assert tuner.page_size('action') == 200
+    tuner.record('action', 200, 50, 0.1)
+    assert tuner.page_size('action') == 200
+    tuner.record('action', 200, 200, 0.7)
+    assert tuner.page_size('action') == 200
+    tuner.record('action', 200, 200, 3.0)
+    assert tuner.page_size('action') == 100
+    for _ in range(10):
+        tuner.record('action', tuner.page_size('action'), tuner.page_size('action'), 0.01)
+    assert tuner.page_size('action') == 1000
+    assert tuner.page_size('workflow') == 100
+
+    stats = tuner.as_dict()['action']
+    assert stats['page_size'] == 1000
+    assert stats['pages'] == 14
+    assert (stats['grown'], stats['shrunk']) == (5, 1)
+
+
+def test_caps_page_size_by_response_bytes():
+    tuner = PageSizeTuner(initial=1000, minimum=10, max_page_bytes=100000)
+    tuner.record('workflow', 1000, 1000, 0.01, size=1000 * 500)
+    assert tuner.page_size('workflow') == 200
+    tuner.record('workflow', 200, 200, 0.01, size=200 * 500)
+    assert tuner.page_size('workflow') == 200
+    assert tuner.as_dict()['workflow']['bytes_per_entity'] == 500
+
+
+def test_iter_entities_uses_tuned_page_sizes():
+    dart = FakeDart()
+    for number in range(100):
+        dart.add('dataset', {'data': {'name': 'dataset%d' % (number,)}})
+    tuner = PageSizeTuner(initial=10, minimum=10)
+    sync_manager = SyncManager(dart, ModelFactory(dart), page_tuner=tuner)
+
+    assert len(list(sync_manager.iter_entities('dataset'))) == 100
+    assert [call[1]['limit'] for call in dart.calls] == [10, 20, 40, 80]
+    assert len(list(sync_manager.iter_entities('dataset', page_size=50))) == 100
+    assert [call[1]['limit'] for call in dart.calls[4:]] == [50, 50]
+
+
+def test_records_response_sizes_from_http_client():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        for number in range(30):
+            server.store.add('dataset', {'data': {'name': 'dataset%d' % (number,), 'tags': []}})
+        sync_manager = SyncManager(client, ModelFactory(client), page_tuner=PageSizeTuner(initial=10, minimum=10))
+        assert len(list(sync_manager.iter_entities('dataset'))) == 30
+        stats = sync_manager.page_tuner.as_dict()['dataset']
+        assert stats['pages'] == 2
+        assert stats['page_size'] == 40
+        assert stats['bytes_per_entity'] > 0
+
+
+def _true_bytes_per_entity(server):
+    response = server.store.list('dataset')
+    return float(len(json.dumps(response))) / len(response['results'])
+
+
+def test_records_response_sizes_of_coalesced_reads():
+    with StubDartServer(latency=0.05) as server:
+        client = create_client(api_url=server.api_url)
+        for number in range(30):
+            server.store.add('dataset', {'data': {'name': 'dataset%d' % (number,), 'tags': []}})
+        sync_manager = SyncManager(client, ModelFactory(client), coalesce_reads=True,
+                                   page_tuner=PageSizeTuner(initial=30))
+
+        def list_page():
+            # a small response first, which a shared page must not be attributed
+            sync_manager.find_dataset('missing')
+            sync_manager.list_page('dataset', limit=30)
+
+        threads = [threading.Thread(target=list_page) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sync_manager.single_flight.as_dict()['coalesced'] > 0
+        bytes_per_entity = sync_manager.page_tuner.as_dict()['dataset']['bytes_per_entity']
+        assert abs(bytes_per_entity - _true_bytes_per_entity(server)) < 0.1 * _true_bytes_per_entity(server)
+
+
+def test_records_response_sizes_of_hedged_reads():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        for number in range(30):
+            server.store.add('dataset', {'data': {'name': 'dataset%d' % (number,), 'tags': []}})
+        hedging = HedgingPolicy()
+        sync_manager = SyncManager(client, ModelFactory(client), hedging=hedging, page_tuner=PageSizeTuner(initial=30))
+        try:
+            sync_manager.find_dataset('dataset1')
+            sync_manager.list_page('dataset', limit=30)
+        finally:
+            hedging.close()
+        bytes_per_entity = sync_manager.page_tuner.as_dict()['dataset']['bytes_per_entity']
+        assert abs(bytes_per_entity - _true_bytes_per_entity(server)) < 0.1 * _true_bytes_per_entity(server)
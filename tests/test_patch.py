@@ -0,0 +1,54 @@
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.patch import patch_operations
+from tests.fake_dart import FakeDart, Response
+
+
+class PatchingDart(FakeDart):
+
+    def patchDataset(self, dataset_id, patch):
+        dataset = self.entities['dataset'][dataset_id]
+        for operation in patch:
+            field = operation['path'].split('/')[-1]
+            setattr(dataset.data, field, operation.get('value'))
+        return Response(results=dataset)
+
+
+def test_patch_operations():
+    assert patch_operations(
+        {'id': '1', 'data': {'name': 'a', 'args': {'x': 1}, 'description': 'd', 'tags': []}},
+        {'id': '1', 'data': {'name': 'a', 'args': {'x': 2}, 'description': None, 'tags': [], 'state': 'ACTIVE'}}) == [
+        {'op': 'add', 'path': '/data/args', 'value': {'x': 2}},
+        {'op': 'remove', 'path': '/data/description'},
+        {'op': 'add', 'path': '/data/state', 'value': 'ACTIVE'},
+    ]
+
+
+def test_partial_updates():
+    dart = PatchingDart()
+    columns = [{'name': 'column%d' % (i,), 'data_type': 'VARCHAR'} for i in range(200)]
+    dart.add('dataset', {'data': {'name': 'dataset1', 'columns': columns, 'description': 'old'}})
+    dart.add('datastore', {'data': {'name': 'datastore1', 'state': 'ACTIVE'}})
+    sync_manager = SyncManager(dart, ModelFactory(dart), partial_updates=True)
+
+    def describe(dataset):
+        dataset.data.description = 'new'
+        return dataset
+
+    sync_manager.sync_dataset('dataset1', describe, columns=columns)
+    sync_manager.sync_dataset('dataset1', describe, columns=columns)
+    assert dart.operation_count('patchDataset') == 1
+    assert dart.operation_count('updateDataset') == 0
+    assert [call[1]['patch'] for call in dart.calls if call[0] == 'patchDataset'] == [
+        [{'op': 'add', 'path': '/data/description', 'value': 'new'}]]
+
+    def engine(datastore):
+        datastore.data.engine_name = 'no_op_engine'
+        return datastore
+
+    datastore = sync_manager.sync_datastore('datastore1', 'ACTIVE', engine)
+    assert datastore.data.engine_name == 'no_op_engine'
+    assert dart.operation_count('updateDatastore') == 1
+
+    stats = sync_manager.update_stats.as_dict()
+    assert (stats['patched'], stats['unchanged'], stats['full']) == (1, 1, 1)
+    assert stats['bytes_sent'] < stats['bytes_full'] / 10
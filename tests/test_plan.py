@@ -0,0 +1,132 @@
+import time
+
+import mock
+import pytest
+
+from dartclient import cli
+from dartclient.plan import apply_data, ModelPlan, PlanRunner
+
+
+MODEL = {
+    'defaults': {'tags': ['test']},
+    'datasets': [{
+        'name': 'dataset1',
+        'columns': [['column1', 'VARCHAR'], ['column2', 'DATETIME']],
+        'data': {'table_name': 'table1', 'data_format': {'file_format': 'TEXTFILE'}},
+        'subscriptions': [{'name': 'subscription1', 'data': {'state': 'INACTIVE'}}],
+    }],
+    'datastores': [{
+        'name': 'datastore1',
+        'state': 'ACTIVE',
+        'data': {'engine_name': 'no_op_engine'},
+        'workflows': [{
+            'name': 'workflow1',
+            'actions': [{'name': 'action1', 'dataset': 'dataset1'},
+                        {'name': 'action2', 'subscription': 'subscription1', 'state': 'TEMPLATE'}],
+            'triggers': [{'name': 'trigger1', 'subscription': 'subscription1'}],
+        }],
+    }],
+}
+
+
+def fake_sync_manager():
+    sync_manager = mock.Mock()
+    for method in ('sync_dataset', 'sync_datastore', 'sync_subscription', 'sync_workflow', 'sync_action',
+                   'sync_trigger'):
+        getattr(sync_manager, method).side_effect = lambda name, *args, **kwargs: 'synced:' + name
+    return sync_manager
+
+
+def test_plan_validates_references():
+    with pytest.raises(ValueError):
+        ModelPlan({'datastores': [{'name': 'ds', 'workflows': [{'name': 'wf', 'actions': [
+            {'name': 'a', 'dataset': 'missing'}]}]}]})
+    with pytest.raises(ValueError):
+        ModelPlan({'datasets': [{'data': {}}]})
+
+
+def test_apply_data():
+    entity = mock.Mock()
+    entity.data.args = {'old': 1}
+    apply_data(entity, {'args': {'new': 2}, 'data_format': {'file_format': 'TEXTFILE'}, 'concurrency': 1})
+    assert entity.data.args == {'new': 2}
+    assert entity.data.data_format.file_format == 'TEXTFILE'
+    assert entity.data.concurrency == 1
+
+
+def test_runner_sync():
+    sync_manager = fake_sync_manager()
+    progress = []
+    report = PlanRunner(sync_manager, ModelPlan(MODEL), workers=4,
+                        progress=lambda step, done, total: progress.append((done, total))).sync()
+
+    assert report.ok
+    assert len(report.steps) == 7
+    assert progress[-1] == (7, 7)
+    sync_manager.sync_workflow.assert_called_once_with('workflow1', 'synced:datastore1', mock.ANY)
+    sync_manager.sync_subscription.assert_called_once_with('subscription1', 'synced:dataset1', mock.ANY)
+    assert sync_manager.sync_dataset.call_args[1]['columns'].names == ['column1', 'column2']
+    actions = dict((c[0][0], c[1]) for c in sync_manager.sync_action.call_args_list)
+    assert actions['action1']['dataset'] == 'synced:dataset1'
+    assert actions['action2']['subscription'] == 'synced:subscription1'
+    assert actions['action2']['action_state'] == 'TEMPLATE'
+    assert 'action' in report.summary()
+
+
+def test_runner_skips_children_of_failures():
+    sync_manager = fake_sync_manager()
+    sync_manager.sync_datastore.side_effect = RuntimeError('boom')
+    report = PlanRunner(sync_manager, ModelPlan(MODEL)).sync()
+
+    assert not report.ok
+    assert [step.path for step in report.failures] == [('datastore1',)]
+    assert sorted(step.entity_type for step in report.skipped) == ['action', 'action', 'trigger', 'workflow']
+    assert not sync_manager.sync_action.called
+    assert 'FAILED datastore datastore1: boom' in report.summary()
+
+
+def test_runner_records_bad_columns_as_a_step_failure():
+    model = dict(MODEL, datasets=[dict(MODEL['datasets'][0], columns={'csv': 'missing.csv'})])
+    report = PlanRunner(fake_sync_manager(), ModelPlan(model, base_path='/nonexistent')).sync()
+
+    assert [step.path for step in report.failures] == [('dataset1',)]
+    assert isinstance(report.failures[0].error, IOError)
+    assert ('datastore1', 'workflow1') not in [step.path for step in report.failures + report.skipped]
+
+
+def test_runner_clean_deletes_datastores_before_datasets():
+    sync_manager = mock.Mock()
+    cleaned = []
+
+    def clean_datastore(datastore):
+        time.sleep(0.05)
+        cleaned.append('datastore')
+
+    sync_manager.clean_datastore.side_effect = clean_datastore
+    sync_manager.clean_dataset.side_effect = lambda dataset: cleaned.append('dataset')
+    # trigger1 refers to subscription1 of dataset1
+    report = PlanRunner(sync_manager, ModelPlan(MODEL), workers=4).clean()
+    assert report.ok
+    assert cleaned == ['datastore', 'dataset']
+
+    sync_manager.clean_datastore.side_effect = RuntimeError('boom')
+    report = PlanRunner(sync_manager, ModelPlan(MODEL), workers=4).clean()
+    assert [step.path for step in report.failures] == [('datastore1',)]
+    assert [step.path for step in report.skipped] == [('dataset1',)]
+    assert sync_manager.clean_dataset.call_count == 1
+
+
+def test_cli_sync(tmpdir):
+    model = tmpdir.join('model.yaml')
+    model.write('datasets:\n  - name: dataset1\n    columns: {csv: columns.csv}\n')
+    tmpdir.join('columns.csv').write('name,data_type\ncolumn1,VARCHAR\n')
+    sync_manager = fake_sync_manager()
+
+    with mock.patch('dartclient.cli.create_client') as create_client, \
+            mock.patch('dartclient.cli.create_sync_manager', return_value=sync_manager):
+        exit_code = cli.main(['--api-url', 'https://dart.example.com/api/1', '--username', 'key',
+                              '--password', 'secret', '--quiet', 'sync', str(model)])
+
+    assert exit_code == 0
+    assert create_client.call_args[1]['authenticator'].host == 'dart.example.com'
+    assert sync_manager.sync_dataset.call_args[1]['columns'].names == ['column1']
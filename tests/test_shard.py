@@ -0,0 +1,82 @@
+import multiprocessing
+import time
+
+import pytest
+
+from dartclient.plan import ModelPlan
+from dartclient.shard import partition_plan, SharedRateLimiter, ShardedPlanRunner
+from dartclient.stub_server import StubDartServer
+
+
+def model(datastores=6, workflows=2, actions=3):
+    return ModelPlan({
+        'datasets': [{'name': 'dataset%d' % (i,), 'subscriptions': [{'name': 'subscription%d' % (i,)}]}
+                     for i in range(3)],
+        'datastores': [{
+            'name': 'datastore%d' % (i,),
+            'data': {'engine_name': 'no_op_engine'},
+            'workflows': [{
+                'name': 'workflow%d' % (j,),
+                'actions': [dict({'name': 'action%d' % (k,)}, **({'dataset': 'dataset0'} if i == 0 and k == 0 else {}))
+                            for k in range(actions)],
+                'triggers': [{'name': 'trigger', 'subscription': 'subscription1'}] if i == 1 and j == 0 else [],
+            } for j in range(workflows)],
+        } for i in range(datastores)],
+    })
+
+
+def test_partition_plan_keeps_references_together():
+    plan = model()
+    shards = partition_plan(plan, 4)
+    assert len(shards) == 4
+    assert sum(shard.count() for shard in shards) == plan.count()
+    by_name = dict((entity['name'], index) for (index, shard) in enumerate(shards)
+                   for entity in shard.datastores + shard.datasets)
+    assert by_name['datastore0'] == by_name['dataset0']
+    assert by_name['datastore1'] == by_name['dataset1']
+    assert max(shard.count() for shard in shards) - min(shard.count() for shard in shards) <= 9
+    assert len(partition_plan(ModelPlan({}), 4)) == 0
+    assert len(partition_plan(plan, 100)) == 7
+
+
+def _acquire(rate_limiter, count):
+    for _ in range(count):
+        rate_limiter.acquire()
+
+
+def test_shared_rate_limiter():
+    rate_limiter = SharedRateLimiter(100, burst=1)
+    processes = [multiprocessing.Process(target=_acquire, args=(rate_limiter, 10)) for _ in range(2)]
+    started = time.time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert time.time() - started >= 0.18
+    stats = rate_limiter.as_dict()
+    assert stats['acquired'] == 20 and stats['seconds_waited'] > 0
+    with pytest.raises(ValueError):
+        SharedRateLimiter(0)
+
+
+def test_sharded_sync_and_clean():
+    plan = model()
+    progress = []
+    with StubDartServer() as server:
+        runner = ShardedPlanRunner(plan, {'api_url': server.api_url}, {'coalesce_reads': True}, processes=2,
+                                   rate=1000, progress=lambda step, completed, total: progress.append(total))
+        report = runner.sync()
+        assert report.ok, report.summary()
+        assert len(report.steps) == plan.count() == progress[0] == len(progress)
+        assert len(server.store.entities['action']) == 36
+        assert list(server.store.entities['trigger'].values())[0]['data']['args']['subscription_id'] in \
+            server.store.entities['subscription']
+        # each process also downloads the swagger spec
+        assert runner.rate_limiter.as_dict()['acquired'] == server.store.requests + 2
+
+        report = runner.clean()
+        assert report.ok, report.summary()
+        assert not server.store.entities['datastore'] and not server.store.entities['dataset']
+
+    with pytest.raises(ValueError):
+        ShardedPlanRunner(plan, {'api_url': 'http://localhost'}, {'journal': 'journal.jsonl'})
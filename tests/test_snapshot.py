@@ -0,0 +1,144 @@
+import gzip
+import json
+import threading
+import time
+
+import mock
+
+from dartclient import snapshot
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.snapshot import export_snapshot, import_snapshot, read_snapshot
+from tests.fake_dart import FakeDart
+
+
+def populate(dart, actions=25):
+    datastore = dart.add('datastore', {'data': {'name': 'datastore1', 'state': 'ACTIVE'}})
+    workflow = dart.add('workflow', {'data': {'name': 'workflow1', 'datastore_id': datastore.id}})
+    dataset = dart.add('dataset', {'data': {'name': 'dataset1', 'columns': [{'name': 'c1', 'data_type': 'VARCHAR'}]}})
+    subscription = dart.add('subscription', {'data': {'name': 'subscription1', 'dataset_id': dataset.id}})
+    for index in range(actions):
+        dart.add('action', {'data': {'name': 'action%d' % (index,), 'workflow_id': workflow.id,
+                                     'args': {'dataset_id': dataset.id}}})
+    dart.add('trigger', {'data': {'name': 'trigger1', 'workflow_ids': [workflow.id],
+                                  'args': {'subscription_id': subscription.id}}})
+    return datastore, workflow, dataset, subscription
+
+
+def test_export_snapshot(tmpdir):
+    dart = FakeDart()
+    datastore, workflow, dataset, subscription = populate(dart)
+    path = str(tmpdir.join('snapshot.jsonl.gz'))
+
+    report = export_snapshot(SyncManager(dart, ModelFactory(dart)), path, page_size=10, workers=4)
+
+    assert report.counts == {'datastore': 1, 'workflow': 1, 'action': 25, 'trigger': 1, 'dataset': 1,
+                             'subscription': 1}
+    assert report.bytes > 0
+    assert dart.operation_count('listActions') == 3
+    with gzip.open(path, 'rb') as f:
+        assert json.loads(f.readline().decode('utf-8'))['format'] == 'dartclient-snapshot'
+    records = dict((record['id'], record) for record in read_snapshot(path))
+    assert records[workflow.id]['parents'] == [['datastore', datastore.id]]
+    assert records[subscription.id]['entity']['data']['dataset_id'] == dataset.id
+    trigger = [record for record in records.values() if record['type'] == 'trigger'][0]
+    assert trigger['parents'] == [['workflow', workflow.id], ['subscription', subscription.id]]
+
+
+def test_export_snapshot_bounds_the_pages_in_flight(tmpdir):
+    dart = FakeDart()
+    populate(dart, actions=200)
+    sync_manager = SyncManager(dart, ModelFactory(dart))
+    lock = threading.Lock()
+    counts = {'requested': 0, 'written': 0, 'outstanding': 0}
+    list_page, write_line = sync_manager.list_page, snapshot._write_line
+
+    def counting_list_page(*args, **kwargs):
+        with lock:
+            counts['requested'] += 1
+            # pages requested but not yet written, with page_size=1 one line per page
+            counts['outstanding'] = max(counts['outstanding'], counts['requested'] - counts['written'])
+        return list_page(*args, **kwargs)
+
+    def slow_write_line(f, record):
+        time.sleep(0.001)
+        write_line(f, record)
+        if 'entity' in record:
+            with lock:
+                counts['written'] += 1
+
+    sync_manager.list_page = counting_list_page
+    with mock.patch.object(snapshot, '_write_line', slow_write_line):
+        report = export_snapshot(sync_manager, str(tmpdir.join('snapshot.jsonl.gz')), page_size=1, workers=4)
+    assert report.counts['action'] == 200
+    assert counts['outstanding'] <= 2 * 4
+
+
+def test_import_snapshot_round_trip(tmpdir):
+    source = FakeDart()
+    populate(source)
+    path = str(tmpdir.join('snapshot.jsonl.gz'))
+    export_snapshot(SyncManager(source, ModelFactory(source)), path)
+
+    target = FakeDart()
+    target._ids = iter(range(1000, 2000))
+    report = import_snapshot(SyncManager(target, ModelFactory(target)), path, batch_size=10)
+
+    assert report.total == 30
+    assert not report.failures and not report.skipped
+    assert target.operation_count('createWorkflowActions') == 3
+    workflow = list(target.entities['workflow'].values())[0]
+    dataset = list(target.entities['dataset'].values())[0]
+    subscription = list(target.entities['subscription'].values())[0]
+    datastore = list(target.entities['datastore'].values())[0]
+    assert workflow.data.datastore_id == datastore.id
+    assert subscription.data.dataset_id == dataset.id
+    assert all(action.data.workflow_id == workflow.id and action.data.args == {'dataset_id': dataset.id}
+               for action in target.entities['action'].values())
+    trigger = list(target.entities['trigger'].values())[0]
+    assert trigger.data.workflow_ids == [workflow.id]
+    assert trigger.data.args == {'subscription_id': subscription.id}
+    assert dataset.data.columns == [{'name': 'c1', 'data_type': 'VARCHAR'}]
+
+
+def test_import_snapshot_bounds_the_requests_in_flight(tmpdir):
+    source = FakeDart()
+    populate(source, actions=200)
+    path = str(tmpdir.join('snapshot.jsonl.gz'))
+    export_snapshot(SyncManager(source, ModelFactory(source)), path)
+    lock = threading.Lock()
+    counts = {'read': 0, 'created': 0, 'outstanding': 0}
+    read_snapshot, create = snapshot.read_snapshot, snapshot._create
+
+    def counting_read_snapshot(*args, **kwargs):
+        for record in read_snapshot(*args, **kwargs):
+            with lock:
+                counts['read'] += 1
+                counts['outstanding'] = max(counts['outstanding'], counts['read'] - counts['created'])
+            yield record
+
+    def slow_create(*args, **kwargs):
+        time.sleep(0.001)
+        pairs = create(*args, **kwargs)
+        with lock:
+            counts['created'] += 1
+        return pairs
+
+    target = FakeDart()
+    with mock.patch.object(snapshot, 'read_snapshot', counting_read_snapshot), \
+            mock.patch.object(snapshot, '_create', slow_create):
+        report = import_snapshot(SyncManager(target, ModelFactory(target)), path, workers=4, batch_size=1)
+    assert report.counts['action'] == 200
+    # the record being read, plus at most 2 * workers requests not yet collected
+    assert counts['outstanding'] <= 2 * 4 + 1
+
+
+def test_import_skips_orphans(tmpdir):
+    source = FakeDart()
+    populate(source, actions=2)
+    path = str(tmpdir.join('snapshot.jsonl.gz'))
+    export_snapshot(SyncManager(source, ModelFactory(source)), path, entity_types=('action', 'dataset'))
+
+    target = FakeDart()
+    report = import_snapshot(SyncManager(target, ModelFactory(target)), path)
+    assert report.counts['dataset'] == 1
+    assert len(report.skipped) == 2
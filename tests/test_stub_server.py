@@ -0,0 +1,69 @@
+import threading
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.stub_server import StubDartServer
+
+
+def test_sync_manager_against_stub_server():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        sync_manager = SyncManager(client, ModelFactory(client, engine_name='no_op_engine'))
+
+        datastore = sync_manager.sync_datastore('datastore1', 'ACTIVE', lambda datastore: datastore)
+        workflow = sync_manager.sync_workflow('workflow1', datastore, lambda workflow: workflow)
+        action = sync_manager.sync_action('action1', workflow, lambda action: action)
+        assert sync_manager.sync_datastore('datastore1', 'ACTIVE', lambda datastore: datastore).id == datastore.id
+        assert sync_manager.find_action('action1', workflow).id == action.id
+
+        sync_manager.clean_datastore(datastore)
+        assert not any(server.store.entities.values())
+
+
+def test_shared_sync_manager_stress():
+    threads_count, rounds = 16, 5
+    errors = []
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url, pool_maxsize=threads_count)
+        sync_manager = SyncManager(client, ModelFactory(client, engine_name='no_op_engine', tags=['stress']),
+                                   coalesce_reads=True)
+
+        def worker(number):
+            try:
+                for round_number in range(rounds):
+                    def tag(entity):
+                        del entity.data.tags[1:]
+                        entity.data.tags.append('round%d' % (round_number,))
+                        return entity
+                    datastore = sync_manager.sync_datastore('datastore%d' % (number,), 'ACTIVE', tag)
+                    workflow = sync_manager.sync_workflow('workflow%d' % (number,), datastore, tag)
+                    sync_manager.sync_action('action%d' % (number,), workflow, tag)
+                    assert sync_manager.find_workflow('workflow%d' % (number,), datastore).id == workflow.id
+                    assert workflow.data.tags == ['stress', 'round%d' % (round_number,)]
+                    if number % 4 == 0 and round_number == rounds - 1:
+                        sync_manager.clean_datastore(datastore)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        remaining = threads_count - threads_count // 4
+        entities = server.store.entities
+        assert len(entities['datastore']) == len(entities['workflow']) == len(entities['action']) == remaining
+        assert sorted(datastore['data']['tags'] for datastore in entities['datastore'].values()) == \
+            [['stress', 'round%d' % (rounds - 1,)]] * remaining
+
+
+def test_model_factory_copies_default_lists():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        model_factory = ModelFactory(client, tags=['tag1'], on_failure_email=['someone@example.com'])
+        workflow = model_factory.create_workflow()
+        workflow.data.tags.append('tag2')
+        workflow.data.on_failure_email.append('someone.else@example.com')
+        assert model_factory.tags == ['tag1']
+        assert model_factory.create_action().data.on_failure_email == ['someone@example.com']
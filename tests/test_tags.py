@@ -0,0 +1,54 @@
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.stub_server import StubDartServer
+from tests.fake_dart import FakeDart
+
+
+def add_model(dart, tag):
+    datastore = dart.add('datastore', {'data': {'name': 'datastore', 'tags': [tag]}})
+    workflow = dart.add('workflow', {'data': {'name': 'workflow', 'datastore_id': datastore.id, 'tags': [tag]}})
+    dart.add('action', {'data': {'name': 'action', 'workflow_id': workflow.id, 'tags': [tag, 'other']}})
+    dart.add('trigger', {'data': {'name': 'trigger', 'workflow_ids': [workflow.id], 'tags': [tag]}})
+    dataset = dart.add('dataset', {'data': {'name': 'dataset', 'tags': [tag]}})
+    dart.add('subscription', {'data': {'name': 'subscription', 'dataset_id': dataset.id, 'tags': [tag]}})
+
+
+def test_find_by_tag():
+    dart = FakeDart()
+    add_model(dart, 'run1')
+    add_model(dart, 'run2')
+    found = SyncManager(dart, ModelFactory(dart)).find_by_tag('run1')
+    assert sorted(found) == ['action', 'dataset', 'datastore', 'subscription', 'trigger', 'workflow']
+    assert all(len(entities) == 1 and 'run1' in entities[0].data.tags for entities in found.values())
+
+
+def test_clean_by_tag_deletes_in_dependency_order():
+    dart = FakeDart()
+    add_model(dart, 'run1')
+    add_model(dart, 'run2')
+    deleted = []
+    report = SyncManager(dart, ModelFactory(dart)).clean_by_tag(
+        'run1', progress=lambda entity_type, entity, error: deleted.append(entity_type))
+
+    assert report.ok
+    assert sum(report.deleted.values()) == 6
+    assert deleted[0] == 'trigger' and deleted[-1] == 'datastore'
+    assert set(deleted[1:3]) == {'action', 'subscription'} and set(deleted[3:5]) == {'workflow', 'dataset'}
+    assert all(len(entities) == 1 for entities in dart.entities.values() if entities)
+    assert all('run2' in entity.data.tags for entities in dart.entities.values() for entity in entities.values())
+
+
+def test_clean_by_tag_against_stub_server():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        sync_manager = SyncManager(client, ModelFactory(client, engine_name='no_op_engine', tags=['ci-42']))
+        for number in range(5):
+            datastore = sync_manager.sync_datastore('datastore%d' % (number,), 'ACTIVE', lambda datastore: datastore)
+            workflow = sync_manager.sync_workflow('workflow%d' % (number,), datastore, lambda workflow: workflow)
+            sync_manager.sync_action('action%d' % (number,), workflow, lambda action: action)
+        server.store.add('datastore', {'data': {'name': 'kept', 'tags': ['other']}})
+
+        report = sync_manager.clean_by_tag('ci-42')
+        assert report.ok
+        assert (report.deleted['datastore'], report.deleted['workflow'], report.deleted['action']) == (5, 5, 5)
+        assert [entity['data']['name'] for entity in server.store.entities['datastore'].values()] == ['kept']
+        assert not server.store.entities['workflow'] and not server.store.entities['action']
@@ -0,0 +1,133 @@
+import contextlib
+import threading
+
+import pytest
+
+from dartclient import tracing
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.hedge import HedgingPolicy
+from dartclient.http_client import DartRequestsClient
+from dartclient.stub_server import StubDartServer
+from tests.fake_dart import FakeDart
+from tests.test_http_client import post, server_url  # noqa: F401
+
+
+class RecordingSpan(object):
+
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.parent = parent
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class RecordingTracer(object):
+
+    def __init__(self):
+        self.spans = []
+        self._local = threading.local()
+
+    @property
+    def stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def get_current_context(self):
+        return list(self.stack)
+
+    @contextlib.contextmanager
+    def attach_context(self, context):
+        previous, self._local.stack = self.stack, list(context)
+        try:
+            yield
+        finally:
+            self._local.stack = previous
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        current = RecordingSpan(name, attributes or {}, self.stack[-1].name if self.stack else None)
+        self.spans.append(current)
+        self.stack.append(current)
+        try:
+            yield current
+        finally:
+            self.stack.pop()
+
+
+@pytest.fixture
+def tracer():
+    tracer = RecordingTracer()
+    tracing.set_tracer(tracer)
+    yield tracer
+    tracing.set_tracer(None)
+
+
+def test_no_op_without_tracer():
+    if tracing.otel_trace is not None:
+        pytest.skip('opentelemetry is installed')
+    with tracing.span('name', key='value') as current:
+        assert current is tracing.NOOP_SPAN
+
+
+def test_sync_manager_spans(tracer):
+    dart = FakeDart()
+    dart.add('datastore', {'data': {'name': 'datastore1', 'state': 'ACTIVE'}})
+    sync_manager = SyncManager(dart, ModelFactory(dart))
+
+    datastore = sync_manager.sync_datastore('datastore1', 'ACTIVE', lambda entity: entity)
+    sync_manager.clean_datastore(datastore)
+
+    assert [(span.name, span.parent) for span in tracer.spans] == [
+        ('dartclient.SyncManager.sync_datastore', None),
+        ('dartclient.SyncManager.find_datastore', 'dartclient.SyncManager.sync_datastore'),
+        ('dartclient.SyncManager.clean_datastore', None),
+    ]
+    assert tracer.spans[0].attributes == {'dart.entity_type': 'datastore', 'dart.entity_name': 'datastore1'}
+    assert tracer.spans[2].attributes['dart.entity_name'] == 'datastore1'
+
+
+def test_span_attributes_come_from_the_arguments_by_name(tracer):
+    dart = FakeDart()
+    dart.add('datastore', {'data': {'name': 'datastore1', 'state': 'ACTIVE', 'tags': ['tag1']}})
+    sync_manager = SyncManager(dart, ModelFactory(dart))
+
+    sync_manager.sync_datastore(datastore_name='datastore1', datastore_state='ACTIVE', callback=lambda entity: entity)
+    sync_manager.find_by_tag('tag1', entity_types=['datastore'])
+
+    assert tracer.spans[0].attributes['dart.entity_name'] == 'datastore1'
+    [find_by_tag] = [span for span in tracer.spans if span.name == 'dartclient.SyncManager.find_by_tag']
+    assert find_by_tag.attributes == {'dart.tag': 'tag1'}
+
+
+def test_file_export_closes_the_file_on_shutdown(tmpdir):
+    pytest.importorskip('opentelemetry.sdk')
+    provider = tracing.enable_file_export(str(tmpdir.join('spans.json')))
+    [processor] = provider._active_span_processor._span_processors
+    out = processor.span_exporter.out
+    provider.shutdown()
+    assert out.closed
+
+
+def test_http_spans(tracer, server_url):  # noqa: F811
+    post(DartRequestsClient(), server_url, '{}')
+    assert len(tracer.spans) == 1
+    attributes = tracer.spans[0].attributes
+    assert attributes['http.method'] == 'POST'
+    assert attributes['http.status_code'] == 200
+    assert attributes['http.request_content_length'] == 2
+    assert 0 < attributes['http.response_content_length'] < 500 * len('{"name": "entity"}')
+
+
+def test_hedged_http_spans_are_children_of_the_sync_manager_span(tracer):
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url)
+        server.store.add('dataset', {'data': {'name': 'dataset1', 'tags': []}})
+        with SyncManager(client, ModelFactory(client), hedging=HedgingPolicy()) as sync_manager:
+            assert sync_manager.find_dataset('dataset1').data.name == 'dataset1'
+    assert [(span.name, span.parent) for span in tracer.spans if span.name != 'dart.http GET'][-2:] == [
+        ('dartclient.SyncManager.find_dataset', None),
+        ('dart.http listDatasets', 'dartclient.SyncManager.find_dataset'),
+    ]
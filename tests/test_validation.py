@@ -0,0 +1,48 @@
+import jsonschema
+import pytest
+
+from dartclient.core import create_client, ModelFactory, SyncManager
+from dartclient.stub_server import StubDartServer
+from dartclient.validation import FULL, SKIP, ValidationPolicy
+
+
+def test_policy_lookup():
+    policy = ValidationPolicy({'listActions': SKIP, 'list': 0.1}, default=FULL)
+    assert policy.policy('listActions') == SKIP
+    assert policy.policy('listDatasets') == 0.1
+    assert policy.policy('updateDataset') == FULL
+    assert policy.policy(None) == FULL
+
+
+def test_validates_writes_and_samples_reads():
+    policy = ValidationPolicy({'listDatasets': SKIP, 'listActions': 0.5}, seed=1)
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url, validation=policy)
+        for number in range(3):
+            server.store.add('dataset', {'data': {'name': 'dataset%d' % (number,), 'tags': []}})
+        sync_manager = SyncManager(client, ModelFactory(client))
+
+        assert len(list(sync_manager.iter_entities('dataset'))) == 3
+        for _ in range(20):
+            sync_manager.list_page('action')
+        dataset = sync_manager.sync_dataset('dataset0', lambda dataset: dataset)
+        assert dataset.data.name == 'dataset0'
+
+        stats = policy.as_dict()
+        # each parameter and response body is a separate value
+        assert stats['listDatasets']['validated'] == 0 and stats['listDatasets']['skipped'] == 5
+        assert stats['listActions']['validated'] > 0 and stats['listActions']['skipped'] > 0
+        assert stats['listActions']['validated'] + stats['listActions']['skipped'] == 60
+        assert stats['updateDataset'] == {'validated': 3, 'skipped': 0, 'seconds': stats['updateDataset']['seconds']}
+
+        dataset.data.table_name = 12
+        with pytest.raises(jsonschema.ValidationError):
+            sync_manager.sync_dataset('dataset0', lambda existing: dataset)
+
+
+def test_invalid_responses_are_rejected():
+    with StubDartServer() as server:
+        client = create_client(api_url=server.api_url, validation={})
+        server.store.add('dataset', {'data': {'name': 'dataset1', 'tags': 'not a list'}})
+        with pytest.raises(jsonschema.ValidationError):
+            SyncManager(client, ModelFactory(client)).find_dataset('dataset1')
@@ -0,0 +1,67 @@
+import pytest
+
+from dartclient.core import ModelFactory, SyncManager
+from dartclient.waiter import AdaptiveInterval, EntityNotFound, Waiter
+from tests.fake_dart import FakeDart
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(initial=1, maximum=5, multiplier=2)
+    assert [interval.next(False) for _ in range(4)] == [2, 4, 5, 5]
+    assert interval.next(True) == 1
+
+
+def test_waiter_polls_in_batches_and_resolves_terminal_states():
+    dart = FakeDart()
+    actions = [dart.add('action', {'data': {'name': 'action%d' % (i,), 'state': 'QUEUED'}}) for i in range(5)]
+    instance = dart.add('workflow_instance', {'data': {'state': 'RUNNING'}})
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        # one action finishes per round, then the workflow instance
+        for action in sorted(dart.entities['action'].values(), key=lambda a: a.id):
+            if action.data.state != 'COMPLETED':
+                action.data.state = 'COMPLETED'
+                return
+        dart.entities['workflow_instance'][instance.id].data.state = 'FAILED'
+
+    waiter = Waiter(SyncManager(dart, ModelFactory(dart)), batch_size=3, sleep=sleep)
+    finished = []
+    futures = [waiter.watch_action(action.id, callback=finished.append) for action in actions]
+    instance_future = waiter.watch_workflow_instance(instance.id)
+    assert waiter.watch_action(actions[0].id) is futures[0]
+
+    assert waiter.wait()
+    assert waiter.pending == 0
+    assert [future.result().data.state for future in futures] == ['COMPLETED'] * 5
+    assert instance_future.result().data.state == 'FAILED'
+    assert len(finished) == 5
+    assert waiter.polls == 7
+    assert dart.operation_count('listActions') == 9
+    assert dart.operation_count('listWorkflowInstances') == 7
+    assert delays[0] == 1.0
+
+
+def test_waiter_backs_off_when_idle_and_times_out():
+    dart = FakeDart()
+    action = dart.add('action', {'data': {'name': 'action1', 'state': 'RUNNING'}})
+    now = [0.0]
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        now[0] += delay
+
+    waiter = Waiter(SyncManager(dart, ModelFactory(dart)), max_interval=4, multiplier=2, sleep=sleep,
+                    clock=lambda: now[0])
+    future = waiter.watch_action(action.id)
+
+    assert not waiter.wait(timeout=10)
+    assert delays == [1.0, 2.0, 4.0, 3.0]
+    assert not future.done()
+
+    del dart.entities['action'][action.id]
+    waiter.poll()
+    with pytest.raises(EntityNotFound):
+        future.result()